@@ -2,9 +2,62 @@ from antlr4 import InputStream, CommonTokenStream
 from .ASLLexer import ASLLexer
 from .ASLParser import ASLParser
 from .asl_type import ASLType
+from .asl_code_visitor import indent_lines, iter_lines
+from .asl_fast_path import translate_fast
+from .asl_pratt import ANTLR_LOCK, ASLSyntaxError, parse_pratt, parse_tokens, token_stream, tokenize_pieces
+from .asl_type_visitor import ASLTypeVisitor
+from .asl_value_visitor import ASLValueVisitor
 
 
-def asl_to_lang(string, fields, LangVisitor):
+#: Whether :func:`asl_to_lang` translates snippets of the subset of
+#: :func:`translate_fast` without parsing them
+FAST_PATH = True
+
+#: The parser of the snippets: "antlr" for the generated :class:`ASLParser` or
+#: "pratt" for :func:`parse_pratt`, which builds the same tree faster
+PARSER = "antlr"
+
+
+def parse_snippet(string):
+    """(Internal) Parses a processed ASL snippet and returns the tree
+
+    Uses the parser selected by :data:`PARSER`, snippets rejected by
+    :func:`parse_pratt` are parsed again by ANTLR (which reports the errors).
+    Code extracted from instruction files (:class:`ProcessedCode`) is
+    tokenized line by line and the tokens are handed to the parser instead of
+    lexing the joined string. Only one thread at a time runs the ANTLR
+    lexer and parser (see :data:`ANTLR_LOCK`).
+    """
+
+    tokens = None
+    if getattr(string, "pieces", None) is not None:
+        try:
+            tokens = tokenize_pieces(string.pieces)
+        except ASLSyntaxError:
+            pass
+    if PARSER == "pratt":
+        try:
+            return parse_tokens(tokens) if tokens is not None else parse_pratt(string)
+        except ASLSyntaxError:
+            pass
+    if tokens is not None:
+        stream = token_stream(tokens)
+    else:
+        stream = CommonTokenStream(ASLLexer(InputStream(string)))
+    with ANTLR_LOCK:
+        return ASLParser(stream).start()
+
+
+def input_variables(fields, variables=None):
+    """(Internal) Returns the pre-existing variables of a snippet including the fields"""
+
+    variables = dict(variables) if variables is not None else {}
+    for field in fields:
+        variables[field[0]] = (ASLType(ASLType.Kind.bits, field[1]), None)
+    return variables
+
+
+def asl_to_lang(string, fields, LangVisitor, cse=False, stats=None, variables=None, sink=None):
     """Converts the given processed ASL string into a code snippet
 
     For instance the following ASL code::
@@ -20,7 +73,7 @@ def asl_to_lang(string, fields, LangVisitor):
     `[(op, 5)]` will be passed into :func:`asl_to_lang`. The result of the
     function call would be the string (in the case of a c visitor)::
 
-        int64_t bits_f = 5 * (u_int64_t)op + 3;
+        int64_t bits_f = 5 * (uint64_t)op + 3;
 
     And the variable table::
 
@@ -31,6 +84,11 @@ def asl_to_lang(string, fields, LangVisitor):
     Note that the code for `bits_d` is not generated but this information is
     passed out via the variable table.
 
+    The function is reentrant, every call translates with its own visitors and
+    variable table, so it can be called concurrently from several threads (for
+    instance from a thread pool) as long as they don't share a stats dict or a
+    sink. Builtins should be registered before translating.
+
     :param string: ASL snippet string. The ASL code has to contain special
                    tokens for structure instead of indentation and newlines.
     :type string: str
@@ -39,22 +97,208 @@ def asl_to_lang(string, fields, LangVisitor):
     :type fields: [(str, int)]
     :param LangVisitor: The visitor class to use on the ast
     :type LangVisitor: class
+    :param cse: Whether to hoist repeated pure subexpressions into temporaries
+    :type cse: bool
+    :param stats: If given, the statistics of the translation are added to
+                  this dict. "translated" counts the snippets and
+                  "fast_path" those that were translated by
+                  :func:`translate_fast` without parsing them. With cse,
+                  "cse_eliminated" counts the subexpressions that were
+                  replaced by a temporary.
+    :type stats: {str: int} or None
+    :param variables: Further pre-existing variables (for instance those
+                      declared by an earlier snippet) as a mapping from name to
+                      (type, value) where value is the constant value or None
+    :type variables: {str: (ASLType or None, Any or None)} or None
+    :param sink: If given, the generated code is not returned but streamed to
+                 this function line by line, it is called with the depth of
+                 the line (the level of indentation) and the line. See
+                 :func:`file_sink` for writing the code to a file.
+    :type sink: function or None
 
     :returns: A pair containing a variable map and the generated c code. The
               variable map maps from variable name to if it already existed
               before the snippet, its type (if known) and its value (if it's a
-              known constant).
+              known constant). Constant bitstrings are represented as
+              :class:`BitVec`. The code is None if a sink is given.
     :rtype: ({str: (bool, ASLType or None, Any)}, [str])
     """
 
-    input = InputStream(string)
-    lexer = ASLLexer(input)
-    stream = CommonTokenStream(lexer)
-    parser = ASLParser(stream)
-    tree = parser.start()
-    variables = {}
-    for field in fields:
-        variables[field[0]] = (ASLType(ASLType.Kind.bits, field[1]), None)
-    visitor = LangVisitor(variables)
-    generated_code = visitor.visit(tree)
-    return visitor.variables, generated_code
+    variables = input_variables(fields, variables)
+    visitor = LangVisitor(variables, cse)
+    generated_code = translate_fast(string, visitor) if FAST_PATH else None
+    if stats is not None:
+        stats["translated"] = stats.get("translated", 0) + 1
+        stats["fast_path"] = stats.get("fast_path", 0) + (generated_code is not None)
+    if generated_code is None:
+        visitor = LangVisitor(variables, cse)
+        generated_code = visitor.visit(parse_snippet(string))
+    if stats is not None and cse:
+        stats["cse_eliminated"] = stats.get("cse_eliminated", 0) + visitor.cse_eliminated
+    if sink is not None:
+        for (depth, line) in iter_lines(generated_code):
+            sink(depth, line)
+        return visitor.variables, None
+    return visitor.variables, indent_lines(generated_code)
+
+
+class TranslationSession():
+    """Translates consecutive snippets with the variables of the earlier ones
+
+    Each snippet is translated by :func:`asl_to_lang` with the variables
+    (their types and constant values) known after the previous snippet, so for
+    instance `__execute` sees the constants of `__decode` and folds them. The
+    variables can be saved with :meth:`snapshot` and restored with
+    :meth:`restore`, :meth:`fork` starts an independent session from the
+    current variables (for instance for several encodings sharing a decode
+    prelude). A session must not be used by several threads at the same time,
+    fork it for each thread instead.
+
+    :param LangVisitor: The visitor class of the language
+    :type LangVisitor: class
+    :param fields: The fields, passed to every snippet, see :func:`asl_to_lang`
+    :type fields: [(str, int)]
+    :param cse: Whether to hoist repeated pure subexpressions into temporaries
+    :type cse: bool
+    :param stats: Dict the statistics of all translations are added to (opt)
+    :type stats: {str: int} or None
+    :param variables: Further pre-existing variables of the first snippet,
+                      see :func:`asl_to_lang`
+    :type variables: {str: (ASLType or None, Any or None)} or None
+
+    :ivar self.variables: The variables known to the next snippet
+    :vartype self.variables: {str: (ASLType or None, Any or None)}
+    """
+
+    def __init__(self, LangVisitor, fields=(), cse=False, stats=None, variables=None):
+        self.LangVisitor = LangVisitor
+        self.fields = list(fields)
+        self.cse = cse
+        self.stats = stats
+        self.variables = dict(variables) if variables is not None else {}
+
+    def translate(self, string, sink=None):
+        """Translates the next snippet and keeps its variables for the following ones
+
+        :param string: ASL snippet string, see :func:`asl_to_lang`
+        :type string: str
+        :param sink: If given, the code is streamed to it line by line instead
+                     of being returned, see :func:`asl_to_lang`
+        :type sink: function or None
+        :returns: The variable map and the code, see :func:`asl_to_lang`
+        :rtype: ({str: (bool, ASLType or None, Any)}, [str])
+        """
+
+        (variables, code) = asl_to_lang(string, self.fields, self.LangVisitor, self.cse, self.stats, self.variables,
+                                        sink)
+        self.variables = {var: (type, value) for (var, (existed, type, value)) in variables.items()}
+        return variables, code
+
+    def snapshot(self):
+        """Returns the current variables, they can be restored with :meth:`restore`
+
+        :rtype: {str: (ASLType or None, Any or None)}
+        """
+
+        return dict(self.variables)
+
+    def restore(self, snapshot):
+        """Makes the variables of a snapshot the ones known to the next snippet
+
+        :param snapshot: A result of :meth:`snapshot`
+        :type snapshot: {str: (ASLType or None, Any or None)}
+        """
+
+        self.variables = dict(snapshot)
+
+    def fork(self):
+        """Returns a new session with the same settings and current variables
+
+        :rtype: TranslationSession
+        """
+
+        return TranslationSession(self.LangVisitor, self.fields, self.cse, self.stats, self.variables)
+
+
+class SharedTypeVisitor(ASLTypeVisitor):
+    """(Internal) A type visitor that records the type of every node in a dict shared between visitors"""
+
+    def __init__(self, parent, results):
+        super().__init__(parent)
+        self.results = results
+
+    def visit(self, tree):
+        key = id(tree)
+        if key not in self.results:
+            self.results[key] = super().visit(tree)
+        return self.results[key]
+
+
+class SharedValueVisitor(ASLValueVisitor):
+    """(Internal) A value visitor that records the value of every node in a dict shared between visitors"""
+
+    def __init__(self, parent, results):
+        super().__init__(parent)
+        self.results = results
+
+    def visit(self, tree):
+        key = id(tree)
+        if key not in self.results:
+            self.results[key] = super().visit(tree)
+        return self.results[key]
+
+
+def asl_to_many(string, fields, backends, cse=False, stats=None, variables=None):
+    """Converts the given processed ASL string into code snippets of several languages
+
+    The snippet is parsed only once and the visitors of all backends are run
+    on the same tree. The type and value analysis does not depend on the
+    language, so the type and value of every expression is computed by the
+    first backend and looked up by the others. The result is the same as
+    calling :func:`asl_to_lang` for every backend.
+
+    :param string: ASL snippet string, see :func:`asl_to_lang`
+    :type string: str
+    :param fields: A list of fields, each specified by a name and a length (in
+                   bits).
+    :type fields: [(str, int)]
+    :param backends: The visitor classes of the languages, for instance
+                     `[CVisitor, PythonVisitor, VHDLVisitor]`
+    :type backends: [class]
+    :param cse: Whether to hoist repeated pure subexpressions into temporaries
+    :type cse: bool
+    :param stats: If given, the statistics of the translation are added to
+                  this dict (see :func:`asl_to_lang`), counted once per backend
+                  like separate calls of :func:`asl_to_lang`. The fast path is
+                  not used, the tree is parsed anyway.
+    :type stats: {str: int} or None
+    :param variables: Further pre-existing variables, see :func:`asl_to_lang`
+    :type variables: {str: (ASLType or None, Any or None)} or None
+
+    :returns: A pair containing the variable map (see :func:`asl_to_lang`) and
+              the generated code by the `language` of the visitor class
+    :rtype: ({str: (bool, ASLType or None, Any)}, {str: [str]})
+    """
+
+    assert backends, "At least one backend is needed"
+    tree = parse_snippet(string)
+    variables = input_variables(fields, variables)
+    types = {}
+    values = {}
+    result_variables = None
+    codes = {}
+    for LangVisitor in backends:
+        assert LangVisitor.language not in codes, "Duplicate backend: {0}".format(LangVisitor.language)
+        visitor = LangVisitor(variables, cse)
+        visitor.type_visitor = SharedTypeVisitor(visitor, types)
+        visitor.value_visitor = SharedValueVisitor(visitor, values)
+        generated_code = visitor.visit(tree)
+        if stats is not None:
+            stats["translated"] = stats.get("translated", 0) + 1
+            stats["fast_path"] = stats.get("fast_path", 0)
+        if stats is not None and cse:
+            stats["cse_eliminated"] = stats.get("cse_eliminated", 0) + visitor.cse_eliminated
+        if result_variables is None:
+            result_variables = visitor.variables
+        codes[LangVisitor.language] = indent_lines(generated_code)
+    return result_variables, codes
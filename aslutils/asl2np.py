@@ -0,0 +1,352 @@
+from .asl2 import asl_to_lang
+from .ASLParser import ASLParser
+from .asl2py import PythonVisitor
+from .asl_bitvec import BitPattern
+from .asl_compile import state_variables, variables_of
+from .asl_type import ASLType
+
+try:
+    import numpy
+except ImportError:  # numpy is only needed to run the generated code
+    numpy = None
+
+
+def numpy_constant(value):
+    """(Internal) Returns the code of a constant, integers are represented in two's complement"""
+
+    if isinstance(value, bool):
+        return str(value)
+    return str(int(value) & 0xffffffffffffffff)
+
+
+class NumpyVisitor(PythonVisitor):
+    """(Internal) Class that generates vectorized NumPy code from ASL Code
+
+    Externally, this should not be used directly, but via :func:`asl_to_np`.
+
+    Every variable is an array with one element per machine state, bitstrings
+    and integers are uint64 arrays (integers in two's complement) and booleans
+    are bool arrays. The generated code has no control flow: the statements of
+    all branches of `if` and `case` are executed one after the other and each
+    branch blends its assignments into the variables with the mask of the
+    states that take it (`numpy.where`). UNDEFINED and UNPREDICTABLE set the
+    status of the live states that reach them and remove them from the live
+    mask. The ended states keep executing, but their results are discarded.
+
+    The code expects the names `_n` (the number of states), `_lanes`
+    (`numpy.arange(_n)`), `_live` (bool array of the states that have not
+    ended) and `_status` (uint8 array) to be defined, see
+    :func:`vectorized_source`.
+
+    :param variables: A mapping from name to (type: ASLType or None, value) for
+                      all pre-existing variables.
+    :type variables: {str: (ASLType or None, Any or None)}
+    """
+
+    language = "np"
+
+    #: Builtins that are called in the runtime (see :func:`numpy_runtime`) instead of using the python templates
+    runtime_builtins = ("BitCount", "Ones", "Abs", "Min", "Max")
+
+    def __init__(self, variables, cse=False):
+        super().__init__(variables, cse)
+        self.masks = []
+        self.block_masks = []
+        self.mask_count = 0
+
+    def constant(self, value):
+        return numpy_constant(value)
+
+    def declaration(self, name, type, value):
+        dtype = "bool_" if type is not None and type.type == ASLType.Kind.bool else "uint64"
+        if value is None:
+            return "{0} = np.zeros(_n, np.{1})".format(name, dtype)
+        return "{0} = Vector({1}, _n, np.{2})".format(name, value, dtype)
+
+    def assignment(self, name, value):
+        if not self.masks:
+            return "{0} = {1}".format(name, value)
+        return "{0} = np.where({1}, {2}, {0})".format(name, self.masks[-1], value)
+
+    def visitBlock(self, ctx: ASLParser.BlockContext):
+        name = "_m{0}".format(self.mask_count)
+        self.mask_count += 1
+        self.masks.append(name)
+        lines = self.block_statements(ctx)
+        self.masks.pop()
+        self.block_masks.append(name)
+        return lines
+
+    def conditional(self, branches):
+        names = self.block_masks[-len(branches):]
+        del self.block_masks[-len(branches):]
+        rest = self.masks[-1] if self.masks else None
+        result = []
+        for (i, ((condition, _), name)) in enumerate(zip(branches, names)):
+            if condition is None:
+                result.append("{0} = {1}".format(name, rest))
+                continue
+            condition = "Vector({0}, _n, np.bool_)".format(condition)
+            result.append("{0} = {1}".format(name, "{0} & {1}".format(rest, condition) if rest else condition))
+            if i < len(branches) - 1:
+                rest_name = "{0}_rest".format(name)
+                result.append("{0} = {1} & ~{2}".format(rest_name, rest, name) if rest else
+                              "{0} = ~{1}".format(rest_name, name))
+                rest = rest_name
+        for (_, lines) in branches:
+            result += lines
+        return result
+
+    def case_condition(self, expr, literal_or_ident):
+        if isinstance(literal_or_ident, ASLParser.LiteralContext) and literal_or_ident.BitPattern():
+            pattern = self.value_visitor.visit(literal_or_ident)
+            return "(({0}) & {1}) == ({2})".format(expr, pattern.mask, pattern.value)
+        return "({0}) == ({1})".format(expr, self.visit(literal_or_ident))
+
+    def element(self, name, indices):
+        # the element of every state, states are the first axis of arrays
+        return "{0}[_lanes, {1}]".format(name, ", ".join(indices))
+
+    def bit_not(self, code):
+        # the complement of a python int is negative, which numpy cannot combine with uint64
+        return "~np.uint64({0})".format(code)
+
+    def visitSimpleStatement(self, ctx: ASLParser.SimpleStatementContext):
+        mask = "{0} & _live".format(self.masks[-1]) if self.masks else "_live"
+        if ctx.Undefined() or ctx.Unpredictable():
+            return ["_status[{0}] = {1}".format(mask, 1 if ctx.Undefined() else 2),
+                    "_live = _live & ~({0})".format(self.masks[-1]) if self.masks else "_live[:] = False"]
+        elif ctx.Assert():
+            return ["assert np.all(~({0}) | ({1}))".format(mask, self.visit(ctx.expression(0)))]
+        return super().visitSimpleStatement(ctx)
+
+    def template_code(self, name, args, operands):
+        if name in self.runtime_builtins:
+            return None
+        # the python templates are correct modulo 2**64
+        self.language = "py"
+        try:
+            return super().template_code(name, args, operands)
+        finally:
+            self.language = "np"
+
+    def is_integer(self, ctx: ASLParser.ExpressionContext):
+        """(Internal) Returns whether the operands of a binary expression are integers (signed)"""
+
+        for expression in ctx.expression():
+            type = self.type_visitor.visit(expression)
+            if type is not None and type.type == ASLType.Kind.int:
+                return True
+        return False
+
+    def expression_code(self, ctx: ASLParser.ExpressionContext):
+        val = self.value_visitor.visit(ctx)
+        if val is not None and not isinstance(val, BitPattern):
+            self.type_visitor.visit(ctx)
+            return self.constant(val)
+        if ctx.If():
+            texts = [self.visit(expression) for expression in ctx.expression()]
+            return "np.where({0}, {1}, {2})".format(*texts)
+        elif ctx.Negation():
+            return "~({0})".format(self.visit(ctx.expression(0)))
+        elif ctx.In():
+            text = self.visit(ctx.expression(0))
+            comparisons = []
+            for expression in ctx.expression()[1:]:
+                value = self.value_visitor.visit(expression)
+                if isinstance(value, BitPattern):
+                    comparisons.append("((({0}) & {1}) == {2})".format(text, value.mask, value.value))
+                else:
+                    comparisons.append("(({0}) == ({1}))".format(text, self.visit(expression)))
+            return " | ".join(comparisons)
+        elif ctx.Identifier() and ctx.LeftBracket():
+            return self.element(ctx.Identifier().getText(), [self.visit(expression) for expression in ctx.expression()])
+        elif ctx.Land() or ctx.Lor():
+            texts = [self.visit(expression) for expression in ctx.expression()]
+            return "({0}) {2} ({1})".format(texts[0], texts[1], "&" if ctx.Land() else "|")
+        elif self.is_integer(ctx) and (ctx.Greater() or ctx.Less() or ctx.GreaterEqual() or ctx.LessEqual()):
+            texts = [self.visit(expression) for expression in ctx.expression()]
+            operator = ">" if ctx.Greater() else "<" if ctx.Less() else ">=" if ctx.GreaterEqual() else "<="
+            return "Signed({0}) {2} Signed({1})".format(texts[0], texts[1], operator)
+        elif self.is_integer(ctx) and (ctx.Div() or ctx.Mod()):
+            texts = [self.visit(expression) for expression in ctx.expression()]
+            operator = "//" if ctx.Div() else "%"
+            return "Unsigned(Signed({0}) {2} Signed({1}))".format(texts[0], texts[1], operator)
+        return super().expression_code(ctx)
+
+
+def asl_to_np(string, fields, cse=False, stats=None, variables=None):
+    """Converts the given processed ASL string into a vectorized NumPy program snippet
+
+    Calls :func:`asl_to_lang`, for more information check it's documentation.
+    See :class:`NumpyVisitor` for the names the snippet expects.
+
+    :param string: ASL snippet string. The ASL code has to contain special
+                   tokens for structure instead of indentation and newlines.
+    :type string: str
+    :param fields: A list of fields, each specified by a name and a length (in
+                   bits).
+    :type fields: [(str, int)]
+    :param cse: Whether to hoist repeated pure subexpressions into temporaries
+    :type cse: bool
+    :param stats: Dict the statistics of the translation are added to (opt)
+    :type stats: {str: int} or None
+    :param variables: Additional pre-existing variables as (type, value) (opt)
+    :type variables: {str: (ASLType or None, Any or None)} or None
+
+    :returns: A pair containing a variable map and the generated code.
+    :rtype: ({str: (bool, ASLType or None, Any)}, [str])
+    """
+
+    return asl_to_lang(string, fields, NumpyVisitor, cse, stats, variables)
+
+
+def vectorized_source(decode, execute, fields, state=(), name="execute", cse=False):
+    """Returns the python source of a function executing one encoding on many states at once
+
+    The function takes a mapping from field name to field values and the state
+    (a dict) as arguments, as well as the number of states n (by default the
+    length of the first array among them). Values may be arrays with one
+    element per state or scalars which are the same for all states. Arrays of
+    the state (see :func:`encoding_source`) have the shape (n, number of
+    elements). The state is updated with the new arrays, where states that
+    ended in UNDEFINED or UNPREDICTABLE keep their old values, and the status
+    of every state is returned as uint8 array (0 if the instruction was
+    executed, 1 if it was UNDEFINED and 2 if it was UNPREDICTABLE).
+
+    :param decode: The processed ASL code of `__decode` or None
+    :type decode: str or None
+    :param execute: The processed ASL code of `__execute`
+    :type execute: str
+    :param fields: The fields of the encoding as (name, start, run)
+    :type fields: [(str, int, int)]
+    :param state: The variables of the state, see :func:`encoding_source`
+    :type state: [(str, int or None)] or [(str, int, int)]
+    :param name: The name of the function
+    :type name: str
+    :param cse: Whether to hoist repeated pure subexpressions into temporaries
+    :type cse: bool
+    :rtype: str
+    """
+
+    field_widths = [(field[0], field[2]) for field in fields]
+    variables = state_variables(state)
+    body = []
+    if decode:
+        (decode_vars, code) = asl_to_np(decode, field_widths, cse, variables=variables)
+        body += code
+        # the declarations of constants are not generated, execute might still need them
+        for (var, (existed, type, value)) in decode_vars.items():
+            if not existed and value is not None and not isinstance(value, BitPattern):
+                body.append("{0} = {1}".format(var, numpy_constant(value)))
+        variables = {var: (type, value) for (var, (existed, type, value)) in decode_vars.items()}
+    if execute:
+        body += asl_to_np(execute, field_widths, cse, variables=variables)[1]
+
+    inputs = ["fields[{0!r}]".format(field[0]) for field in fields] + \
+        ["state[{0!r}]".format(var) for var in variables_of(state)]
+    lines = ["def {0}(fields, state, n=None):".format(name),
+             "    _n = n if n is not None else Length({0})".format(", ".join(inputs)),
+             "    _lanes = np.arange(_n)",
+             "    _live = np.ones(_n, np.bool_)",
+             "    _status = np.zeros(_n, np.uint8)"]
+    for (field, start, run) in fields:
+        lines.append("    {0} = Vector(fields[{0!r}], _n)".format(field))
+    for entry in state:
+        if len(entry) > 2:
+            lines.append("    {0} = Vector(state[{0!r}], (_n, {1}))".format(entry[0], entry[2]))
+        else:
+            lines.append("    {0} = Vector(state[{0!r}], _n)".format(entry[0]))
+    lines += ["    " + line for line in body]
+    # states that ended keep their old values
+    for entry in state:
+        if len(entry) == 2:
+            lines.append("    state[{0!r}] = Vector(np.where(_live, {0}, state[{0!r}]), _n)".format(entry[0]))
+        else:
+            lines.append("    state[{0!r}] = Vector(np.where(_live[:, None], {0}, state[{0!r}]), (_n, {1}))"
+                         .format(entry[0], entry[2]))
+    lines.append("    return _status")
+    return "\n".join(lines) + "\n"
+
+
+def numpy_runtime():
+    """Returns the names available to the code generated by :func:`vectorized_source`
+
+    :raises ImportError: If numpy is not installed
+    :rtype: dict
+    """
+
+    if numpy is None:
+        raise ImportError("The vectorized backend requires numpy")
+    np = numpy
+
+    def Vector(x, shape, dtype=np.uint64):
+        result = np.empty(shape, dtype)
+        result[...] = np.asarray(x).astype(dtype)
+        return result
+
+    def Length(*values):
+        for value in values:
+            if np.ndim(value) > 0:
+                return len(value)
+        return 1
+
+    def Signed(x):
+        return np.asarray(x).astype(np.uint64).view(np.int64)
+
+    def Unsigned(x):
+        return np.asarray(x).astype(np.int64).view(np.uint64)
+
+    def UInt(x):
+        return x
+
+    def SInt(x, width):
+        sign = np.uint64(1 << (width - 1))
+        return (np.asarray(x, np.uint64) ^ sign) - sign
+
+    def ZeroExtend(x, width):
+        return x
+
+    def SignExtend(x, width, from_width):
+        result = SInt(x, from_width)
+        return result & np.uint64((1 << width) - 1) if width < 64 else result
+
+    def Replicate(x, count, width):
+        result = np.zeros(np.shape(x), np.uint64)
+        for i in range(int(np.max(count))):
+            result = np.where(i < count, (result << np.uint64(width)) | x, result)
+        return result
+
+    def BitCount(x):
+        x = np.asarray(x, np.uint64)
+        return sum((x >> np.uint64(i)) & np.uint64(1) for i in range(64))
+
+    def Ones(width):
+        return (1 << width) - 1 if width < 64 else 0xffffffffffffffff
+
+    def Abs(x):
+        return Unsigned(np.abs(Signed(x)))
+
+    def Min(a, b):
+        return Unsigned(np.minimum(Signed(a), Signed(b)))
+
+    def Max(a, b):
+        return Unsigned(np.maximum(Signed(a), Signed(b)))
+
+    return {name: value for (name, value) in locals().items()}
+
+
+def compile_vectorized(decode, execute, fields, state=(), name="execute", cse=False):
+    """Compiles `__decode` and `__execute` of an encoding into a vectorized function
+
+    See :func:`vectorized_source` for the parameters and the signature of the
+    returned function.
+
+    :raises ImportError: If numpy is not installed
+    :rtype: function
+    """
+
+    namespace = numpy_runtime()
+    exec(compile(vectorized_source(decode, execute, fields, state, name, cse), "<asl {0}>".format(name), "exec"),
+         namespace)
+    return namespace[name]
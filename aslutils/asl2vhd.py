@@ -1,12 +1,11 @@
 from .asl2 import asl_to_lang
 from .ASLParser import ASLParser
-from .ASLVisitor import ASLVisitor
+from .asl_bitvec import BitPattern
 from .asl_type import ASLType
-from .asl_type_visitor import ASLTypeVisitor
-from .asl_value_visitor import ASLValueVisitor
+from .asl_code_visitor import ASLCodeVisitor, CodeBlock
 
 
-class VHDLVisitor(ASLVisitor):
+class VHDLVisitor(ASLCodeVisitor):
     """(Internal) Class that generates VHDL code from ASL Code
 
     Externally, this should not be used directly, but via :func:`asl_to_vhdl`.
@@ -35,50 +34,63 @@ class VHDLVisitor(ASLVisitor):
     :vartype self.variables: {str: (bool, ASLType or None, Any or None)}
     """
 
-    def __init__(self, variables):
-        self.variables = {key: (True, value[0], value[1]) for (key, value) in variables.items()}
-        self.value_visitor = ASLValueVisitor(self)
-        self.type_visitor = ASLTypeVisitor(self)
+    language = "vhdl"
 
-    def visitStart(self, ctx: ASLParser.StartContext):
+    def declaration(self, name, type, value):
+        if value is None:
+            return None
+        return "{0} := {1};".format(name, value)
+
+    def assignment(self, name, value):
+        return "{0} := {1};".format(name, value)
+
+    def conditional(self, branches):
         result = []
-        for statement in ctx.statement():
-            result += self.visit(statement)
+        for i, (condition, lines) in enumerate(branches):
+            if condition is None:
+                result.append("else")
+            elif i == 0:
+                result.append("if ({0}) then".format(condition))
+            else:
+                result.append("elsif ({0}) then".format(condition))
+            result.append(lines if lines else CodeBlock(["null;"]))
+        result.append("end if;")
         return result
 
+    def case_condition(self, expr, literal_or_ident):
+        if isinstance(literal_or_ident, ASLParser.LiteralContext) and literal_or_ident.BitPattern():
+            return self.match_pattern(expr, self.value_visitor.visit(literal_or_ident))
+        return "({0}) = {1}".format(expr, self.visit(literal_or_ident))
+
+    def match_pattern(self, code, pattern, equal=True):
+        return "(({0}) and {1}) {3} {2}".format(code, pattern.mask, pattern.value, "=" if equal else "/=")
+
+    def shift_right(self, code, amount):
+        return "({0}) srl {1}".format(code, amount)
+
+    def shift_left(self, code, amount):
+        return "({0}) sll {1}".format(code, amount)
+
+    def bit_and(self, code, mask):
+        return "({0}) and {1}".format(code, mask)
+
+    def bit_or(self, codes):
+        return " or ".join(map(lambda c: "({0})".format(c), codes))
+
+    def bit_not(self, code):
+        return "not ({0})".format(code)
+
+    def mask_constant(self, mask):
+        return str(mask)
+
     def visitStatement(self, ctx: ASLParser.StatementContext):
         result = []
         if ctx.simpleStatement():
             return self.visit(ctx.simpleStatement())
         elif ctx.If():
-            result.append("if ({0}) then".format(self.visit(ctx.expression(0))))
-            result += self.visit(ctx.block(0))
-            result.append("end if;")
-            for i in range(len(ctx.Elsif())):
-                result.append("elsif ({0}) then".format(self.visit(ctx.expression(i+1))))
-                result += self.visit(ctx.block(i+1))
-                result.append("end if;")
-            if ctx.Else():
-                result.append("else")
-                result += self.visit(ctx.block()[-1])
-                result.append("end if;")
+            return self.visitIf(ctx)
         elif ctx.Case():
-            expr = self.visit(ctx.expression(0))
-            first = True
-            for i in range(len(ctx.When())):
-                literal_or_ident = self.visit(ctx.getChild(i*3 + 5))
-                # TODO: Handle bitpatterns correctly
-                if first:
-                    result.append("if (({0}) = {1}) then".format(expr, literal_or_ident))
-                    first = False
-                else:
-                    result.append("elsif (({0}) == {1}) then".format(expr, literal_or_ident))
-                result += self.visit(ctx.block(i))
-                result.append("end if;")
-            if ctx.Otherwise():
-                result.append("else")
-                result += self.visit(ctx.block()[-1])
-                result.append("end if;")
+            return self.visitCase(ctx, self.case_condition)
         else:
             print(ctx.getText())
             assert False
@@ -90,7 +102,7 @@ class VHDLVisitor(ASLVisitor):
             if ctx.Assign():
                 name = self.visit(ctx.assignableExpr(0))
                 if not name:
-                    return result
+                    return self.assign_target(ctx.assignableExpr(0), ctx.expression(0))
                 if not ctx.typeName():
                     if name in self.variables:
                         type = self.variables[name][1]
@@ -98,22 +110,18 @@ class VHDLVisitor(ASLVisitor):
                         type = self.type_visitor.visit(ctx.expression(0))
                 else:
                     type = self.type_visitor.visit(ctx.typeName())
-                expr_code = self.visit(ctx.expression(0))
                 if type is None:
                     print("Warning: Could not find type of", ctx.getText(), "assuming bits")
                     type = ASLType(ASLType.Kind.bits)
-                if name not in self.variables:
-                    self.variables[name] = (False, type, self.value_visitor.visit(ctx.expression(0)))
-                    if self.variables[name][2] is None:
-                        result.append("{0} := {1};".format(name, expr_code))
-                else:
-                    result.append("{0} := {1};".format(name, expr_code))
+                value = self.value_visitor.visit(ctx.expression(0))
+                result += self.assign(name, type, value, lambda: self.visit(ctx.expression(0)))
             else:
                 for var in ctx.assignableExpr():
                     name = self.visit(var)
                     type = self.type_visitor.visit(ctx.typeName())
                     result.append("{0} {1};".format(type.c_type(), name))
                     self.variables[name] = (False, type, None)
+                    self.declared.add(name)
         elif ctx.Undefined():
             result.append("undefined();")
         elif ctx.Unpredictable():
@@ -130,32 +138,26 @@ class VHDLVisitor(ASLVisitor):
             assert False
         return result
 
-    def visitBlock(self, ctx: ASLParser.BlockContext):
-        stmts = []
-        if ctx.Start():
-            for statement in ctx.statement():
-                stmts += self.visit(statement)
-        else:
-            for simpleStatement in ctx.simpleStatement():
-                stmts += self.visit(simpleStatement)
-        return list(map(lambda s: "    " + s, stmts))
-
-    def visitExpression(self, ctx: ASLParser.ExpressionContext):
+    def expression_code(self, ctx: ASLParser.ExpressionContext):
         # make sure that there are no type errors
         type = self.type_visitor.visit(ctx)
         # check to see if we can skip code generation and directly insert
         val = self.value_visitor.visit(ctx)
-        if val:
-            if type == ASLType.Kind.bool:
+        if val is not None and not isinstance(val, BitPattern):
+            if type is not None and type.type == ASLType.Kind.bool:
                 return str(val).lower()
             else:
                 return str(val)
+        # slices and concatenations are lowered to shifts and masks
+        if ctx.Colon() or (not ctx.In() and not ctx.Dot() and ctx.LeftBrace()):
+            return self.bits_code(ctx)
+        texts = list(map(lambda x: self.visit(x), ctx.expression()))
         if ctx.expression(0):
-            text1 = self.visit(ctx.expression(0))
+            text1 = texts[0]
         if ctx.expression(1):
-            text2 = self.visit(ctx.expression(1))
+            text2 = texts[1]
         if ctx.If():
-            text3 = self.visit(ctx.expression(2))
+            text3 = texts[2]
             return "({0}) ? ({1}) : ({2})".format(text1, text2, text3)
         elif ctx.literal():
             return self.visit(ctx.literal())
@@ -165,37 +167,21 @@ class VHDLVisitor(ASLVisitor):
         elif not ctx.Identifier() and ctx.LeftParen():
             return text1
         elif ctx.Identifier() and ctx.LeftParen():
-            args = list(map(lambda x: self.visit(x), ctx.expression()))
+            args = texts
+            code = self.builtin_code(ctx, args)
+            if code is not None:
+                return code
             return "{0}({1})".format(ctx.Identifier().getText(), ", ".join(args))
         elif ctx.LeftBracket():
-            args = list(map(lambda x: self.visit(x), ctx.expression()))
+            args = texts
             return "{0}[{1}]".format(ctx.Identifier().getText(), ", ".join(args))
         elif not ctx.In() and ctx.LeftBrace():
-            if ctx.Dot():
-                assert False
-                return None
-            else:
-                cur_idx = ctx.getChildCount() - 3
-                total_bits = "0"
-                slices = []
-                while True:
-                    expr_text = self.visit(ctx.getChild(cur_idx + 1))
-                    if ctx.getChild(cur_idx).getSymbol().type == ASLParser.RangeDown:
-                        min_slice = self.visit(ctx.getChild(cur_idx - 1))
-                        length = "({0}) - ({1})".format(expr_text, min_slice)
-                    else:
-                        length = "1"
-                    slices.append("(({0}) slr (({1}) - ({3}) - ({2}))) and ({3})".format(text1, expr_text, total_bits, length))
-                    total_bits += " + ({0})".format(length)
-                    if ctx.getChild(cur_idx).getSymbol().type == ASLParser.LeftBrace:
-                        break
-                    else:
-                        cur_idx -= 2
-                return " or ".join(slices)
+            assert False
+            return None
         elif ctx.Dot():
-            return "{0}.{1}".format(self.visit(ctx.expression(0)), ctx.Identifier().getText())
+            return "{0}.{1}".format(text1, ctx.Identifier().getText())
         elif ctx.Not():
-            text = self.visit(ctx.expression(0))
+            text = text1
             return "not({0})".format(text)
         elif ctx.Plus() or ctx.Minus():
             if ctx.expression(1):
@@ -204,22 +190,26 @@ class VHDLVisitor(ASLVisitor):
             elif ctx.Minus():
                 return "-" + text1
             else:
-                return text
+                return text1
         elif ctx.Negation():
-            return "not({})".format(self.visit(ctx.expression(0)))
+            return "not({})".format(text1)
         elif ctx.In():
-            exprs = list(map(lambda x: self.visit(x), ctx.expression()))
+            exprs = texts
             strs = []
             for i in range(1, len(exprs)):
-                strs.append("({0}) = ({1})".format(exprs[0], exprs[i]))
-            return " || ".join(strs)
+                pattern = self.value_visitor.visit(ctx.expression(i))
+                if isinstance(pattern, BitPattern):
+                    strs.append(self.match_pattern(exprs[0], pattern))
+                else:
+                    strs.append("({0}) = ({1})".format(exprs[0], exprs[i]))
+            return " or ".join(strs)
+        elif (ctx.Equal() or ctx.NotEqual()) and self.pattern_operand(ctx) is not None:
+            (index, pattern) = self.pattern_operand(ctx)
+            return "({0})".format(self.match_pattern(texts[1 - index], pattern, bool(ctx.Equal())))
         elif ctx.Unknown():
             return "0"
         elif ctx.Identifier():
             return ctx.Identifier().getText()
-        elif ctx.Colon():
-            type2 = self.type_visitor.visit(ctx.expression(1))
-            return "({0}) + (({1}) sll ({2}))".format(text2, text1, type2.value)
         else:
             if ctx.Mult():
                 operator = "*"
@@ -258,12 +248,6 @@ class VHDLVisitor(ASLVisitor):
                 operator = ""
             return "({0}) {2} ({1})".format(text1, text2, operator)
 
-    def visitAssignableExpr(self, ctx: ASLParser.AssignableExprContext):
-        if ctx.Identifier() and not ctx.LeftBracket():
-            return ctx.Identifier().getText()
-        else:
-            return None
-
     def visitLiteral(self, ctx: ASLParser.LiteralContext):
         if ctx.Integer():
             return ctx.Integer().getText()
@@ -282,11 +266,8 @@ class VHDLVisitor(ASLVisitor):
         else:
             return ctx.String().getText()
 
-    def visitErrorNode(self, node):
-        raise Exception("Error")
-
 
-def asl_to_vhdl(string, fields):
+def asl_to_vhdl(string, fields, sink=None):
     """Converts the given processed ASL string into a vhdl process snippet
 
     Calls :func:`asl_to_lang`, for more information check it's documentation.
@@ -297,6 +278,9 @@ def asl_to_vhdl(string, fields):
     :param fields: A list of fields, each specified by a name and a length (in
                    bits).
     :type fields: [(str, int)]
+    :param sink: If given, the code is streamed to it line by line instead of
+                 being returned, see :func:`asl_to_lang`
+    :type sink: function or None
 
     :returns: A pair containing a variable map and the generated c code. The
               variable map maps from variable name to if it already existed
@@ -304,4 +288,4 @@ def asl_to_vhdl(string, fields):
               known constant).
     :rtype: ({str: (bool, ASLType or None, Any)}, [str])
     """
-    return asl_to_lang(string, fields, VHDLVisitor)
+    return asl_to_lang(string, fields, VHDLVisitor, sink=sink)
@@ -0,0 +1,176 @@
+class BitVec():
+    """Constant bitstring of a fixed length
+
+    The value is always kept in the range of the length, so operations such as
+    NOT, addition or shifts wrap around like they do in ASL. Operands may be
+    other bitstrings or python ints. Converting a bitstring to str gives its
+    value as decimal number.
+
+    :param value: The value of the bitstring (is truncated to the length)
+    :type value: int
+    :param width: The length of the bitstring
+    :type width: int
+    """
+
+    __slots__ = ("value", "width")
+
+    def __init__(self, value, width):
+        self.value = value & ((1 << width) - 1)
+        self.width = width
+
+    @classmethod
+    def from_string(cls, string):
+        """Returns the bitstring of an ASL bitvector literal without quotes (e.g. "0101")"""
+
+        string = string.replace(" ", "")
+        return cls(int(string, 2) if string else 0, len(string))
+
+    def __int__(self):
+        return self.value
+
+    def __index__(self):
+        return self.value
+
+    def __bool__(self):
+        return self.value != 0
+
+    def __eq__(self, other):
+        if type(other) == BitVec:
+            return self.value == other.value and self.width == other.width
+        elif isinstance(other, int):
+            return self.value == other
+        else:
+            return NotImplemented
+
+    def __hash__(self):
+        return hash(self.value)
+
+    def __lt__(self, other):
+        return self.value < int(other)
+
+    def __le__(self, other):
+        return self.value <= int(other)
+
+    def __gt__(self, other):
+        return self.value > int(other)
+
+    def __ge__(self, other):
+        return self.value >= int(other)
+
+    def __str__(self):
+        return str(self.value)
+
+    def __repr__(self):
+        return "BitVec('{0}')".format(self.to_string())
+
+    def to_string(self):
+        """Returns the bits as a string without quotes (most significant first)"""
+
+        return format(self.value, "0{0}b".format(self.width)) if self.width else ""
+
+    def __invert__(self):
+        return BitVec(~self.value, self.width)
+
+    def __neg__(self):
+        return BitVec(-self.value, self.width)
+
+    def __and__(self, other):
+        return BitVec(self.value & int(other), self.width)
+
+    def __or__(self, other):
+        return BitVec(self.value | int(other), self.width)
+
+    def __xor__(self, other):
+        return BitVec(self.value ^ int(other), self.width)
+
+    def __add__(self, other):
+        return BitVec(self.value + int(other), self.width)
+
+    def __sub__(self, other):
+        return BitVec(self.value - int(other), self.width)
+
+    def __mul__(self, other):
+        return BitVec(self.value * int(other), self.width)
+
+    def __lshift__(self, amount):
+        return BitVec(self.value << int(amount), self.width)
+
+    def __rshift__(self, amount):
+        return BitVec(self.value >> int(amount), self.width)
+
+    __rand__ = __and__
+    __ror__ = __or__
+    __rxor__ = __xor__
+    __radd__ = __add__
+    __rmul__ = __mul__
+
+    def __rsub__(self, other):
+        return BitVec(int(other) - self.value, self.width)
+
+    def slice(self, low, width):
+        """Returns the width bits starting at bit low as a new bitstring"""
+
+        return BitVec(self.value >> low, width)
+
+    def concat(self, other):
+        """Returns the concatenation of self (most significant) and other"""
+
+        return BitVec((self.value << other.width) | other.value, self.width + other.width)
+
+    def signed(self):
+        """Returns the value interpreted as two's complement integer"""
+
+        if self.width and self.value >> (self.width - 1):
+            return self.value - (1 << self.width)
+        return self.value
+
+
+class BitPattern():
+    """Constant bitstring of a fixed length that may contain don't care bits
+
+    :param value: The bits that have to match (don't care bits are 0)
+    :type value: int
+    :param mask: Has the bits set that are not don't care
+    :type mask: int
+    :param width: The length of the pattern
+    :type width: int
+    """
+
+    __slots__ = ("value", "mask", "width")
+
+    def __init__(self, value, mask, width):
+        self.value = value & mask
+        self.mask = mask
+        self.width = width
+
+    @classmethod
+    def from_string(cls, string):
+        """Returns the pattern of an ASL bitpattern literal without quotes (e.g. "01x1")"""
+
+        string = string.replace(" ", "")
+        value = string.translate({ord('x'): '0'})
+        mask = string.translate({ord('x'): '0', ord('0'): '1'})
+        return cls(int(value, 2) if string else 0, int(mask, 2) if string else 0, len(string))
+
+    def __eq__(self, other):
+        if type(other) == BitPattern:
+            return self.value == other.value and self.mask == other.mask and self.width == other.width
+        else:
+            return NotImplemented
+
+    def __hash__(self):
+        return hash((self.value, self.mask))
+
+    def __repr__(self):
+        return "BitPattern('{0}')".format(self.to_string())
+
+    def to_string(self):
+        """Returns the pattern as a string without quotes (most significant first)"""
+
+        return "".join("x" if not (self.mask >> i) & 1 else str((self.value >> i) & 1)
+                       for i in reversed(range(self.width)))
+
+    def matches(self, value):
+        """Returns whether the bitstring (BitVec or int) matches the pattern"""
+
+        return (int(value) & self.mask) == self.value
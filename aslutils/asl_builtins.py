@@ -0,0 +1,407 @@
+import ast
+import re
+
+from .asl_type import ASLTranslationError, ASLType, bits_c_literal, bits_c_type
+
+
+class Builtin():
+    """Describes a function of the pseudocode library
+
+    A builtin consists of up to three rules. The type rule is used by
+    :class:`ASLTypeVisitor` to infer the type of a call, the evaluation rule is
+    used by :class:`ASLValueVisitor` to fold calls with constant arguments and
+    the templates are used by the code generators to emit the call.
+
+    :param name: The name of the function
+    :type name: str
+    :param type_rule: Either the ASLType of the result or a function taking the
+                      list of argument types (ASLType or None) and a function
+                      that returns the constant value of the argument with the
+                      given index (or None) and returning the ASLType of the
+                      result or None.
+    :type type_rule: ASLType or function or None
+    :param evaluate: A function taking the list of constant argument values and
+                     the list of argument types and returning the value of the
+                     call or None if it cannot be computed.
+    :type evaluate: function or None
+    :param templates: Maps from the name of a backend ("c", "py", "vhdl") to
+                      either a format string which is formatted with the code
+                      of the arguments or a function taking the list of
+                      argument codes, the list of argument types and the list of
+                      constant argument values (None if unknown) and returning
+                      the code or None if the template is not applicable.
+    :type templates: {str: str or function}
+    :param pure: Whether the function has no side effects
+    :type pure: bool
+    """
+
+    def __init__(self, name, type_rule=None, evaluate=None, templates=None, pure=True):
+        self.name = name
+        self.type_rule = type_rule
+        self.evaluate = evaluate
+        self.templates = templates if templates is not None else {}
+        self.pure = pure
+
+    def type(self, types, value):
+        """Returns the type of a call with arguments of the given types
+
+        :param types: The types of the arguments
+        :type types: [ASLType or None]
+        :param value: Returns the constant value of the argument with the given
+                      index or None
+        :type value: function
+        """
+
+        if self.type_rule is None:
+            return None
+        elif isinstance(self.type_rule, ASLType):
+            return self.type_rule
+        else:
+            return self.type_rule(types, value)
+
+
+#: The registered builtins by name
+BUILTINS = {}
+
+
+def register_builtin(name, type_rule=None, evaluate=None, templates=None, pure=True):
+    """Registers (or replaces) the builtin with the given name
+
+    See :class:`Builtin` for a description of the parameters.
+
+    :returns: The registered builtin
+    :rtype: Builtin
+    """
+
+    builtin = Builtin(name, type_rule, evaluate, templates, pure)
+    BUILTINS[name] = builtin
+    return builtin
+
+
+def register_signature(signature, evaluate=None, templates=None, pure=True):
+    """Registers a builtin given its ASL signature
+
+    The type rule is derived from the signature. Lengths of bitstring
+    parameters and integer parameters can be used in the length of the result,
+    for example::
+
+        register_signature("bits(M*N) Replicate(bits(M) x, integer N)")
+
+    The length may be any arithmetic expression (+, -, *, DIV) of names and
+    numbers. If a name is not bound by a call (for instance because of an
+    unknown length), the length of the result is unknown.
+
+    :param signature: The signature in ASL syntax
+    :type signature: str
+    :returns: The registered builtin
+    :rtype: Builtin
+    """
+
+    m = re.fullmatch(r"\s*(\w+(?:\s*\([^)]*\))?)\s+(\w+)\s*\((.*)\)\s*", signature)
+    assert m, "Invalid signature: " + signature
+    (result, name, parameters) = m.groups()
+    params = []
+    for parameter in filter(None, map(str.strip, parameters.split(","))):
+        pm = re.fullmatch(r"(\w+(?:\s*\([^)]*\))?)\s+(\w+)", parameter)
+        assert pm, "Invalid parameter: " + parameter
+        params.append(pm.groups())
+
+    def type_rule(types, value):
+        bindings = {}
+        for i, (param_type, param_name) in enumerate(params):
+            if i >= len(types):
+                break
+            bm = re.fullmatch(r"bits\s*\(\s*(\w+)\s*\)", param_type)
+            if bm and types[i] is not None and types[i].value is not None:
+                bindings.setdefault(bm.groups()[0], types[i].value)
+            elif param_type == "integer":
+                arg_value = value(i)
+                if isinstance(arg_value, int):
+                    bindings.setdefault(param_name, arg_value)
+        return signature_type(result, bindings)
+
+    return register_builtin(name, type_rule, evaluate, templates, pure)
+
+
+def signature_type(string, bindings):
+    """(Internal) Returns the ASLType for the type string of a signature given the bound names"""
+
+    bm = re.fullmatch(r"bits\s*\((.*)\)", string)
+    if bm:
+        return ASLType(ASLType.Kind.bits, evaluate_length(bm.groups()[0], bindings))
+    elif string == "bit":
+        return ASLType(ASLType.Kind.bits, 1)
+    elif string == "integer":
+        return ASLType(ASLType.Kind.int)
+    elif string == "boolean":
+        return ASLType(ASLType.Kind.bool)
+    elif string == "real":
+        return ASLType(ASLType.Kind.real)
+    else:
+        return ASLType(ASLType.Kind.other, string)
+
+
+def evaluate_length(string, bindings):
+    """(Internal) Evaluates the arithmetic length expression of a signature, None if unknown"""
+
+    def evaluate(node):
+        if isinstance(node, ast.Constant) and isinstance(node.value, int):
+            return node.value
+        elif isinstance(node, ast.Name):
+            return bindings.get(node.id)
+        elif isinstance(node, ast.BinOp):
+            left = evaluate(node.left)
+            right = evaluate(node.right)
+            if left is None or right is None:
+                return None
+            if isinstance(node.op, ast.Add):
+                return left + right
+            elif isinstance(node.op, ast.Sub):
+                return left - right
+            elif isinstance(node.op, ast.Mult):
+                return left * right
+            elif isinstance(node.op, ast.FloorDiv):
+                return left // right
+        raise ValueError("Unsupported length expression: " + string)
+
+    return evaluate(ast.parse(string.replace("DIV", "//"), mode="eval").body)
+
+
+def lookup_builtin(name):
+    """Returns the builtin registered for the function name or None"""
+
+    return BUILTINS.get(name)
+
+
+def width(types, index):
+    """(Internal) Returns the length of the bitstring argument with the given index or None"""
+
+    if index < len(types) and types[index] is not None:
+        return types[index].value
+    return None
+
+
+def runtime_width(name, types, args, count):
+    """(Internal) Returns the length of the first argument, which the code of the builtin name needs
+
+    The runtime functions take the length as additional last argument, so
+    calling them without it (or with arguments missing) doesn't work.
+
+    :raises ASLTranslationError: If the length is unknown or arguments are missing
+    """
+
+    if len(args) < count:
+        raise ASLTranslationError("{0} needs {1} arguments".format(name, count))
+    if width(types, 0) is None:
+        raise ASLTranslationError("{0} of a bitstring of unknown length".format(name))
+    return width(types, 0)
+
+
+def sign_extend(value, from_width, to_width):
+    """(Internal) Sign extends the value of length from_width to to_width bits"""
+
+    if value >> (from_width - 1):
+        value -= 1 << from_width
+    return value & ((1 << to_width) - 1)
+
+
+def eval_sint(values, types):
+    """(Internal) Evaluates SInt"""
+
+    if width(types, 0) is None:
+        return None
+    value = values[0]
+    return value - (1 << width(types, 0)) if value >> (width(types, 0) - 1) else value
+
+
+def eval_sign_extend(values, types):
+    """(Internal) Evaluates SignExtend"""
+
+    if width(types, 0) is None or len(values) < 2:
+        return None
+    return sign_extend(values[0], width(types, 0), values[1])
+
+
+def eval_replicate(values, types):
+    """(Internal) Evaluates Replicate"""
+
+    if width(types, 0) is None:
+        return None
+    result = 0
+    for _ in range(values[1]):
+        result = (result << width(types, 0)) | values[0]
+    return result
+
+
+def eval_highest_set_bit(values, types):
+    """(Internal) Evaluates HighestSetBit"""
+
+    return values[0].bit_length() - 1
+
+
+def eval_lowest_set_bit(values, types):
+    """(Internal) Evaluates LowestSetBit"""
+
+    if values[0] == 0:
+        return width(types, 0)
+    return (values[0] & -values[0]).bit_length() - 1
+
+
+def eval_count_leading_zero_bits(values, types):
+    """(Internal) Evaluates CountLeadingZeroBits"""
+
+    if width(types, 0) is None:
+        return None
+    return width(types, 0) - values[0].bit_length()
+
+
+def eval_is_ones(values, types):
+    """(Internal) Evaluates IsOnes"""
+
+    if width(types, 0) is None:
+        return None
+    return values[0] == (1 << width(types, 0)) - 1
+
+
+def eval_shift(values, types, shift):
+    """(Internal) Evaluates a shift of a bitstring, shift gets the value, amount and length"""
+
+    if width(types, 0) is None:
+        return None
+    return shift(values[0], values[1], width(types, 0)) & ((1 << width(types, 0)) - 1)
+
+
+def template_zero_extend(language):
+    """(Internal) Returns the template of ZeroExtend for the language"""
+
+    def template(args, types, values):
+        if language == "c" and len(values) > 1 and isinstance(values[1], int):
+            return "({0})({1})".format(bits_c_type(values[1]), args[0])
+        return args[0]
+    return template
+
+
+def template_sign_extend(language):
+    """(Internal) Returns the template of SignExtend for the language
+
+    In C the value is converted to the type of the result first, so the sign
+    is extended across all of its bits.
+    """
+
+    def template(args, types, values):
+        if width(types, 0) is None or len(values) < 2 or not isinstance(values[1], int):
+            return None
+        if language == "py":
+            sign = hex(1 << (width(types, 0) - 1))
+            return "((({0}) ^ {1}) - {1}) & {2}".format(args[0], sign, hex((1 << values[1]) - 1))
+        sign = bits_c_literal(1 << (width(types, 0) - 1))
+        code = "((({0})({1}) ^ {2}) - {2})".format(bits_c_type(values[1]), args[0], sign)
+        if values[1] in (64, 128):
+            return code
+        return "{0} & {1}".format(code, bits_c_literal((1 << values[1]) - 1))
+    return template
+
+
+def template_runtime_sign_extend(language):
+    """(Internal) Returns the template of SignExtend, falls back to the runtime if the result length is unknown"""
+
+    inline = template_sign_extend(language)
+
+    def template(args, types, values):
+        code = inline(args, types, values)
+        if code is None:
+            length = runtime_width("SignExtend", types, args, 2)
+            return "SignExtend({0}, {1}, {2})".format(args[0], args[1], length)
+        return code
+    return template
+
+
+def template_sint(language):
+    """(Internal) Returns the template of SInt for the language
+
+    In C bitstrings of more than 64 bits are converted to __int128.
+    """
+
+    def template(args, types, values):
+        length = runtime_width("SInt", types, args, 1)
+        if language == "c" and length > 64:
+            # rejects lengths without a C type
+            bits_c_type(length)
+            return "((__int128)(((unsigned __int128)({0}) ^ {1}) - {1}))".format(
+                args[0], bits_c_literal(1 << (length - 1)))
+        sign = hex(1 << (length - 1))
+        if language == "c":
+            return "(int64_t)(((uint64_t)({0}) ^ {1}) - {1})".format(args[0], sign)
+        return "((({0}) ^ {1}) - {1})".format(args[0], sign)
+    return template
+
+
+def template_replicate(language):
+    """(Internal) Returns the template of Replicate for the language
+
+    With a constant count the value is multiplied by the repunit 0b0..01 0..01
+    instead of calling the runtime.
+    """
+
+    def template(args, types, values):
+        length = runtime_width("Replicate", types, args, 2)
+        if isinstance(values[1], int):
+            repunit = sum(1 << (i * length) for i in range(values[1]))
+            if language == "py":
+                return "({0}) * {1}".format(args[0], hex(repunit))
+            elif length * values[1] <= 64:
+                return "((uint64_t)({0}) * {1})".format(args[0], hex(repunit))
+            # rejects lengths without a C type
+            bits_c_type(length * values[1])
+            return "((unsigned __int128)({0}) * {1})".format(args[0], bits_c_literal(repunit))
+        return "Replicate({0}, {1}, {2})".format(args[0], args[1], length)
+    return template
+
+
+def template_lsl(args, types, values):
+    """(Internal) Template of LSL for C and Python"""
+
+    if width(types, 0) is None:
+        return None
+    return "(({0}) << ({1})) & {2}".format(args[0], args[1], hex((1 << width(types, 0)) - 1))
+
+
+register_signature("bits(M*N) Replicate(bits(M) x, integer N)", eval_replicate,
+                   {"c": template_replicate("c"), "py": template_replicate("py")})
+register_signature("bits(N) Zeros(integer N)", lambda values, types: 0,
+                   {"c": "0", "py": "0"})
+register_signature("bits(N) Ones(integer N)", lambda values, types: (1 << values[0]) - 1)
+register_signature("integer UInt(bits(N) x)", lambda values, types: values[0],
+                   {"c": "(int64_t)({0})", "py": "{0}"})
+register_signature("integer SInt(bits(N) x)", eval_sint,
+                   {"c": template_sint("c"), "py": template_sint("py")})
+register_signature("bits(N) ZeroExtend(bits(M) x, integer N)", lambda values, types: values[0],
+                   {"c": template_zero_extend("c"), "py": template_zero_extend("py")})
+register_signature("bits(N) SignExtend(bits(M) x, integer N)", eval_sign_extend,
+                   {"c": template_runtime_sign_extend("c"), "py": template_runtime_sign_extend("py")})
+register_signature("bits(32) T32ExpandImm(bits(12) imm12)")
+register_signature("bits(32) A32ExpandImm(bits(12) imm12)")
+register_signature("bits(64) AdvSIMDExpandImm(bit op, bits(4) cmode, bits(8) imm8)")
+register_signature("boolean IsZero(bits(N) x)", lambda values, types: values[0] == 0,
+                   {"c": "(({0}) == 0)", "py": "(({0}) == 0)"})
+register_signature("boolean IsOnes(bits(N) x)", eval_is_ones)
+register_signature("integer BitCount(bits(N) x)", lambda values, types: bin(values[0]).count("1"),
+                   {"c": "__builtin_popcountll({0})", "py": "bin({0}).count('1')"})
+register_signature("integer HighestSetBit(bits(N) x)", eval_highest_set_bit)
+register_signature("integer LowestSetBit(bits(N) x)", eval_lowest_set_bit)
+register_signature("integer CountLeadingZeroBits(bits(N) x)", eval_count_leading_zero_bits)
+register_signature("bits(N) LSL(bits(N) x, integer shift)",
+                   lambda values, types: eval_shift(values, types, lambda x, s, n: x << s),
+                   {"c": template_lsl, "py": template_lsl})
+register_signature("bits(N) LSR(bits(N) x, integer shift)",
+                   lambda values, types: eval_shift(values, types, lambda x, s, n: x >> s),
+                   {"c": "(({0}) >> ({1}))", "py": "(({0}) >> ({1}))"})
+register_signature("bits(N) ASR(bits(N) x, integer shift)",
+                   lambda values, types: eval_shift(values, types,
+                                                    lambda x, s, n: sign_extend(x, n, n + s) >> s))
+register_signature("bits(N) ROR(bits(N) x, integer shift)",
+                   lambda values, types: eval_shift(values, types,
+                                                    lambda x, s, n: (x >> (s % n)) | (x << (n - s % n))))
+register_signature("integer Abs(integer x)", lambda values, types: abs(values[0]))
+register_signature("integer Min(integer a, integer b)", lambda values, types: min(values))
+register_signature("integer Max(integer a, integer b)", lambda values, types: max(values))
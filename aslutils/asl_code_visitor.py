@@ -0,0 +1,823 @@
+import re
+
+from antlr4.tree.Tree import TerminalNode
+from .ASLParser import ASLParser
+from .ASLVisitor import ASLVisitor
+from .asl_bitvec import BitPattern, BitVec
+from .asl_type import ASLTranslationError, ASLType
+from .asl_builtins import lookup_builtin
+from .asl_type_visitor import ASLTypeVisitor, slice_ranges
+from .asl_value_visitor import ASLValueVisitor, match_value, plain_value
+
+
+#: Code consisting of a single name or number, which is not worth a temporary
+IDENTIFIER = re.compile(r"\w+")
+
+
+class CodeBlock(list):
+    """The lines of a nested block of generated code
+
+    The items are lines (str) or further nested blocks. A block is indented one
+    level deeper than the lines around it, but the indentation is only applied
+    when the code is output (see :func:`iter_lines`), so nesting a block does
+    not copy its lines.
+    """
+
+    pass
+
+
+def iter_lines(code, depth=0):
+    """Yields (depth, line) for every line of generated code
+
+    :param code: The lines, where nested :class:`CodeBlock` are one level
+                 deeper. Lines that are None are skipped.
+    :type code: [str or CodeBlock]
+    :param depth: The depth of the lines of code
+    :type depth: int
+    """
+
+    stack = [iter(code)]
+    while stack:
+        for line in stack[-1]:
+            if isinstance(line, CodeBlock):
+                stack.append(iter(line))
+                break
+            if line is not None:
+                yield (depth + len(stack) - 1, line)
+        else:
+            stack.pop()
+
+
+def indent_lines(code, indentation="    "):
+    """Returns the lines of generated code (see :func:`iter_lines`) with the indentation applied
+
+    :rtype: [str]
+    """
+
+    return [indentation * depth + line for (depth, line) in iter_lines(code)]
+
+
+def file_sink(file, indentation="    "):
+    """Returns a sink (see :func:`asl_to_lang`) writing the lines to a file
+
+    :param file: A file opened for writing text
+    :param indentation: The indentation of one level
+    :type indentation: str
+    """
+
+    def sink(depth, line):
+        file.write(indentation * depth)
+        file.write(line)
+        file.write("\n")
+    return sink
+
+
+class ASLCodeVisitor(ASLVisitor):
+    """(Internal) Base class of the visitors that generate code from ASL Code
+
+    Implements the language independent parts of code generation: keeping
+    track of the variables, propagating constant values through the snippet and
+    folding conditional statements whose conditions are known constants.
+
+    Constants are propagated through straight-line code. Assigning a constant
+    to a variable that has not been declared in the generated code yet does not
+    generate any code outside of conditional statements, the value is simply
+    recorded in :attr:`self.variables`. Branches of `if` and `case` statements
+    that can never be taken are dropped and if a branch is always taken its
+    code is inserted without the surrounding conditional. After a conditional
+    statement that could not be folded, only values which are the same on all
+    paths are kept.
+
+    If a variable that has not been declared in the generated code is assigned
+    inside of a branch (even a constant), its declaration is hoisted in front
+    of the enclosing top-level statement and the assignment is generated, so
+    the variable has its value after the conditional statement.
+
+    Slices and concatenations are lowered to shifts and masks by
+    :func:`bits_code`. Bounds that are known constants are folded into literal
+    shift amounts and masks and adjacent slices of the same value are
+    extracted at once.
+
+    Optionally, common subexpression elimination (CSE) is done. Pure
+    subexpressions (slices, concatenations and calls of pure builtins) that
+    are computed again later in the snippet are computed once into a temporary
+    variable which is declared in front of the statement that first uses it.
+    The temporary is reused as long as it is in scope and none of the
+    variables it depends on have been assigned to. Temporaries are only
+    introduced if they are reused (see :func:`find_reused`).
+
+    Subclasses have to implement :func:`expression_code`, :func:`declaration`, :func:`assignment`,
+    :func:`conditional`, :func:`shift_right`, :func:`shift_left`,
+    :func:`bit_and` and :func:`bit_or` and may override :func:`constant`,
+    :func:`mask_constant` and :func:`widen`.
+
+    :param variables: A mapping from name to (type: ASLType or None, value) for
+                      all pre-existing variables.
+    :type variables: {str: (ASLType or None, Any or None)}
+    :param cse: Whether to do common subexpression elimination
+    :type cse: bool
+
+    :ivar self.variables: A mapping from variable name to a tuple containing: a
+                     bool which signifies whether the variable already existed
+                     before the snippet (in this order), the type of the
+                     variable as an ASLType or None if unknown. The constant
+                     value of the variable or None if unknown.
+    :vartype self.variables: {str: (bool, ASLType or None, Any or None)}
+    :ivar self.declared: The names of all variables that exist in the generated
+                         code (pre-existing variables are included).
+    :vartype self.declared: {str}
+    :ivar self.cse_eliminated: The number of subexpressions that were replaced
+                               by a temporary
+    :vartype self.cse_eliminated: int
+    """
+
+    #: The name of the language used to select templates of builtins
+    language = None
+    #: The code of the literal 1 with the widest integer type of the language
+    one = "1"
+    #: Lengths of bitstrings whose operations wrap around without masking
+    wrapping_widths = ()
+
+    def __init__(self, variables, cse=False):
+        self.variables = {key: (True, value[0], value[1]) for (key, value) in variables.items()}
+        self.value_visitor = ASLValueVisitor(self)
+        self.type_visitor = ASLTypeVisitor(self)
+        self.declared = set(self.variables)
+        self.branch_depth = 0
+        self.hoisted = []
+        self.cse_reused = set() if cse else None
+        self.cse_scopes = [{}]
+        self.cse_pending = []
+        self.cse_temporaries = 0
+        self.cse_eliminated = 0
+
+    def expression_code(self, ctx: ASLParser.ExpressionContext):
+        """Returns the code of the expression as a str"""
+
+        raise NotImplementedError
+
+    def declaration(self, name, type, value):
+        """Returns the line declaring a variable (or None if no code is needed)
+
+        The value is the code of the initial value or None.
+        """
+
+        raise NotImplementedError
+
+    def assignment(self, name, value):
+        """Returns the line assigning the code value to the variable name"""
+
+        raise NotImplementedError
+
+    def conditional(self, branches):
+        """Returns the lines of a conditional statement
+
+        :param branches: A list of (condition, lines) where condition is the
+                         code of the condition or None for the final else
+                         branch and lines is the code of the branch as
+                         :class:`CodeBlock` (which should be added as single
+                         item to keep it nested).
+        :type branches: [(str or None, [str])]
+        """
+
+        raise NotImplementedError
+
+    def shift_right(self, code, amount):
+        """Returns the code shifting code right by amount (code or a decimal literal)"""
+
+        raise NotImplementedError
+
+    def shift_left(self, code, amount):
+        """Returns the code shifting code left by amount (code or a decimal literal)"""
+
+        raise NotImplementedError
+
+    def bit_and(self, code, mask):
+        """Returns the code of the bitwise and of code and mask"""
+
+        raise NotImplementedError
+
+    def bit_or(self, codes):
+        """Returns the code of the bitwise or of all codes"""
+
+        raise NotImplementedError
+
+    def bit_not(self, code):
+        """Returns the code of the bitwise complement of code"""
+
+        raise NotImplementedError
+
+    def element(self, name, indices):
+        """Returns the code of an element of an array, which can also be assigned to
+
+        :param indices: The code of the indices
+        :type indices: [str]
+        """
+
+        return "{0}[{1}]".format(name, ", ".join(indices))
+
+    def match_pattern(self, code, pattern, equal=True):
+        """Returns the code comparing code with a bitpattern, ignoring its don't care bits
+
+        :param pattern: The bitpattern
+        :type pattern: BitPattern
+        :param equal: Whether the code tests for a match (else for a mismatch)
+        :type equal: bool
+        """
+
+        raise NotImplementedError
+
+    def pattern_operand(self, ctx: ASLParser.ExpressionContext):
+        """(Internal) Returns the index and value of the first operand that is a constant bitpattern or None"""
+
+        for (index, expression) in enumerate(ctx.expression()):
+            value = self.value_visitor.visit(expression)
+            if isinstance(value, BitPattern):
+                return (index, value)
+        return None
+
+    def mask_constant(self, mask):
+        """Returns the code of the literal mask (an int)"""
+
+        return hex(mask)
+
+    def widen(self, code, type):
+        """Returns code converted to the type of a bitstring before it is shifted left
+
+        :param type: The type of the bitstring the shifted value is part of
+        :type type: ASLType or None
+        """
+
+        return code
+
+    def truncate(self, code, type):
+        """Returns code masked to the length of the bitstring type
+
+        Used for the results of operations (such as NOT, addition or shifts)
+        that may set bits beyond the length of the bitstring. Widths listed in
+        :attr:`wrapping_widths` are not masked.
+
+        :param type: The type of the result or None if unknown
+        :type type: ASLType or None
+        """
+
+        if type is None or type.type != ASLType.Kind.bits or type.value is None \
+                or type.value in self.wrapping_widths:
+            return code
+        return self.bit_and(code, self.mask_constant((1 << type.value) - 1))
+
+    def constant(self, value):
+        """Returns the code of the given constant value"""
+
+        if isinstance(value, bool):
+            return str(value).lower()
+        else:
+            return str(value)
+
+    def visitStart(self, ctx: ASLParser.StartContext):
+        if self.cse_reused is not None:
+            self.find_reused(ctx, [{}])
+        result = []
+        for statement in ctx.statement():
+            code = self.visit_statement(statement)
+            result += self.hoisted
+            self.hoisted = []
+            result += code
+        return result
+
+    def visit_statement(self, ctx):
+        """(Internal) Returns the code of a statement including the temporaries it needs"""
+
+        pending = self.cse_pending
+        self.cse_pending = []
+        code = self.visit(ctx)
+        code = self.cse_pending + code
+        self.cse_pending = pending
+        return code
+
+    def visitBlock(self, ctx: ASLParser.BlockContext):
+        return CodeBlock(self.block_statements(ctx))
+
+    def block_statements(self, ctx: ASLParser.BlockContext):
+        """Returns the code of the statements of the block without indentation"""
+
+        stmts = []
+        self.cse_scopes.append({})
+        if ctx.Start():
+            for statement in ctx.statement():
+                stmts += self.visit_statement(statement)
+        else:
+            for simpleStatement in ctx.simpleStatement():
+                stmts += self.visit_statement(simpleStatement)
+        self.cse_scopes.pop()
+        return stmts
+
+    def visitExpression(self, ctx: ASLParser.ExpressionContext):
+        if self.cse_reused is None:
+            return self.expression_code(ctx)
+        if any(self.cse_scopes):
+            key = ctx.getText()
+            for scope in self.cse_scopes:
+                if key in scope:
+                    self.cse_eliminated += 1
+                    return scope[key][0]
+        if ctx in self.cse_reused:
+            return self.common_subexpression(ctx)
+        return self.expression_code(ctx)
+
+    def find_reused(self, tree, scopes):
+        """(Internal) Finds the pure subexpressions whose values are computed again later
+
+        The tree is walked in the order the code is generated, with a scope
+        per block. A subexpression is added to `self.cse_reused` if an
+        equal subexpression follows in the same or a nested scope before any
+        of its variables is assigned to. Subexpressions of such a later
+        occurrence are not computed, so they are not considered.
+
+        :param scopes: The pure subexpressions seen in every enclosing scope
+                       as mapping from text to (occurrence, identifiers)
+        :type scopes: [{str: (ASLParser.ExpressionContext, {str})}]
+        """
+
+        if isinstance(tree, ASLParser.BlockContext):
+            scopes.append({})
+        elif isinstance(tree, ASLParser.ExpressionContext) and is_pure(tree):
+            key = tree.getText()
+            for scope in scopes:
+                if key in scope:
+                    self.cse_reused.add(scope[key][0])
+                    return
+        for i in range(tree.getChildCount()):
+            self.find_reused(tree.getChild(i), scopes)
+        if isinstance(tree, ASLParser.BlockContext):
+            scopes.pop()
+        elif isinstance(tree, ASLParser.SimpleStatementContext) and tree.Assign():
+            names = identifiers(tree.assignableExpr(0))
+            for scope in scopes:
+                for key in [key for (key, (_, used)) in scope.items() if used & names]:
+                    del scope[key]
+        elif isinstance(tree, ASLParser.ExpressionContext) and is_pure(tree):
+            scopes[-1][tree.getText()] = (tree, identifiers(tree))
+
+    def common_subexpression(self, ctx: ASLParser.ExpressionContext):
+        """(Internal) Returns the code of a reused subexpression, computing it into a temporary"""
+
+        code = self.expression_code(ctx)
+        if self.value_visitor.visit(ctx) is not None or IDENTIFIER.fullmatch(code):
+            # constants and copies of variables (or temporaries) need no temporary
+            return code
+        type = self.type_visitor.visit(ctx)
+        if type is None:
+            return code
+        name = "_cse{0}".format(self.cse_temporaries)
+        self.cse_temporaries += 1
+        self.cse_pending.append(self.declaration(name, type, code))
+        self.cse_scopes[-1][ctx.getText()] = (name, identifiers(ctx))
+        return name
+
+    def invalidate_subexpressions(self, name):
+        """(Internal) Forgets all temporaries that depend on the variable name"""
+
+        for scope in self.cse_scopes:
+            for key in [key for (key, (_, names)) in scope.items() if name in names]:
+                del scope[key]
+
+    def visitAssignableExpr(self, ctx: ASLParser.AssignableExprContext):
+        if ctx.Identifier() and ctx.getChildCount() == 1:
+            return ctx.Identifier().getText()
+        else:
+            return None
+
+    def assign_target(self, target: ASLParser.AssignableExprContext, expression: ASLParser.ExpressionContext):
+        """Returns the lines of an assignment to a target that is not a plain variable
+
+        Elements of arrays (`R[d] = ...`) and slices of variables
+        (`x{lo -: hi} = ...`) are supported, values assigned to `-` are
+        discarded.
+
+        :raises ASLTranslationError: For all other targets (tuples,
+                                     concatenations and fields)
+        """
+
+        if target.Minus():
+            return []
+        elif target.Identifier() and target.LeftBracket():
+            name = target.Identifier().getText()
+            indices = [self.visit(index) for index in target.expression()]
+            line = self.assignment(self.element(name, indices), self.visit(expression))
+            self.invalidate_subexpressions(name)
+            if name in self.variables:
+                self.variables[name] = self.variables[name][:2] + (None,)
+            return [line]
+        elif not target.Dot() and target.LeftBrace() and target.assignableExpr(0).Identifier() \
+                and target.assignableExpr(0).getChildCount() == 1:
+            return self.assign_slice(target, expression)
+        raise ASLTranslationError("Cannot assign to " + target.getText())
+
+    def assign_slice(self, target: ASLParser.AssignableExprContext, expression: ASLParser.ExpressionContext):
+        """(Internal) Returns the lines of an assignment to a slice of a variable
+
+        The bits outside of the slice are kept, if the variable and the value
+        are constants the new value of the variable is a constant too. Masks
+        of bounds that are not constant are computed at run time like in
+        :meth:`bits_code`, bits of variables of unknown length are kept by
+        clearing the bits of the slice instead of masking the others.
+
+        :raises ASLTranslationError: If the variable has not been declared
+        """
+
+        name = target.assignableExpr(0).getText()
+        if name not in self.variables:
+            raise ASLTranslationError("Cannot assign to a slice of the undeclared variable " + name)
+        (_, type, old) = self.variables[name]
+        known = type is not None and type.type == ASLType.Kind.bits and type.value is not None
+        # (low, width, position in the value) of every range, least significant first, ints if constant else code
+        parts = []
+        position = 0
+        for (low, high) in slice_ranges(target):
+            low_val = plain_value(self.value_visitor.visit(low))
+            high_val = plain_value(self.value_visitor.visit(high)) if high is not None else None
+            if high is None:
+                width = 1
+            elif isinstance(low_val, int) and isinstance(high_val, int):
+                width = high_val - low_val
+            else:
+                width = "({0}) - ({1})".format(self.visit(high), self.visit(low))
+            parts.append((low_val if isinstance(low_val, int) else self.visit(low), width, position))
+            position = add_amounts(position, width)
+        value = plain_value(self.value_visitor.visit(expression))
+        if isinstance(old, BitVec) and isinstance(value, int) and isinstance(position, int) \
+                and all(isinstance(low, int) for (low, _, _) in parts):
+            result = old.value
+            for (low, width, position) in parts:
+                mask = ((1 << width) - 1) << low
+                result = (result & ~mask) | (((value >> position) << low) & mask)
+            result = BitVec(result, type.value)
+            return self.assign(name, type, result, lambda: self.constant(result))
+
+        def code():
+            cleared = self.constant(old) if old is not None else name
+            value_code = self.visit(expression)
+            kept = (1 << type.value) - 1 if known else None
+            codes = []
+            for (low, width, position) in parts:
+                part = value_code
+                if isinstance(low, int) and isinstance(width, int) and isinstance(position, int):
+                    mask = ((1 << width) - 1) << low
+                    if low > position:
+                        part = self.shift_left(self.widen(part, type), str(low - position))
+                    elif low < position:
+                        part = self.shift_right(part, str(position - low))
+                    codes.append(self.bit_and(part, self.mask_constant(mask)))
+                    if known:
+                        kept &= ~mask
+                    else:
+                        cleared = self.bit_and(cleared, self.bit_not(self.widen(self.mask_constant(mask), type)))
+                    continue
+                mask = self.shift_left("({0}) - 1".format(self.shift_left(self.one, self.amount(width))),
+                                       self.amount(low))
+                if position != 0:
+                    part = self.shift_right(part, self.amount(position))
+                codes.append(self.bit_and(self.shift_left(self.widen(part, type), self.amount(low)),
+                                          "({0})".format(mask)))
+                cleared = self.bit_and(cleared, self.bit_not(mask))
+            if kept is None:
+                codes.insert(0, cleared)
+            elif kept:
+                codes.insert(0, self.bit_and(cleared, self.mask_constant(kept)))
+            return codes[0] if len(codes) == 1 else self.bit_or(codes)
+        return self.assign(name, type, None, code)
+
+    def visitErrorNode(self, node):
+        raise Exception("Error")
+
+    def visitIf(self, ctx: ASLParser.StatementContext):
+        """Generates the code of an if statement, folding constant conditions"""
+
+        branches = []
+        for i, expression in enumerate(ctx.expression()):
+            branches.append((self.condition_value(expression),
+                             lambda e=expression: self.visit(e),
+                             ctx.block(i)))
+        if ctx.Else():
+            branches.append((True, None, ctx.block()[-1]))
+        return self.visit_branches(branches)
+
+    def visitCase(self, ctx: ASLParser.StatementContext, condition):
+        """Generates the code of a case statement, folding constant conditions
+
+        :param condition: A function taking the code of the expression that is
+                          matched and the literal or identifier it is matched
+                          against and returning the code of the comparison.
+        """
+
+        expr_value = self.value_visitor.visit(ctx.expression(0))
+        expr_code = None
+        branches = []
+        for i in range(len(ctx.When())):
+            child = ctx.getChild(i*3 + 5)
+            if isinstance(child, ASLParser.LiteralContext):
+                when_value = self.value_visitor.visit(child)
+            else:
+                when_value = self.variables.get(child.getText(), (None, None, None))[2]
+            known = None
+            if expr_value is not None and when_value is not None:
+                known = match_value(expr_value, when_value)
+            if known is not False and expr_code is None:
+                expr_code = self.visit(ctx.expression(0))
+            branches.append((known,
+                             lambda c=child: condition(expr_code, c),
+                             ctx.block(i)))
+        if ctx.Otherwise():
+            branches.append((True, None, ctx.block()[-1]))
+        return self.visit_branches(branches)
+
+    def condition_value(self, ctx: ASLParser.ExpressionContext):
+        """Returns True or False if the condition is a known constant, None otherwise"""
+
+        value = self.value_visitor.visit(ctx)
+        if value is True or value is False:
+            return value
+        else:
+            return None
+
+    def visit_branches(self, branches):
+        """(Internal) Generates the code of a conditional statement
+
+        Branches whose condition is known to be false are removed and branches
+        after one whose condition is known to be true are unreachable.
+
+        :param branches: A list of (known, condition, block) where known is the
+                         value of the condition if it is a constant, condition
+                         is a function returning the code of the condition (or
+                         None for else branches) and block is the block
+                         context of the branch.
+        """
+
+        live = []
+        for (known, condition, block) in branches:
+            if known is False:
+                continue
+            live.append((None if known else condition, block))
+            if known:
+                break
+        if not live:
+            return []
+        if live[0][0] is None:
+            return self.block_statements(live[0][1])
+        conditions = [condition() if condition else None for (condition, _) in live]
+        snapshot = self.variables
+        declared = set(self.declared)
+        states = []
+        code = []
+        self.branch_depth += 1
+        for condition, (_, block) in zip(conditions, live):
+            self.variables = dict(snapshot)
+            code.append((condition, self.visit(block)))
+            states.append(self.variables)
+        self.branch_depth -= 1
+        if conditions[-1] is not None:
+            states.append(snapshot)
+        self.variables = self.merge_states(states)
+        # the variables declared in the branches are no constants whose declarations are missing
+        for name in self.declared - declared:
+            if name in self.variables:
+                self.variables[name] = self.variables[name][:2] + (None,)
+        return self.conditional(code)
+
+    def merge_states(self, states):
+        """(Internal) Merges the variable tables at the end of the branches of a conditional
+
+        Constant values are only kept if they are the same in every branch.
+        """
+
+        merged = {}
+        for state in states:
+            for name, var in state.items():
+                if name not in merged:
+                    merged[name] = var
+                    continue
+                value = merged[name][2]
+                if value is not None and not same_constant(value, var[2]):
+                    merged[name] = (merged[name][0], merged[name][1], None)
+        for name, var in merged.items():
+            if any(name not in state for state in states) and var[2] is not None:
+                merged[name] = (var[0], var[1], None)
+        return merged
+
+    def builtin_code(self, ctx: ASLParser.ExpressionContext, args):
+        """Returns the code of a call using the template of the builtin or None
+
+        :param args: The code of the arguments
+        :type args: [str]
+        """
+
+        return self.template_code(ctx.Identifier().getText(), args,
+                                  lambda: (list(map(lambda x: self.type_visitor.visit(x), ctx.expression())),
+                                           list(map(lambda x: plain_value(self.value_visitor.visit(x)),
+                                                    ctx.expression()))))
+
+    def template_code(self, name, args, operands):
+        """Returns the code of a call to the builtin name using its template or None
+
+        :param args: The code of the arguments
+        :type args: [str]
+        :param operands: A function returning the types and the constant values
+                         of the arguments, only called if the template is a
+                         function
+        :type operands: function
+        """
+
+        builtin = lookup_builtin(name)
+        if builtin is None or self.language not in builtin.templates:
+            return None
+        template = builtin.templates[self.language]
+        if isinstance(template, str):
+            return template.format(*args)
+        (types, values) = operands()
+        return template(args, types, values)
+
+    def bits_code(self, ctx: ASLParser.ExpressionContext):
+        """Generates the code of a slice or concatenation expression
+
+        The expression is split into the parts it is composed of, adjacent
+        parts selecting consecutive bits of the same value are merged and each
+        part is extracted with at most one shift and one mask.
+        """
+
+        type = self.type_visitor.visit(ctx)
+        result = []
+        position = 0
+        for (source, low, width) in self.merge_bit_parts(self.bit_parts(ctx)):
+            # only the most significant part may have an unknown width
+            assert position is not None
+            if low is None:
+                code = source
+                if position != 0:
+                    code = self.shift_left(self.widen(code, type), self.amount(position))
+            elif isinstance(low, int) and isinstance(width, int) and isinstance(position, int):
+                code = source
+                if low > position:
+                    code = self.shift_right(code, str(low - position))
+                elif low < position:
+                    code = self.shift_left(self.widen(code, type), str(position - low))
+                code = self.bit_and(code, self.mask_constant(((1 << width) - 1) << position))
+            else:
+                code = self.shift_right(source, self.amount(low))
+                mask = "({0}) - 1".format(self.shift_left(self.one, self.amount(width)))
+                code = self.bit_and(code, "({0})".format(mask))
+                if position != 0:
+                    code = self.shift_left(self.widen(code, type), self.amount(position))
+            result.append(code)
+            position = add_amounts(position, width) if width is not None else None
+        if len(result) == 1:
+            return result[0]
+        return self.bit_or(result)
+
+    def amount(self, amount):
+        """(Internal) Returns the code of a shift amount or width (int or code)"""
+
+        if isinstance(amount, int):
+            return str(amount)
+        return "({0})".format(amount)
+
+    def bit_parts(self, ctx: ASLParser.ExpressionContext):
+        """(Internal) Returns the parts of a bitstring expression, least significant first
+
+        Each part is a tuple (source, low, width) selecting width bits starting
+        at bit low of the value with code source. low and width are ints if
+        they are known constants and code otherwise. Whole values have low set
+        to None and width set to None if it is unknown.
+        """
+
+        if ctx.Colon():
+            return self.bit_parts(ctx.expression(1)) + self.bit_parts(ctx.expression(0))
+        elif not ctx.Identifier() and ctx.LeftParen() and not ctx.Comma():
+            return self.bit_parts(ctx.expression(0))
+        elif not ctx.In() and not ctx.Dot() and ctx.LeftBrace():
+            source = self.visit(ctx.expression(0))
+            parts = []
+            for (low, high) in slice_ranges(ctx):
+                low_val = plain_value(self.value_visitor.visit(low))
+                low_code = low_val if isinstance(low_val, int) else self.visit(low)
+                if high is None:
+                    parts.append((source, low_code, 1))
+                    continue
+                high_val = plain_value(self.value_visitor.visit(high))
+                if isinstance(low_val, int) and isinstance(high_val, int):
+                    width = high_val - low_val
+                else:
+                    width = "({0}) - ({1})".format(self.visit(high), self.visit(low))
+                parts.append((source, low_code, width))
+            return parts
+        else:
+            type = self.type_visitor.visit(ctx)
+            return [(self.visit(ctx), None, type.value if type is not None else None)]
+
+    def merge_bit_parts(self, parts):
+        """(Internal) Merges adjacent parts that select consecutive bits of the same value"""
+
+        merged = []
+        for part in parts:
+            if merged:
+                (source, low, width) = merged[-1]
+                if source == part[0] and isinstance(low, int) and isinstance(width, int) \
+                        and isinstance(part[2], int) and part[1] == low + width:
+                    merged[-1] = (source, low, width + part[2])
+                    continue
+            merged.append(part)
+        return merged
+
+    def assign(self, name, asl_type, value, code):
+        """Records an assignment and returns the lines of code needed for it
+
+        :param name: The name of the variable that is assigned
+        :type name: str
+        :param asl_type: The type of the variable if it is declared
+        :type asl_type: ASLType
+        :param value: The assigned value if it is a constant else None
+        :param code: A function returning the code of the assigned value
+        :rtype: [str]
+        """
+
+        lines = self.assignment_lines(name, asl_type, value, code)
+        # after the code of the value, temporaries it introduces might depend on the variable
+        self.invalidate_subexpressions(name)
+        return lines
+
+    def assignment_lines(self, name, asl_type, value, code):
+        """(Internal) Records an assignment and returns its lines, see :func:`assign`"""
+
+        if name in self.variables:
+            existed, asl_type, old = self.variables[name]
+            if value is not None and same_constant(old, value):
+                return []
+        else:
+            existed, old = False, None
+        if name in self.declared:
+            # this includes variables declared by an earlier branch of the same conditional
+            lines = [self.assignment(name, code())]
+        elif self.branch_depth == 0:
+            lines = []
+            if value is None:
+                self.declared.add(name)
+                lines.append(self.declaration(name, asl_type, code()))
+        else:
+            self.declared.add(name)
+            declaration = self.declaration(name, asl_type, self.constant(old) if old is not None else None)
+            if declaration is not None:
+                self.hoisted.append(declaration)
+            lines = [self.assignment(name, code())]
+        # the value is recorded after its code, which still sees the previous value of the variable
+        self.variables[name] = (existed, asl_type, value)
+        return lines
+
+
+def is_pure(ctx: ASLParser.ExpressionContext):
+    """(Internal) Returns whether the expression is a candidate for common subexpression elimination"""
+
+    if ctx.Colon() or (not ctx.In() and not ctx.Dot() and ctx.LeftBrace()):
+        return is_side_effect_free(ctx)
+    elif ctx.Identifier() and ctx.LeftParen():
+        return is_side_effect_free(ctx)
+    return False
+
+
+def is_side_effect_free(ctx):
+    """(Internal) Returns whether the tree contains no calls of functions that are not pure"""
+
+    if isinstance(ctx, ASLParser.ExpressionContext) and ctx.Identifier() and ctx.LeftParen():
+        builtin = lookup_builtin(ctx.Identifier().getText())
+        if builtin is None or not builtin.pure:
+            return False
+    return all(is_side_effect_free(ctx.getChild(i)) for i in range(ctx.getChildCount()))
+
+
+def identifiers(tree):
+    """(Internal) Returns the set of all identifiers in the tree"""
+
+    names = set()
+    for i in range(tree.getChildCount()):
+        child = tree.getChild(i)
+        if isinstance(child, TerminalNode):
+            if child.getSymbol().type == ASLParser.Identifier:
+                names.add(child.getText())
+        else:
+            names |= identifiers(child)
+    return names
+
+
+def add_amounts(amount1, amount2):
+    """(Internal) Adds two amounts which are either ints or code"""
+
+    if isinstance(amount1, int) and isinstance(amount2, int):
+        return amount1 + amount2
+    elif amount1 == 0:
+        return amount2
+    return "({0}) + ({1})".format(amount1, amount2)
+
+
+def same_constant(value1, value2):
+    """(Internal) Returns whether two constant values are the same (of the same python type)"""
+
+    return value1 is not None and value1 == value2 and type(value1) == type(value2)
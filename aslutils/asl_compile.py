@@ -0,0 +1,158 @@
+import hashlib
+import importlib.util
+import marshal
+import os
+import threading
+
+from .asl2 import TranslationSession
+from .asl2py import PythonVisitor
+from .asl_bitvec import BitPattern
+from .asl_runtime import RUNTIME
+from .asl_type import ASLType
+
+
+#: Part of the cache keys, has to be increased whenever the generated code changes
+CACHE_VERSION = 6
+
+#: The compiled code objects by cache key
+CODE_CACHE = {}
+
+
+def encoding_source(decode, execute, fields, state=(), name="execute", cse=False):
+    """Returns the python source of a function executing one encoding
+
+    The function takes the instruction word (an int) or a mapping from field
+    name to field value and the state (a dict) as arguments. It first loads the
+    fields and the state variables into locals, then runs the translated
+    `__decode` and `__execute` code and finally stores the state variables back
+    into the state which is returned.
+
+    :param decode: The processed ASL code of `__decode` or None
+    :type decode: str or None
+    :param execute: The processed ASL code of `__execute`
+    :type execute: str
+    :param fields: The fields of the encoding, as declared in the decoder file
+                   (`__field name start +: run`)
+    :type fields: [(str, int, int)]
+    :param state: The variables of the state, each specified by a name and a
+                  length (in bits) or None if it is not a bitstring. Arrays
+                  (for instance of registers) may also be given as (name,
+                  length of the elements, number of elements).
+    :type state: [(str, int or None)] or [(str, int, int)]
+    :param name: The name of the function
+    :type name: str
+    :param cse: Whether to hoist repeated pure subexpressions into temporaries
+    :type cse: bool
+    :rtype: str
+    """
+
+    field_widths = [(field[0], field[2]) for field in fields]
+    session = TranslationSession(PythonVisitor, field_widths, cse, variables=state_variables(state))
+    body = []
+    if decode:
+        (decode_vars, code) = session.translate(decode)
+        body += code
+        # the declarations of constants are not generated, execute might still need them
+        for (var, (existed, type, value)) in decode_vars.items():
+            if not existed and value is not None and not isinstance(value, BitPattern):
+                body.append("{0} = {1}".format(var, value))
+    body += session.translate(execute)[1]
+
+    lines = ["def {0}(word, state):".format(name)]
+    if fields:
+        lines.append("    if word.__class__ is int:")
+        for (field, start, run) in fields:
+            lines.append("        {0} = (word >> {1}) & {2}".format(field, start, hex((1 << run) - 1)))
+        lines.append("    else:")
+        for (field, start, run) in fields:
+            lines.append("        {0} = word[{1!r}]".format(field, field))
+    for var in variables_of(state):
+        lines.append("    {0} = state[{1!r}]".format(var, var))
+    lines += ["    " + line for line in body]
+    for var in variables_of(state):
+        lines.append("    state[{0!r}] = {0}".format(var))
+    lines.append("    return state")
+    return "\n".join(lines) + "\n"
+
+
+def state_variables(state):
+    """Returns the pre-existing variables (see :func:`asl_to_lang`) of the state variables
+
+    :param state: The variables of the state, see :func:`encoding_source`
+    :type state: [(str, int or None)] or [(str, int, int)]
+    :rtype: {str: (ASLType or None, None)}
+    """
+
+    variables = {}
+    for entry in state:
+        if len(entry) == 2 and entry[1] is not None:
+            variables[entry[0]] = (ASLType(ASLType.Kind.bits, entry[1]), None)
+        else:
+            variables[entry[0]] = (None, None)
+    return variables
+
+
+def variables_of(state):
+    """(Internal) Returns the names of the state variables"""
+
+    return [entry[0] for entry in state]
+
+
+def compile_encoding(decode, execute, fields, state=(), name="execute", cse=False, cache_dir=None):
+    """Compiles `__decode` and `__execute` of an encoding into a python function
+
+    See :func:`encoding_source` for the parameters and the signature of the
+    returned function. The compiled code objects are cached in memory (in
+    :data:`CODE_CACHE`) and, if cache_dir is given, marshalled into that
+    directory so that later runs do not have to translate the ASL code again.
+    The cache is keyed by the arguments, so builtins registered with different
+    templates in between are not picked up for snippets that are cached.
+
+    :param cache_dir: The directory to store the compiled code in (opt)
+    :type cache_dir: str or None
+    :returns: The function executing the encoding
+    :rtype: function
+    """
+
+    key = hashlib.sha256(repr((CACHE_VERSION, decode, execute, list(fields), list(state), name, cse))
+                         .encode("utf-8")).hexdigest()
+    code = CODE_CACHE.get(key)
+    path = os.path.join(cache_dir, key + ".marshal") if cache_dir is not None else None
+    if code is None and path is not None:
+        code = load_code(path)
+    if code is None:
+        source = encoding_source(decode, execute, fields, state, name, cse)
+        code = compile(source, "<asl {0}>".format(name), "exec")
+        if path is not None:
+            store_code(path, code)
+    CODE_CACHE[key] = code
+    namespace = dict(RUNTIME)
+    exec(code, namespace)
+    return namespace[name]
+
+
+def load_code(path):
+    """(Internal) Returns the code object marshalled at path or None if missing or stale"""
+
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    magic = importlib.util.MAGIC_NUMBER
+    if not data.startswith(magic):
+        return None
+    try:
+        return marshal.loads(data[len(magic):])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+def store_code(path, code):
+    """(Internal) Marshals the code object to path, the file is replaced atomically"""
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary = "{0}.{1}.{2}.tmp".format(path, os.getpid(), threading.get_ident())
+    with open(temporary, "wb") as f:
+        f.write(importlib.util.MAGIC_NUMBER + marshal.dumps(code))
+    os.replace(temporary, path)
@@ -0,0 +1,196 @@
+import re
+
+from .ASLLexer import ASLLexer
+from .asl_bitvec import BitVec
+from .asl_type import ASLType
+
+
+#: The words that are tokens of their own and can't be used as identifiers
+KEYWORDS = frozenset(name[1:-1] for name in ASLLexer.literalNames
+                     if re.fullmatch(r"'[A-Za-z_][A-Za-z0-9_]*'", name))
+
+#: A statement of the subset: an optional type, the assigned name and the expression
+STATEMENT = re.compile(r"(?:(integer|boolean|bit|bits\s*\(\s*(0|[1-9][0-9]*)\s*\))\s+)?"
+                       r"([A-Za-z_][A-Za-z0-9_]*)\s*=\s*(.*?)\s*;")
+
+#: A term of an expression of the subset: a literal, an identifier or UInt of an identifier
+TERM = re.compile(r"\s*(?:(0|[1-9][0-9]*)|(TRUE|FALSE)|'([01 ]+)'|UInt\s*\(\s*([A-Za-z_][A-Za-z0-9_]*)\s*\)"
+                  r"|([A-Za-z_][A-Za-z0-9_]*))\s*")
+
+#: The operators of integer expressions of the subset
+OPERATOR = re.compile(r"[-+*]")
+
+#: The token separating the statements
+NEWLINE = re.compile(r"\bNEWLINE\b")
+
+
+def statement_type(type_name, width):
+    """(Internal) Returns the ASLType of the declared type of a statement or None"""
+
+    if type_name is None:
+        return None
+    elif type_name == "integer":
+        return ASLType(ASLType.Kind.int)
+    elif type_name == "boolean":
+        return ASLType(ASLType.Kind.bool)
+    elif type_name == "bit":
+        return ASLType(ASLType.Kind.bits, 1)
+    return ASLType(ASLType.Kind.bits, int(width))
+
+
+def split_terms(expression):
+    """(Internal) Returns the terms and operators of an expression alternately or None if it's not in the subset"""
+
+    parts = []
+    position = 0
+    while True:
+        m = TERM.match(expression, position)
+        if m is None or m.end() == position:
+            return None
+        parts.append(m)
+        position = m.end()
+        if position == len(expression):
+            return parts
+        if not OPERATOR.match(expression, position):
+            return None
+        parts.append(expression[position])
+        position += 1
+
+
+class FastPath():
+    """(Internal) Translates a snippet of the subset using the methods of a visitor
+
+    :param visitor: A newly created visitor of the language
+    :type visitor: ASLCodeVisitor
+    """
+
+    def __init__(self, visitor):
+        self.visitor = visitor
+
+    def term(self, m):
+        """Returns the (type, value, code) of a term or None if it's not in the subset
+
+        The code is None if the value is a constant.
+        """
+
+        variables = self.visitor.variables
+        (integer, boolean, bits, argument, name) = m.groups()
+        if integer is not None:
+            return (ASLType(ASLType.Kind.int), int(integer), None)
+        elif boolean is not None:
+            return (ASLType(ASLType.Kind.bool), boolean == "TRUE", None)
+        elif bits is not None:
+            value = BitVec.from_string(bits)
+            return (ASLType(ASLType.Kind.bits, value.width), value, None)
+        name = argument if argument is not None else name
+        if name in KEYWORDS or name not in variables:
+            return None
+        (_, type, value) = variables[name]
+        if type is None or (argument is not None and type.type != ASLType.Kind.bits):
+            return None
+        if argument is None:
+            return (type, value, None if value is not None else name)
+        if value is not None:
+            if not isinstance(value, BitVec):
+                # for instance a bitpattern or a constant of another type, left to the parser
+                return None
+            return (ASLType(ASLType.Kind.int), value.value, None)
+        code = self.visitor.template_code("UInt", [name], lambda: ([type], [None]))
+        return (ASLType(ASLType.Kind.int), None, code if code is not None else "UInt({0})".format(name))
+
+    def expression(self, parts):
+        """Returns the (type, value, code) of an expression or None if it's not in the subset
+
+        Expressions with operators are only in the subset if all terms are
+        constant integers, they are folded.
+        """
+
+        terms = [self.term(m) for m in parts[::2]]
+        if any(term is None for term in terms):
+            return None
+        if len(terms) == 1:
+            return terms[0]
+        if any(type.type != ASLType.Kind.int or value is None for (type, value, _) in terms):
+            return None
+        # products are evaluated before sums
+        (total, sign, product) = (0, 1, terms[0][1])
+        for (operator, (_, value, _)) in zip(parts[1::2], terms[1:]):
+            if operator == "*":
+                product *= value
+            else:
+                total += sign * product
+                (sign, product) = (1 if operator == "+" else -1, value)
+        return (ASLType(ASLType.Kind.int), total + sign * product, None)
+
+    def translate(self, string):
+        """Returns the code of the snippet or None if it's not in the subset"""
+
+        statements = []
+        for statement in NEWLINE.split(string):
+            statement = statement.strip()
+            if not statement:
+                continue
+            m = STATEMENT.fullmatch(statement)
+            if m is None or m.group(3) in KEYWORDS:
+                return None
+            parts = split_terms(m.group(4))
+            if parts is None:
+                return None
+            statements.append((m.group(1), m.group(2), m.group(3), parts))
+        if self.visitor.cse_reused is not None and repeated_terms(statements):
+            return None
+        result = []
+        for (type_name, width, name, parts) in statements:
+            term = self.expression(parts)
+            if term is None:
+                return None
+            (term_type, value, code) = term
+            if value is not None:
+                code = self.visitor.constant(value)
+            type = statement_type(type_name, width)
+            if type is None:
+                type = self.visitor.variables[name][1] if name in self.visitor.variables else term_type
+            if type != term_type:
+                return None
+            result += self.visitor.assign(name, type, value, lambda: code)
+        return result
+
+
+def repeated_terms(statements):
+    """(Internal) Returns whether a variable or call occurs more than once (and might be hoisted by cse)"""
+
+    seen = set()
+    for (_, _, _, parts) in statements:
+        for m in parts[::2]:
+            (argument, name) = m.group(4, 5)
+            expressions = [argument, "UInt({0})".format(argument)] if argument is not None else [name]
+            for expression in filter(None, expressions):
+                if expression in seen:
+                    return True
+                seen.add(expression)
+    return False
+
+
+def translate_fast(string, visitor):
+    """Translates a straight-line snippet without running the ANTLR parser
+
+    The subset consists of statements separated by NEWLINE, each assigning a
+    term to a variable, optionally declaring it (`integer`, `boolean`, `bit`
+    or `bits(N)` with a literal length). A term is a decimal integer, a
+    boolean or bitstring literal, a known variable or `UInt` of a known
+    bitstring variable. Integer terms may be combined with +, - and * if they
+    are all constants. Within the subset the result is the same as the one of
+    the visitor on the parsed snippet.
+
+    :param string: The processed ASL snippet
+    :type string: str
+    :param visitor: A newly created visitor of the language with the
+                    pre-existing variables, it is updated as if it visited the
+                    snippet
+    :type visitor: ASLCodeVisitor
+    :returns: The lines of code or None if the snippet is not in the subset,
+              in which case the visitor must not be used any more
+    :rtype: [str] or None
+    """
+
+    return FastPath(visitor).translate(string)
@@ -0,0 +1,595 @@
+import time
+
+from antlr4.tree.Tree import TerminalNode
+from .ASLParser import ASLParser
+from .ASLVisitor import ASLVisitor
+from .asl2 import parse_snippet
+from .asl2py import PythonVisitor
+from .asl_bitvec import BitVec, BitPattern
+from .asl_builtins import lookup_builtin
+from .asl_runtime import ASLUndefined, ASLUnpredictable
+from .asl_type import ASLTranslationError, ASLType
+from .asl_type_visitor import ASLTypeVisitor, slice_ranges
+from .asl_value_visitor import ASLValueVisitor, match_value, plain_value
+
+
+def constant(value):
+    """(Internal) Returns a closure returning the value"""
+
+    return lambda env: value
+
+
+def concatenated_targets(target):
+    """(Internal) Returns the targets of an assignment to a concatenation, the most significant first"""
+
+    if target.Colon():
+        return concatenated_targets(target.assignableExpr(0)) + concatenated_targets(target.assignableExpr(1))
+    return [target]
+
+
+def zero(type):
+    """(Internal) Returns the initial value of a variable of the type (used for UNKNOWN too)"""
+
+    if type is None:
+        return 0
+    elif type.type == ASLType.Kind.bits:
+        return BitVec(0, type.value) if type.value is not None else 0
+    elif type.type == ASLType.Kind.bool:
+        return False
+    elif type.type == ASLType.Kind.real:
+        return 0.0
+    return 0
+
+
+def run_block(statements):
+    """(Internal) Returns a closure executing the closures of the statements one after the other"""
+
+    statements = tuple(statements)
+    if len(statements) == 1:
+        return statements[0]
+
+    def run(env):
+        for statement in statements:
+            statement(env)
+    return run
+
+
+class ASLClosureCompiler(ASLVisitor):
+    """(Internal) Compiles a parse tree into a tree of python closures
+
+    Externally, this should not be used directly, but via
+    :func:`compile_snippet`.
+
+    Expressions are compiled to functions taking the environment (a dict from
+    variable name to value) and returning the value of the expression,
+    statements to functions taking the environment and updating it. Values
+    have the same representation as in :class:`ASLValueVisitor` (bitstrings are
+    :class:`BitVec`) and the operations are the same, so the closures compute
+    what :class:`ASLValueVisitor` would fold if the inputs were constants.
+    Subexpressions that are constant independent of the inputs are folded while
+    compiling.
+
+    :param variables: A mapping from name to (type: ASLType or None, value) for
+                      all pre-existing variables. Only the types are used.
+    :type variables: {str: (ASLType or None, Any or None)}
+
+    :ivar self.variables: The variables of the snippet in the format of
+                          :attr:`ASLCodeVisitor.variables`, without values
+    :vartype self.variables: {str: (bool, ASLType or None, None)}
+    """
+
+    def __init__(self, variables):
+        self.variables = {key: (True, value[0], None) for (key, value) in variables.items()}
+        self.value_visitor = ASLValueVisitor(self)
+        self.type_visitor = ASLTypeVisitor(self)
+
+    def visitStart(self, ctx: ASLParser.StartContext):
+        return run_block([self.visit(statement) for statement in ctx.statement()] or [lambda env: None])
+
+    def visitBlock(self, ctx: ASLParser.BlockContext):
+        if ctx.Start():
+            statements = [self.visit(statement) for statement in ctx.statement()]
+        else:
+            statements = [self.visit(statement) for statement in ctx.simpleStatement()]
+        return run_block(statements or [lambda env: None])
+
+    def visitStatement(self, ctx: ASLParser.StatementContext):
+        if ctx.simpleStatement():
+            return self.visit(ctx.simpleStatement())
+        elif ctx.If():
+            return self.compile_if(ctx)
+        elif ctx.Case():
+            return self.compile_case(ctx)
+        elif ctx.Repeat():
+            (body, condition) = (self.visit(ctx.block(0)), self.visit(ctx.expression(0)))
+
+            def repeat(env):
+                body(env)
+                while not condition(env):
+                    body(env)
+            return repeat
+        elif ctx.While():
+            (condition, body) = (self.visit(ctx.expression(0)), self.visit(ctx.block(0)))
+
+            def loop(env):
+                while condition(env):
+                    body(env)
+            return loop
+        elif ctx.For():
+            return self.compile_for(ctx)
+        assert False, "Unknown statement: " + ctx.getText()
+
+    def compile_if(self, ctx: ASLParser.StatementContext):
+        """(Internal) Compiles an if statement"""
+
+        branches = tuple((self.visit(expression), self.visit(ctx.block(i)))
+                         for (i, expression) in enumerate(ctx.expression()))
+        otherwise = self.visit(ctx.block()[-1]) if ctx.Else() else None
+
+        def conditional(env):
+            for (condition, block) in branches:
+                if condition(env):
+                    return block(env)
+            if otherwise is not None:
+                otherwise(env)
+        return conditional
+
+    def compile_case(self, ctx: ASLParser.StatementContext):
+        """(Internal) Compiles a case statement"""
+
+        expression = self.visit(ctx.expression(0))
+        branches = []
+        for i in range(len(ctx.When())):
+            child = ctx.getChild(i*3 + 5)
+            if isinstance(child, ASLParser.LiteralContext):
+                pattern = constant(self.value_visitor.visit(child))
+            else:
+                pattern = self.identifier(child.getText())
+            branches.append((pattern, self.visit(ctx.block(i))))
+        branches = tuple(branches)
+        otherwise = self.visit(ctx.block()[-1]) if ctx.Otherwise() else None
+
+        def case(env):
+            value = expression(env)
+            for (pattern, block) in branches:
+                if match_value(value, pattern(env)):
+                    return block(env)
+            if otherwise is not None:
+                otherwise(env)
+        return case
+
+    def compile_for(self, ctx: ASLParser.StatementContext):
+        """(Internal) Compiles a for loop"""
+
+        name = ctx.assignableExpr().getText()
+        if name not in self.variables:
+            self.variables[name] = (False, ASLType(ASLType.Kind.int), None)
+        (start, stop) = (self.visit(ctx.expression(0)), self.visit(ctx.expression(1)))
+        body = self.visit(ctx.block(0))
+        step = -1 if ctx.Downto() else 1
+
+        def loop(env):
+            for i in range(plain_value(start(env)), plain_value(stop(env)) + step, step):
+                env[name] = i
+                body(env)
+        return loop
+
+    def visitSimpleStatement(self, ctx: ASLParser.SimpleStatementContext):
+        if ctx.Undefined():
+            def undefined(env):
+                raise ASLUndefined()
+            return undefined
+        elif ctx.Unpredictable():
+            def unpredictable(env):
+                raise ASLUnpredictable()
+            return unpredictable
+        elif ctx.Assert():
+            condition = self.visit(ctx.expression(0))
+            text = ctx.expression(0).getText()
+
+            def check(env):
+                if not condition(env):
+                    raise AssertionError(text)
+            return check
+        elif ctx.assignableExpr() and ctx.Assign():
+            return self.compile_assignment(ctx)
+        elif ctx.assignableExpr():
+            type = self.type_visitor.visit(ctx.typeName())
+            names = tuple(var.getText() for var in ctx.assignableExpr())
+            for name in names:
+                self.variables[name] = (False, type, None)
+            initial = zero(type)
+
+            def declare(env):
+                for name in names:
+                    env[name] = initial
+            return declare
+        # SEE, IMPLEMENTATION_DEFINED, enumerations and calls of procedures do not change the variables
+        return lambda env: None
+
+    def compile_assignment(self, ctx: ASLParser.SimpleStatementContext):
+        """(Internal) Compiles an assignment, declaring the variable if needed"""
+
+        target = ctx.assignableExpr(0)
+        value = self.visit(ctx.expression(0))
+        if target.Identifier() and target.getChildCount() == 1 and ctx.typeName():
+            name = target.getText()
+            self.variables[name] = (name in self.variables and self.variables[name][0],
+                                    self.type_visitor.visit(ctx.typeName()), None)
+        store = self.compile_store(target, ctx.expression(0))
+
+        def assign(env):
+            store(env, value(env))
+        return assign
+
+    def compile_store(self, target, expression=None):
+        """(Internal) Compiles a target of an assignment into a function storing a value in the environment
+
+        Besides variables, elements of arrays and slices, values can be
+        assigned to tuples of targets and to concatenations of variables whose
+        lengths are known when the value is assigned.
+
+        :param expression: The assigned expression, used for the type of new variables (opt)
+        :raises ASLTranslationError: For assignments to fields
+        """
+
+        if target.Identifier() and target.getChildCount() == 1:
+            name = target.getText()
+            if name in self.variables:
+                type = self.variables[name][1]
+            else:
+                type = self.type_visitor.visit(expression) if expression is not None else None
+                self.variables[name] = (False, type, None)
+            if type is not None and type.type == ASLType.Kind.bits and type.value is not None:
+                width = type.value
+
+                def store_bits(env, result):
+                    env[name] = result if result.__class__ is BitVec else BitVec(int(result), width)
+                return store_bits
+
+            def store(env, result):
+                env[name] = result
+            return store
+        elif target.Identifier() and target.LeftBracket():
+            name = target.Identifier().getText()
+            indices = tuple(self.visit(expression) for expression in target.expression())
+
+            def store_element(env, result):
+                env[name][tuple(plain_value(index(env)) for index in indices) if len(indices) > 1
+                          else plain_value(indices[0](env))] = result
+            return store_element
+        elif target.LeftBrace() and target.assignableExpr(0).Identifier() \
+                and target.assignableExpr(0).getChildCount() == 1:
+            return self.compile_slice_assignment(target)
+        elif target.Minus():
+            return lambda env, result: None
+        elif target.LeftParen():
+            stores = tuple(self.compile_store(element) for element in target.assignableExpr())
+
+            def store_tuple(env, result):
+                for (store, element) in zip(stores, result):
+                    store(env, element)
+            return store_tuple
+        elif target.Colon():
+            # the last part is the least significant one
+            parts = []
+            for part in reversed(concatenated_targets(target)):
+                if not part.Identifier() or part.getChildCount() != 1:
+                    raise ASLTranslationError("Cannot assign to " + target.getText())
+                type = self.variables.get(part.getText(), (False, None, None))[1]
+                parts.append((part.getText(), type.value if type is not None else None, self.compile_store(part)))
+
+            def store_concatenation(env, result):
+                bits = plain_value(result)
+                for (name, width, store) in parts:
+                    if width is None:
+                        width = env[name].width
+                    store(env, BitVec(bits & ((1 << width) - 1), width))
+                    bits >>= width
+            return store_concatenation
+        raise ASLTranslationError("Cannot assign to " + target.getText())
+
+    def compile_slice_assignment(self, target):
+        """(Internal) Compiles the store of a value to a slice of a bitstring variable"""
+
+        name = target.assignableExpr(0).getText()
+        ranges = []
+        # the ranges are separated by commas, the first one is the most significant
+        high = False
+        for child in target.getChildren():
+            if isinstance(child, TerminalNode) and child.getSymbol().type == ASLParser.RangeDown:
+                high = True
+            elif isinstance(child, ASLParser.ExpressionContext):
+                if high:
+                    ranges[-1] = (ranges[-1][0], self.visit(child))
+                else:
+                    ranges.append((self.visit(child), None))
+                high = False
+        ranges.reverse()
+
+        def store_slice(env, value):
+            old = env[name]
+            bits = plain_value(value)
+            result = plain_value(old)
+            for (low, high) in ranges:
+                low_val = plain_value(low(env))
+                width = 1 if high is None else plain_value(high(env)) - low_val
+                mask = ((1 << width) - 1) << low_val
+                result = (result & ~mask) | ((bits << low_val) & mask)
+                bits >>= width
+            env[name] = BitVec(result, old.width) if isinstance(old, BitVec) else result
+        return store_slice
+
+    def identifier(self, name):
+        """(Internal) Returns the closure reading a variable"""
+
+        def read(env):
+            return env[name]
+        return read
+
+    def visitExpression(self, ctx: ASLParser.ExpressionContext):
+        type = self.type_visitor.visit(ctx)
+        value = self.value_visitor.visit(ctx)
+        if value is not None:
+            return constant(value)
+        operands = [self.visit(expression) for expression in ctx.expression()]
+        if ctx.If():
+            (condition, then, otherwise) = operands
+            return lambda env: then(env) if condition(env) else otherwise(env)
+        elif ctx.literal():
+            return constant(self.value_visitor.visit(ctx.literal()))
+        elif not ctx.Identifier() and ctx.LeftParen() and ctx.Comma():
+            return lambda env: tuple(operand(env) for operand in operands)
+        elif not ctx.Identifier() and ctx.LeftParen():
+            return operands[0]
+        elif ctx.Identifier() and ctx.LeftParen():
+            return self.compile_call(ctx, type, operands)
+        elif ctx.LeftBracket():
+            name = ctx.Identifier().getText()
+            if len(operands) == 1:
+                return lambda env: env[name][plain_value(operands[0](env))]
+            return lambda env: env[name][tuple(plain_value(operand(env)) for operand in operands)]
+        elif not ctx.In() and ctx.LeftBrace() and not ctx.Dot():
+            return self.compile_slice(ctx, operands[0])
+        elif ctx.Dot():
+            raise NotImplementedError("Cannot evaluate " + ctx.getText())
+        elif ctx.Unknown():
+            return constant(zero(type))
+        elif ctx.Identifier():
+            return self.identifier(ctx.Identifier().getText())
+        elif ctx.In():
+            (value, patterns) = (operands[0], tuple(operands[1:]))
+            return lambda env: any(match_value(value(env), pattern(env)) for pattern in patterns)
+        elif len(operands) == 1:
+            operand = operands[0]
+            if ctx.Not():
+                return lambda env: ~operand(env)
+            elif ctx.Minus():
+                return lambda env: -operand(env)
+            elif ctx.Negation():
+                return lambda env: not operand(env)
+            return operand
+        return self.compile_binary(ctx, operands[0], operands[1])
+
+    def compile_binary(self, ctx: ASLParser.ExpressionContext, left, right):
+        """(Internal) Compiles a binary operation with the semantics of :class:`ASLValueVisitor`"""
+
+        if ctx.Plus():
+            return lambda env: left(env) + right(env)
+        elif ctx.Minus():
+            return lambda env: left(env) - right(env)
+        elif ctx.Colon():
+            return lambda env: left(env).concat(right(env))
+        elif ctx.Mult():
+            return lambda env: left(env) * right(env)
+        elif ctx.Div():
+            return lambda env: left(env) // right(env)
+        elif ctx.Mod():
+            return lambda env: left(env) % right(env)
+        elif ctx.Divide():
+            return lambda env: left(env) / right(env)
+        elif ctx.LeftShift():
+            return lambda env: left(env) << plain_value(right(env))
+        elif ctx.RightShift():
+            return lambda env: left(env) >> plain_value(right(env))
+        elif ctx.Equal():
+            return lambda env: match_value(left(env), right(env))
+        elif ctx.NotEqual():
+            return lambda env: not match_value(left(env), right(env))
+        elif ctx.Greater():
+            return lambda env: left(env) > right(env)
+        elif ctx.Less():
+            return lambda env: left(env) < right(env)
+        elif ctx.GreaterEqual():
+            return lambda env: left(env) >= right(env)
+        elif ctx.LessEqual():
+            return lambda env: left(env) <= right(env)
+        elif ctx.Land():
+            return lambda env: left(env) and right(env)
+        elif ctx.Lor():
+            return lambda env: left(env) or right(env)
+        elif ctx.And():
+            return lambda env: left(env) & right(env)
+        elif ctx.Or():
+            return lambda env: left(env) | right(env)
+        elif ctx.Eor():
+            return lambda env: left(env) ^ right(env)
+        assert False, "Unknown expression: " + ctx.getText()
+
+    def compile_call(self, ctx: ASLParser.ExpressionContext, type, operands):
+        """(Internal) Compiles a call of a builtin with an evaluation rule"""
+
+        name = ctx.Identifier().getText()
+        builtin = lookup_builtin(name)
+        if builtin is None or builtin.evaluate is None:
+            def unknown(env):
+                raise NotImplementedError("Cannot evaluate a call of " + name)
+            return unknown
+        evaluate = builtin.evaluate
+        types = [self.type_visitor.visit(expression) for expression in ctx.expression()]
+        width = type.value if type is not None and type.type == ASLType.Kind.bits else None
+
+        def call(env):
+            result = evaluate([plain_value(operand(env)) for operand in operands], types)
+            if width is not None and isinstance(result, int) and not isinstance(result, bool):
+                return BitVec(result, width)
+            return result
+        return call
+
+    def compile_slice(self, ctx: ASLParser.ExpressionContext, source):
+        """(Internal) Compiles a slice, ranges with constant bounds are precomputed"""
+
+        ranges = []
+        for (low, high) in slice_ranges(ctx):
+            (low_val, high_val) = (plain_value(self.value_visitor.visit(low)), None)
+            if high is not None:
+                high_val = plain_value(self.value_visitor.visit(high))
+            if low_val is None or (high is not None and high_val is None):
+                ranges = None
+                break
+            ranges.append((low_val, 1 if high is None else high_val - low_val))
+        if ranges is not None:
+            ranges = tuple(ranges)
+
+            def constant_slice(env):
+                value = plain_value(source(env))
+                result = BitVec(0, 0)
+                for (low, width) in ranges:
+                    result = BitVec(value >> low, width).concat(result)
+                return result
+            return constant_slice
+        bounds = tuple((self.visit(low), self.visit(high) if high is not None else None)
+                       for (low, high) in slice_ranges(ctx))
+
+        def slice(env):
+            value = plain_value(source(env))
+            result = BitVec(0, 0)
+            for (low, high) in bounds:
+                low_val = plain_value(low(env))
+                high_val = low_val + 1 if high is None else plain_value(high(env))
+                result = BitVec(value >> low_val, high_val - low_val).concat(result)
+            return result
+        return slice
+
+
+class CompiledSnippet():
+    """A processed ASL snippet compiled into python closures
+
+    Instances are created by :func:`compile_snippet`. Calling the instance runs
+    the snippet.
+
+    :ivar self.variables: The variables of the snippet in the format returned
+                          by :func:`asl_to_lang` (without values)
+    :vartype self.variables: {str: (bool, ASLType or None, None)}
+    :ivar self.fields: The fields as (name, length)
+    :vartype self.fields: [(str, int)]
+    """
+
+    def __init__(self, run, fields, variables):
+        self.run = run
+        self.fields = list(fields)
+        self.variables = variables
+
+    def __call__(self, values):
+        """Runs the snippet
+
+        :param values: The values of the fields and of the pre-existing
+                       variables. Fields may be given as int.
+        :type values: {str: Any}
+        :raises ASLUndefined: If the snippet reaches UNDEFINED
+        :raises ASLUnpredictable: If the snippet reaches UNPREDICTABLE
+        :returns: The values of all variables after running the snippet
+        :rtype: {str: Any}
+        """
+
+        env = dict(values)
+        for (name, width) in self.fields:
+            if name in env and env[name].__class__ is not BitVec:
+                env[name] = BitVec(env[name], width)
+        self.run(env)
+        return env
+
+
+def compile_snippet(string, fields, variables=None):
+    """Compiles a processed ASL snippet into closures that evaluate it directly
+
+    Unlike the code generators this does not produce source code, the parse
+    tree is turned into nested python closures once, which can then be run
+    for varying field values, e.g. to check the constraints of `__decode` or to
+    compute immediates. Calls of functions that are not builtins with an
+    evaluation rule raise NotImplementedError when they are evaluated, calls of
+    procedures are ignored.
+
+    :param string: ASL snippet string. The ASL code has to contain special
+                   tokens for structure instead of indentation and newlines.
+    :type string: str
+    :param fields: A list of fields, each specified by a name and a length (in
+                   bits).
+    :type fields: [(str, int)]
+    :param variables: Further pre-existing variables as (type, value) (opt)
+    :type variables: {str: (ASLType or None, Any or None)} or None
+    :rtype: CompiledSnippet
+    """
+
+    variables = dict(variables) if variables is not None else {}
+    for field in fields:
+        variables[field[0]] = (ASLType(ASLType.Kind.bits, field[1]), None)
+    compiler = ASLClosureCompiler(variables)
+    run = compiler.visit(parse_snippet(string))
+    return CompiledSnippet(run, fields, compiler.variables)
+
+
+def benchmark(string, fields, samples, repeat=1):
+    """Compares the closures with re-running the constant folding of the visitors
+
+    The baseline parses the snippet once and for every sample visits the parse
+    tree again with the field values as constants, reading the results from
+    the variable table (as done by :func:`asl_to_lang`). Both are run on every
+    sample and the results are compared.
+
+    :param samples: The values of the fields, one dict per evaluation
+    :type samples: [{str: int}]
+    :param repeat: How often every sample is evaluated
+    :type repeat: int
+    :returns: The seconds taken by "compile" (compiling the closures once),
+              "closures" and "visitor"
+    :rtype: {str: float}
+    :raises AssertionError: If the results of a sample differ, since then the
+                            timings don't compare the same computation
+    """
+
+    start = time.perf_counter()
+    snippet = compile_snippet(string, fields)
+    compiled = time.perf_counter()
+    results = []
+    for _ in range(repeat):
+        for sample in samples:
+            try:
+                results.append(snippet(sample))
+            except (ASLUndefined, ASLUnpredictable) as e:
+                results.append(type(e))
+    closures = time.perf_counter()
+    tree = parse_snippet(string)
+    expected = []
+    for _ in range(repeat):
+        for sample in samples:
+            variables = {name: (ASLType(ASLType.Kind.bits, width), BitVec(sample[name], width))
+                         for (name, width) in fields}
+            visitor = PythonVisitor(variables)
+            # with constant fields all conditionals are folded, so the first of these is reached
+            ended = [line for line in visitor.visit(tree) if line in ("undefined()", "unpredictable()")]
+            if ended:
+                expected.append(ASLUndefined if ended[0] == "undefined()" else ASLUnpredictable)
+            else:
+                expected.append({name: var[2] for (name, var) in visitor.variables.items()})
+    visited = time.perf_counter()
+    for (index, (result, folded)) in enumerate(zip(results, expected)):
+        if isinstance(result, dict) and isinstance(folded, dict):
+            same = all(value is None or isinstance(value, BitPattern) or result.get(name) == value
+                       for (name, value) in folded.items())
+        else:
+            same = result == folded
+        if not same:
+            raise AssertionError("The results for {0} differ: {1} (closures) and {2} (visitor)"
+                                 .format(samples[index % len(samples)], result, folded))
+    return {"compile": compiled - start, "closures": closures - compiled, "visitor": visited - closures}
@@ -0,0 +1,674 @@
+import re
+import threading
+import time
+
+from antlr4 import InputStream, CommonTokenStream
+from antlr4.error.ErrorListener import ErrorListener
+from antlr4.ListTokenSource import ListTokenSource
+from antlr4.Token import CommonToken, Token as ANTLRToken
+from antlr4.tree.Tree import TerminalNode
+
+from .ASLLexer import ASLLexer
+from .ASLParser import ASLParser
+
+
+def literal_types():
+    """(Internal) Returns the token types of the keywords and operators by their text, as lexed by ASLLexer"""
+
+    texts = [name[1:-1] for name in ASLLexer.literalNames if name.startswith("'")]
+    texts += ["typeof", "TypeOf", "TRUE", "FALSE"]
+    return {text: ASLLexer(InputStream(text)).nextToken().type for text in texts}
+
+
+#: The token types of the keywords and operators by their text
+LITERALS = literal_types()
+
+#: The regular expression matching one token (or whitespace and comments) in order of priority
+TOKEN = re.compile(r"""
+    (?P<skip>[ \t\n\r]+|//[^\r\n]*)
+  | (?P<word>(?:AArch(?:32|64)\.)?[a-zA-Z_][a-zA-Z0-9_]*)
+  | (?P<hex>0x[0-9A-Fa-f_]+)
+  | (?P<fixed>(?:0|[1-9][0-9]*)\.[0-9]+)
+  | (?P<integer>0|[1-9][0-9]*)
+  | (?P<bits>'[01 x]+')
+  | (?P<string>"[^"]*")
+  | (?P<operator>==|!=|>=|<=|\|\||&&|\+:|-:|<<|>>|[-!><:\[\]*/+^=(){},.;])
+""", re.VERBOSE)
+
+#: Serializes the use of :class:`ASLLexer` and :class:`ASLParser`, their
+#: DFA caches are shared by all instances and are not thread-safe
+ANTLR_LOCK = threading.Lock()
+
+#: The binary operators of expressions by token type with their precedence
+BINARY = {}
+for (precedence, operators) in ((9, ("Mult", "Divide", "Div", "Mod")), (8, ("Plus", "Minus")), (7, ("Colon",)),
+                                (6, ("RightShift", "LeftShift")),
+                                (5, ("Greater", "Less", "Equal", "NotEqual", "GreaterEqual", "LessEqual")),
+                                (4, ("And", "Eor", "Or", "Lor", "Land"))):
+    for operator in operators:
+        BINARY[getattr(ASLParser, operator)] = precedence
+
+#: The precedence of the postfix slice, field and IN operators of expressions
+SLICE_PRECEDENCE = 12
+FIELD_PRECEDENCE = 11
+IN_PRECEDENCE = 3
+#: The precedence the operand of the prefix operators and the else branch of if expressions bind with
+PREFIX_OPERAND = 10
+ELSE_OPERAND = 18
+
+#: The tokens starting a literal
+LITERAL_TOKENS = frozenset((ASLParser.Integer, ASLParser.Hex, ASLParser.BitVector, ASLParser.BitPattern,
+                            ASLParser.FixedPointNum, ASLParser.Bool, ASLParser.String))
+
+#: The tokens starting a type name (besides identifiers)
+TYPE_TOKENS = frozenset((ASLParser.IntegerType, ASLParser.BooleanType, ASLParser.BitsType, ASLParser.BitType,
+                         ASLParser.RealType))
+
+#: The prefix operators of expressions
+PREFIX_TOKENS = frozenset((ASLParser.Not, ASLParser.Plus, ASLParser.Minus, ASLParser.Negation))
+
+
+class ASLSyntaxError(Exception):
+    """Raised by :func:`parse_pratt` if the snippet is not valid ASL"""
+
+
+class Token():
+    """(Internal) A token with only the members needed by the visitors"""
+
+    __slots__ = ("type", "text")
+
+    def __init__(self, type, text):
+        self.type = type
+        self.text = text
+
+
+#: The tokens of the structure markers as extracted from instruction files
+MARKERS = {" {0} ".format(text): Token(LITERALS[text], text) for text in ("START", "END", "NEWLINE")}
+
+
+def tokenize(string):
+    """Splits processed ASL code into tokens like :class:`ASLLexer` does
+
+    :raises ASLSyntaxError: If a character does not start any token
+    :rtype: [Token]
+    """
+
+    tokens = []
+    position = 0
+    while position < len(string):
+        m = TOKEN.match(string, position)
+        if m is None:
+            raise ASLSyntaxError("Unexpected character {0!r} at {1}".format(string[position], position))
+        kind = m.lastgroup
+        text = m.group()
+        position = m.end()
+        if kind == "skip":
+            continue
+        elif kind == "word":
+            tokens.append(Token(LITERALS.get(text, ASLParser.Identifier), text))
+        elif kind == "operator":
+            tokens.append(Token(LITERALS[text], text))
+        elif kind == "bits":
+            tokens.append(Token(ASLParser.BitPattern if "x" in text else ASLParser.BitVector, text))
+        else:
+            tokens.append(Token({"hex": ASLParser.Hex, "fixed": ASLParser.FixedPointNum,
+                                 "integer": ASLParser.Integer, "string": ASLParser.String}[kind], text))
+    return tokens
+
+
+def tokenize_pieces(pieces):
+    """Tokenizes processed ASL code given as the pieces returned by :func:`extract_code`
+
+    The START, END and NEWLINE markers become tokens directly and each line
+    is tokenized once, so the joined code never has to be lexed.
+
+    :param pieces: The lines and markers of the code
+    :type pieces: [str]
+    :raises ASLSyntaxError: If a character does not start any token
+    :rtype: [Token]
+    """
+
+    tokens = []
+    for piece in pieces:
+        marker = MARKERS.get(piece)
+        if marker is not None:
+            tokens.append(marker)
+        else:
+            tokens += tokenize(piece)
+    return tokens
+
+
+def token_stream(tokens):
+    """Returns a token stream of the tokens which :class:`ASLParser` can parse
+
+    :type tokens: [Token]
+    :rtype: CommonTokenStream
+    """
+
+    antlr_tokens = []
+    for (index, token) in enumerate(tokens):
+        antlr_token = CommonToken(type=token.type, start=index, stop=index)
+        antlr_token.text = token.text
+        antlr_token.tokenIndex = index
+        antlr_token.line = 1
+        antlr_token.column = index
+        antlr_tokens.append(antlr_token)
+    return CommonTokenStream(ListTokenSource(antlr_tokens))
+
+
+class PrattParser():
+    """(Internal) A recursive descent parser building the same tree as :class:`ASLParser`
+
+    Expressions are parsed by precedence climbing with the precedences that
+    ANTLR derives for the left recursive rules, so the contexts (and their
+    children) are the same as the ones created by :meth:`ASLParser.start`.
+
+    :param tokens: The tokens of the snippet
+    :type tokens: [Token]
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self, offset=0):
+        """Returns the type of the token at the offset from the current one or None at the end"""
+
+        if self.position + offset < len(self.tokens):
+            return self.tokens[self.position + offset].type
+        return None
+
+    def match(self, ctx, type):
+        """Adds the current token to ctx, it has to be of the given type"""
+
+        if self.peek() != type:
+            found = self.tokens[self.position].text if self.position < len(self.tokens) else "end of input"
+            raise ASLSyntaxError("Expected {0} but found {1!r}".format(ASLParser.symbolicNames[type], found))
+        ctx.addTokenNode(self.tokens[self.position])
+        self.position += 1
+
+    def accept(self, ctx, *types):
+        """Adds the current token to ctx if it has one of the types, returns whether it did"""
+
+        if self.peek() in types:
+            ctx.addTokenNode(self.tokens[self.position])
+            self.position += 1
+            return True
+        return False
+
+    def child(self, ctx, Context):
+        """Returns a new context of the class Context added as child to ctx"""
+
+        child = Context(None, ctx)
+        ctx.addChild(child)
+        return child
+
+    def start(self):
+        ctx = ASLParser.StartContext(None)
+        while self.starts_statement():
+            self.statement(self.child(ctx, ASLParser.StatementContext))
+        return ctx
+
+    def starts_statement(self):
+        """Returns whether the current token can start a statement"""
+
+        return self.peek() in (ASLParser.If, ASLParser.Case, ASLParser.Repeat, ASLParser.While, ASLParser.For) \
+            or self.starts_simple_statement()
+
+    def starts_simple_statement(self):
+        """Returns whether the current token can start a simple statement"""
+
+        return self.peek() in (ASLParser.Undefined, ASLParser.Unpredictable, ASLParser.See,
+                               ASLParser.Implementation_Defined, ASLParser.Assert, ASLParser.Enumeration,
+                               ASLParser.Constant, ASLParser.Identifier, ASLParser.LeftParen, ASLParser.Minus) \
+            or self.peek() in TYPE_TOKENS
+
+    def statement(self, ctx):
+        token = self.peek()
+        if token == ASLParser.If:
+            self.match(ctx, ASLParser.If)
+            self.expression(self.child(ctx, ASLParser.ExpressionContext))
+            self.match(ctx, ASLParser.Then)
+            self.block(self.child(ctx, ASLParser.BlockContext))
+            while self.accept(ctx, ASLParser.Elsif):
+                self.expression(self.child(ctx, ASLParser.ExpressionContext))
+                self.match(ctx, ASLParser.Then)
+                self.block(self.child(ctx, ASLParser.BlockContext))
+            if self.accept(ctx, ASLParser.Else):
+                self.block(self.child(ctx, ASLParser.BlockContext))
+        elif token == ASLParser.Case:
+            self.match(ctx, ASLParser.Case)
+            self.expression(self.child(ctx, ASLParser.ExpressionContext))
+            self.match(ctx, ASLParser.Of)
+            self.match(ctx, ASLParser.Start)
+            while self.accept(ctx, ASLParser.When):
+                if not self.accept(ctx, ASLParser.Identifier):
+                    self.literal(self.child(ctx, ASLParser.LiteralContext))
+                self.block(self.child(ctx, ASLParser.BlockContext))
+            if self.accept(ctx, ASLParser.Otherwise):
+                self.block(self.child(ctx, ASLParser.BlockContext))
+            self.match(ctx, ASLParser.End)
+        elif token == ASLParser.Repeat:
+            self.match(ctx, ASLParser.Repeat)
+            self.block(self.child(ctx, ASLParser.BlockContext))
+            self.match(ctx, ASLParser.Until)
+            self.expression(self.child(ctx, ASLParser.ExpressionContext))
+            self.match(ctx, ASLParser.Semicolon)
+            self.accept(ctx, ASLParser.Newline)
+        elif token == ASLParser.While:
+            self.match(ctx, ASLParser.While)
+            self.expression(self.child(ctx, ASLParser.ExpressionContext))
+            self.match(ctx, ASLParser.Do)
+            self.block(self.child(ctx, ASLParser.BlockContext))
+        elif token == ASLParser.For:
+            self.match(ctx, ASLParser.For)
+            self.assignable(self.child(ctx, ASLParser.AssignableExprContext))
+            self.match(ctx, ASLParser.Assign)
+            self.expression(self.child(ctx, ASLParser.ExpressionContext))
+            if not self.accept(ctx, ASLParser.To, ASLParser.Downto):
+                raise ASLSyntaxError("Expected to or downto")
+            ends = (end for end in [None] + self.limit_ends() if self.parses(lambda scratch: self.limit(scratch, end)))
+            self.limit(ctx, next(ends, None))
+        else:
+            self.simple_statement(self.child(ctx, ASLParser.SimpleStatementContext))
+            self.accept(ctx, ASLParser.Newline)
+
+    def limit(self, ctx, end):
+        """Parses the limit of a for loop ending at the token index end (if not None) and the block"""
+
+        tokens = self.tokens
+        if end is not None:
+            self.tokens = tokens[:end]
+        try:
+            self.expression(self.child(ctx, ASLParser.ExpressionContext))
+        finally:
+            self.tokens = tokens
+        if end is not None and self.position != end:
+            raise ASLSyntaxError("Expected a statement")
+        self.block(self.child(ctx, ASLParser.BlockContext))
+
+    def limit_ends(self):
+        """Returns the token indices (last first) at which the block after the limit of a for loop can start
+
+        The limit is not delimited and a block can start with `-` or `(` (like
+        `- = x;` or `(a, b) = x;`), which can also continue the expression.
+        ANTLR takes the longest expression the block can follow.
+        """
+
+        ends = []
+        depth = 0
+        for index in range(self.position, len(self.tokens)):
+            type = self.tokens[index].type
+            if depth == 0 and index > self.position and (type == ASLParser.Minus or (
+                    type == ASLParser.LeftParen and self.tokens[index - 1].type == ASLParser.Identifier)):
+                ends.append(index)
+            if type in (ASLParser.LeftParen, ASLParser.LeftBracket, ASLParser.LeftBrace):
+                depth += 1
+            elif type in (ASLParser.RightParen, ASLParser.RightBracket, ASLParser.RightBrace):
+                depth -= 1
+            if depth < 0 or (depth == 0 and type in (ASLParser.Semicolon, ASLParser.Assign, ASLParser.Start,
+                                                     ASLParser.Newline)):
+                break
+        return ends[::-1]
+
+    def block(self, ctx):
+        if self.accept(ctx, ASLParser.Start):
+            self.statement(self.child(ctx, ASLParser.StatementContext))
+            while self.peek() != ASLParser.End:
+                self.statement(self.child(ctx, ASLParser.StatementContext))
+            self.match(ctx, ASLParser.End)
+            return
+        while self.peek() != ASLParser.Newline:
+            if not self.starts_simple_statement():
+                raise ASLSyntaxError("Expected a statement or NEWLINE")
+            self.simple_statement(self.child(ctx, ASLParser.SimpleStatementContext))
+        self.match(ctx, ASLParser.Newline)
+
+    def simple_statement(self, ctx):
+        token = self.peek()
+        if token in (ASLParser.Undefined, ASLParser.Unpredictable):
+            self.accept(ctx, token)
+        elif token in (ASLParser.See, ASLParser.Assert):
+            self.accept(ctx, token)
+            self.expression(self.child(ctx, ASLParser.ExpressionContext))
+        elif token == ASLParser.Implementation_Defined:
+            self.accept(ctx, token)
+            self.match(ctx, ASLParser.String)
+        elif token == ASLParser.Enumeration:
+            self.accept(ctx, token)
+            self.match(ctx, ASLParser.Identifier)
+            self.match(ctx, ASLParser.LeftBrace)
+            self.match(ctx, ASLParser.Identifier)
+            while self.accept(ctx, ASLParser.Comma):
+                self.match(ctx, ASLParser.Identifier)
+            self.match(ctx, ASLParser.RightBrace)
+        elif token == ASLParser.Identifier and self.peek(1) == ASLParser.LeftParen \
+                and self.peek(self.closing(1) + 1) == ASLParser.Semicolon and not self.parses(self.declaration):
+            # like ANTLR, prefer the declaration of a tuple `Foo(a, b);` over the procedure call
+            self.accept(ctx, token)
+            self.match(ctx, ASLParser.LeftParen)
+            self.arguments(ctx, ASLParser.RightParen)
+            self.match(ctx, ASLParser.RightParen)
+        else:
+            self.accept(ctx, ASLParser.Constant)
+            # a type name can only be followed by the start of an assignable expression
+            typed = self.peek() in TYPE_TOKENS or (self.peek() == ASLParser.Identifier and self.peek(1) in (
+                ASLParser.Identifier, ASLParser.LeftParen, ASLParser.Minus))
+            if typed:
+                self.type_name(self.child(ctx, ASLParser.TypeNameContext))
+            self.assignable(self.child(ctx, ASLParser.AssignableExprContext))
+            if self.accept(ctx, ASLParser.Assign):
+                self.expression(self.child(ctx, ASLParser.ExpressionContext))
+            elif typed:
+                while self.accept(ctx, ASLParser.Comma):
+                    self.assignable(self.child(ctx, ASLParser.AssignableExprContext))
+            else:
+                raise ASLSyntaxError("Expected =")
+        self.match(ctx, ASLParser.Semicolon)
+
+    def declaration(self, ctx):
+        """Parses a declaration of variables without initial value (after the optional constant)"""
+
+        self.type_name(self.child(ctx, ASLParser.TypeNameContext))
+        self.assignable(self.child(ctx, ASLParser.AssignableExprContext))
+        while self.accept(ctx, ASLParser.Comma):
+            self.assignable(self.child(ctx, ASLParser.AssignableExprContext))
+        self.match(ctx, ASLParser.Semicolon)
+
+    def parses(self, rule):
+        """Returns whether the rule parses the tokens from the current one, without consuming them"""
+
+        position = self.position
+        try:
+            rule(ASLParser.StatementContext(None, None))
+            return True
+        except ASLSyntaxError:
+            return False
+        finally:
+            self.position = position
+
+    def closing(self, offset):
+        """Returns the offset of the parenthesis closing the one at the offset from the current token"""
+
+        depth = 0
+        while self.peek(offset) is not None:
+            if self.peek(offset) == ASLParser.LeftParen:
+                depth += 1
+            elif self.peek(offset) == ASLParser.RightParen:
+                depth -= 1
+                if depth == 0:
+                    return offset
+            offset += 1
+        return offset
+
+    def arguments(self, ctx, closing):
+        """Parses the comma separated expressions up to the closing token (which is not consumed)"""
+
+        if self.peek() == closing:
+            return
+        self.expression(self.child(ctx, ASLParser.ExpressionContext))
+        while self.accept(ctx, ASLParser.Comma):
+            self.expression(self.child(ctx, ASLParser.ExpressionContext))
+
+    def ranges(self, ctx):
+        """Parses the ranges of a slice from the opening brace (after the optional dot)"""
+
+        self.match(ctx, ASLParser.LeftBrace)
+        self.expression(self.child(ctx, ASLParser.ExpressionContext))
+        if self.accept(ctx, ASLParser.RangeDown):
+            self.expression(self.child(ctx, ASLParser.ExpressionContext))
+        while self.accept(ctx, ASLParser.Comma):
+            self.expression(self.child(ctx, ASLParser.ExpressionContext))
+            if self.accept(ctx, ASLParser.RangeDown):
+                self.expression(self.child(ctx, ASLParser.ExpressionContext))
+        self.match(ctx, ASLParser.RightBrace)
+
+    def wrap(self, ctx):
+        """Moves the children of ctx into a new child context, which becomes the left operand"""
+
+        operand = ASLParser.ExpressionContext(None, ctx) if isinstance(ctx, ASLParser.ExpressionContext) \
+            else ASLParser.AssignableExprContext(None, ctx)
+        operand.children = ctx.children
+        for child in operand.children:
+            child.parentCtx = operand
+        ctx.children = [operand]
+
+    def expression(self, ctx, precedence=0):
+        self.primary(ctx)
+        while True:
+            token = self.peek()
+            if token in BINARY and BINARY[token] >= precedence:
+                self.wrap(ctx)
+                self.accept(ctx, token)
+                self.expression(self.child(ctx, ASLParser.ExpressionContext), BINARY[token] + 1)
+            elif (token == ASLParser.LeftBrace or (token == ASLParser.Dot and self.peek(1) == ASLParser.LeftBrace)) \
+                    and SLICE_PRECEDENCE >= precedence:
+                self.wrap(ctx)
+                self.accept(ctx, ASLParser.Dot)
+                self.ranges(ctx)
+            elif token == ASLParser.Dot and self.peek(1) == ASLParser.Identifier and FIELD_PRECEDENCE >= precedence:
+                self.wrap(ctx)
+                self.accept(ctx, ASLParser.Dot)
+                self.match(ctx, ASLParser.Identifier)
+            elif token == ASLParser.In and IN_PRECEDENCE >= precedence:
+                self.wrap(ctx)
+                self.accept(ctx, ASLParser.In)
+                self.match(ctx, ASLParser.LeftBrace)
+                self.arguments(ctx, ASLParser.RightBrace)
+                self.match(ctx, ASLParser.RightBrace)
+            else:
+                return
+
+    def primary(self, ctx):
+        """Parses the alternatives of expression that are not left recursive"""
+
+        token = self.peek()
+        if token == ASLParser.If:
+            self.accept(ctx, token)
+            self.expression(self.child(ctx, ASLParser.ExpressionContext))
+            self.match(ctx, ASLParser.Then)
+            self.expression(self.child(ctx, ASLParser.ExpressionContext))
+            self.match(ctx, ASLParser.Else)
+            self.expression(self.child(ctx, ASLParser.ExpressionContext), ELSE_OPERAND)
+        elif token in LITERAL_TOKENS:
+            self.literal(self.child(ctx, ASLParser.LiteralContext))
+        elif token == ASLParser.LeftParen:
+            self.accept(ctx, token)
+            self.expression(self.child(ctx, ASLParser.ExpressionContext))
+            while self.accept(ctx, ASLParser.Comma):
+                self.expression(self.child(ctx, ASLParser.ExpressionContext))
+            self.match(ctx, ASLParser.RightParen)
+        elif token == ASLParser.Identifier and self.peek(1) in (ASLParser.LeftParen, ASLParser.LeftBracket):
+            closing = ASLParser.RightParen if self.peek(1) == ASLParser.LeftParen else ASLParser.RightBracket
+            self.accept(ctx, token)
+            self.accept(ctx, self.peek())
+            self.arguments(ctx, closing)
+            self.match(ctx, closing)
+        elif token in PREFIX_TOKENS:
+            self.accept(ctx, token)
+            self.expression(self.child(ctx, ASLParser.ExpressionContext), PREFIX_OPERAND)
+        elif token in TYPE_TOKENS or (token == ASLParser.Identifier and self.peek(1) == ASLParser.Unknown):
+            self.type_name(self.child(ctx, ASLParser.TypeNameContext))
+            self.match(ctx, ASLParser.Unknown)
+        else:
+            self.match(ctx, ASLParser.Identifier)
+
+    def assignable(self, ctx, precedence=0):
+        token = self.peek()
+        if token == ASLParser.LeftParen:
+            self.accept(ctx, token)
+            self.assignable(self.child(ctx, ASLParser.AssignableExprContext))
+            self.match(ctx, ASLParser.Comma)
+            self.assignable(self.child(ctx, ASLParser.AssignableExprContext))
+            while self.accept(ctx, ASLParser.Comma):
+                self.assignable(self.child(ctx, ASLParser.AssignableExprContext))
+            self.match(ctx, ASLParser.RightParen)
+        elif token == ASLParser.Identifier and self.peek(1) == ASLParser.LeftBracket:
+            self.accept(ctx, token)
+            self.accept(ctx, ASLParser.LeftBracket)
+            self.arguments(ctx, ASLParser.RightBracket)
+            self.match(ctx, ASLParser.RightBracket)
+        elif not self.accept(ctx, ASLParser.Identifier, ASLParser.Minus):
+            raise ASLSyntaxError("Expected an assignable expression")
+        while True:
+            token = self.peek()
+            if token == ASLParser.Colon and precedence <= 5:
+                self.wrap(ctx)
+                self.accept(ctx, token)
+                self.assignable(self.child(ctx, ASLParser.AssignableExprContext), 6)
+            elif (token == ASLParser.LeftBrace or (token == ASLParser.Dot and self.peek(1) == ASLParser.LeftBrace)) \
+                    and precedence <= 4:
+                self.wrap(ctx)
+                self.accept(ctx, ASLParser.Dot)
+                self.ranges(ctx)
+            elif (token == ASLParser.Identifier or (token == ASLParser.Dot and self.peek(1) == ASLParser.Identifier)) \
+                    and precedence <= 3:
+                self.wrap(ctx)
+                self.accept(ctx, ASLParser.Dot)
+                self.match(ctx, ASLParser.Identifier)
+            else:
+                return
+
+    def literal(self, ctx):
+        if self.peek() not in LITERAL_TOKENS:
+            raise ASLSyntaxError("Expected a literal")
+        self.accept(ctx, self.peek())
+
+    def type_name(self, ctx):
+        if self.accept(ctx, ASLParser.BitsType):
+            self.match(ctx, ASLParser.LeftParen)
+            self.expression(self.child(ctx, ASLParser.ExpressionContext))
+            self.match(ctx, ASLParser.RightParen)
+        elif not self.accept(ctx, ASLParser.IntegerType, ASLParser.BooleanType, ASLParser.BitType,
+                             ASLParser.RealType, ASLParser.Identifier):
+            raise ASLSyntaxError("Expected a type")
+
+
+def parse_pratt(string):
+    """Parses a processed ASL snippet without the ANTLR runtime
+
+    The result is the same tree of :class:`ASLParser` contexts that
+    `ASLParser.start()` returns, so all visitors can be used on it. Unlike
+    ANTLR, the parser does not recover from syntax errors.
+
+    :param string: The processed ASL snippet (see :func:`asl_to_lang`)
+    :type string: str
+    :raises ASLSyntaxError: If the snippet is not valid ASL
+    :rtype: ASLParser.StartContext
+    """
+
+    return parse_tokens(tokenize(string))
+
+
+def parse_tokens(tokens):
+    """Parses the tokens of a processed ASL snippet like :func:`parse_pratt`
+
+    :param tokens: The tokens, for instance from :func:`tokenize_pieces`
+    :type tokens: [Token]
+    :raises ASLSyntaxError: If the snippet is not valid ASL
+    :rtype: ASLParser.StartContext
+    """
+
+    parser = PrattParser(tokens)
+    tree = parser.start()
+    if parser.position != len(parser.tokens):
+        raise ASLSyntaxError("Unexpected {0!r}".format(parser.tokens[parser.position].text))
+    return tree
+
+
+def same_tree(a, b):
+    """Returns whether two parse trees have the same contexts and tokens
+
+    :type a: ParseTree
+    :type b: ParseTree
+    :rtype: bool
+    """
+
+    if isinstance(a, TerminalNode) or isinstance(b, TerminalNode):
+        return isinstance(a, TerminalNode) and isinstance(b, TerminalNode) \
+            and a.getSymbol().type == b.getSymbol().type and a.getText() == b.getText()
+    if type(a) is not type(b) or a.getChildCount() != b.getChildCount():
+        return False
+    return all(same_tree(a.getChild(i), b.getChild(i)) for i in range(a.getChildCount()))
+
+
+def antlr_tree(string):
+    """(Internal) Parses a processed ASL snippet with the ANTLR parser, returns None on syntax errors"""
+
+    lexer = ASLLexer(InputStream(string))
+    lexer.removeErrorListeners()
+    parser = ASLParser(CommonTokenStream(lexer))
+    parser.removeErrorListeners()
+    with ANTLR_LOCK:
+        tree = parser.start()
+        if parser.getNumberOfSyntaxErrors() or parser.getTokenStream().LA(1) != ANTLRToken.EOF:
+            return None
+    return tree
+
+
+class CollectingErrorListener(ErrorListener):
+    """(Internal) Collects the messages of the syntax errors reported by ANTLR"""
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+        self.messages.append("line {0}:{1} {2}".format(line, column, msg))
+
+
+def syntax_errors(string):
+    """Returns the syntax errors of a processed ASL snippet as reported by ANTLR
+
+    Unlike :func:`parse_pratt`, ANTLR reports all errors with their position.
+    Tokens that are left over after the last statement are reported too.
+
+    :param string: The processed ASL snippet
+    :type string: str
+    :returns: The messages of the errors, empty if the snippet is valid
+    :rtype: [str]
+    """
+
+    errors = CollectingErrorListener()
+    lexer = ASLLexer(InputStream(string))
+    lexer.removeErrorListeners()
+    lexer.addErrorListener(errors)
+    parser = ASLParser(CommonTokenStream(lexer))
+    parser.removeErrorListeners()
+    parser.addErrorListener(errors)
+    with ANTLR_LOCK:
+        parser.start()
+        token = parser.getTokenStream().LT(1)
+    if token.type != ANTLRToken.EOF:
+        errors.messages.append("line {0}:{1} extraneous input {2!r}".format(token.line, token.column, token.text))
+    return errors.messages
+
+
+def compare_parsers(snippets):
+    """Parses the snippets with both parsers and compares the trees and the time taken
+
+    Meant as differential test and benchmark, for instance on the `__decode`
+    and `__execute` code of all encodings of an instruction set.
+
+    :param snippets: The processed ASL snippets
+    :type snippets: [str]
+    :returns: A dict with the seconds taken by "antlr" and "pratt" and the
+              snippets whose trees differ or that only one parser accepts
+              (completely) as "mismatches"
+    :rtype: {str: float or [str]}
+    """
+
+    result = {"antlr": 0.0, "pratt": 0.0, "mismatches": []}
+    for snippet in snippets:
+        start = time.perf_counter()
+        expected = antlr_tree(snippet)
+        result["antlr"] += time.perf_counter() - start
+        start = time.perf_counter()
+        try:
+            tree = parse_pratt(snippet)
+        except ASLSyntaxError:
+            tree = None
+        result["pratt"] += time.perf_counter() - start
+        if (tree is None) != (expected is None) or (tree is not None and not same_tree(expected, tree)):
+            result["mismatches"].append(snippet)
+    return result
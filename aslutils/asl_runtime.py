@@ -0,0 +1,61 @@
+class ASLUndefined(Exception):
+    """Raised by compiled code when it reaches UNDEFINED"""
+
+    pass
+
+
+class ASLUnpredictable(Exception):
+    """Raised by compiled code when it reaches UNPREDICTABLE"""
+
+    pass
+
+
+def undefined():
+    """Called by the generated python code for UNDEFINED"""
+
+    raise ASLUndefined()
+
+
+def unpredictable():
+    """Called by the generated python code for UNPREDICTABLE"""
+
+    raise ASLUnpredictable()
+
+
+def UInt(x):
+    """Returns the bitstring (int) interpreted as unsigned integer"""
+
+    return x
+
+
+def SInt(x, width):
+    """Returns the bitstring (int) of the given length interpreted as two's complement integer"""
+
+    sign = 1 << (width - 1)
+    return (x ^ sign) - sign
+
+
+def ZeroExtend(x, width):
+    """Returns the bitstring (int) zero extended to the given length"""
+
+    return x
+
+
+def SignExtend(x, width, from_width):
+    """Returns the bitstring (int) of length from_width sign extended to width bits"""
+
+    sign = 1 << (from_width - 1)
+    return ((x ^ sign) - sign) & ((1 << width) - 1)
+
+
+def Replicate(x, count, width):
+    """Returns count copies of the bitstring (int) of the given length concatenated"""
+
+    if count <= 0 or width <= 0:
+        return 0
+    # multiplying with the repunit 0b0..01 0..01 places a copy in every slot
+    return x * (((1 << (width * count)) - 1) // ((1 << width) - 1))
+
+
+#: The names available to compiled code
+RUNTIME = {name: value for (name, value) in globals().items() if not name.startswith("_")}
@@ -0,0 +1,478 @@
+import asyncio
+import collections
+import functools
+import inspect
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from . import asl2
+from .asl2 import asl_to_lang, parse_snippet
+from .asl2c import CVisitor
+from .asl2py import PythonVisitor
+from .asl2vhd import VHDLVisitor
+from .asl_bitvec import BitVec, BitPattern
+from .asl_pratt import ASLSyntaxError, parse_pratt, syntax_errors
+from .asl_type import ASLTranslationError, ASLType
+from .isa import load_isa
+
+
+#: The visitor classes of the languages that can be requested by name
+LANGUAGES = {LangVisitor.language: LangVisitor for LangVisitor in (CVisitor, PythonVisitor, VHDLVisitor)}
+
+#: The JSON-RPC error codes used by the service
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+REQUEST_CANCELLED = -32800
+
+#: A snippet parsed when the service starts, so the ANTLR caches are warm
+WARM_UP_SNIPPET = "bits(4) x = a:b; NEWLINE if x == '1111' then START x = NOT(x); NEWLINE END " \
+                  "case UInt(x) of START when 1 START integer y = 3 * UInt(a) + 1; NEWLINE END END"
+
+#: The number of translations :class:`TranslationService` keeps by default
+CACHE_SIZE = 4096
+
+
+class ServiceError(Exception):
+    """Raised by the methods of :class:`TranslationService`, reported as JSON-RPC error
+
+    :param code: The JSON-RPC error code
+    :type code: int
+    :param message: The description of the error
+    :type message: str
+    """
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def check_param(name, value, types):
+    """(Internal) Raises a ServiceError if the value of the parameter is not of one of the types
+
+    Booleans are only accepted if bool is one of the types, although they are ints.
+    """
+
+    if not isinstance(value, types) or (isinstance(value, bool) and bool not in types):
+        raise ServiceError(INVALID_PARAMS, "Invalid {0}: {1}".format(name, json.dumps(value)))
+
+
+def check_syntax(code):
+    """(Internal) Raises a ServiceError if the snippet is rejected by the parser that translates it
+
+    ANTLR recovers from syntax errors, the translation of the result would be
+    wrong or fail. With :data:`asl2.PARSER` set to "pratt", snippets that
+    :func:`parse_pratt` rejects are parsed by ANTLR too (see
+    :func:`parse_snippet`).
+    """
+
+    if asl2.PARSER == "pratt":
+        try:
+            parse_pratt(code)
+            return
+        except ASLSyntaxError:
+            pass
+    errors = syntax_errors(code)
+    if errors:
+        raise ServiceError(INVALID_PARAMS, "Syntax error: {0}".format("; ".join(errors)))
+
+
+def json_value(value):
+    """(Internal) Returns the JSON representation of a constant value, bitstrings as string of bits"""
+
+    if isinstance(value, (BitVec, BitPattern)):
+        return value.to_string()
+    return value
+
+
+def json_variables(variables):
+    """Returns the JSON representation of a variable map returned by :func:`asl_to_lang`
+
+    :type variables: {str: (bool, ASLType or None, Any)}
+    :returns: Maps from variable name to an object with "existed", "type" (the
+              name of the :class:`ASLType.Kind` or null), "width" (the value
+              of the type, for instance the length of bitstrings) and "value"
+              (the constant value or null, bitstrings as string of bits)
+    :rtype: {str: dict}
+    """
+
+    result = {}
+    for (name, (existed, type, value)) in variables.items():
+        result[name] = {"existed": existed,
+                        "type": type.type.name if type is not None else None,
+                        "width": type.value if type is not None else None,
+                        "value": json_value(value)}
+    return result
+
+
+def variables_from_json(variables):
+    """(Internal) Returns the pre-existing variables (see :func:`asl_to_lang`) of their JSON representation"""
+
+    result = {}
+    for (name, variable) in variables.items():
+        check_param("variable {0}".format(name), variable, (dict,))
+        type = None
+        if variable.get("type") is not None:
+            if variable["type"] not in ASLType.Kind.__members__:
+                raise ServiceError(INVALID_PARAMS, "Unknown type {0!r}".format(variable["type"]))
+            type = ASLType(ASLType.Kind[variable["type"]], variable.get("width"))
+        value = variable.get("value")
+        if isinstance(value, str) and type is not None and type.type == ASLType.Kind.bits:
+            value = BitVec.from_string(value)
+        elif isinstance(value, str) and type is not None and type.type == ASLType.Kind.bitpattern:
+            value = BitPattern.from_string(value)
+        result[name] = (type, value)
+    return result
+
+
+class TranslationService():
+    """Answers translation and decoding requests, keeping their inputs in memory
+
+    The instruction sets are kept parsed (and re-parsed when their files
+    change), translations are cached and identical requests that are
+    processed at the same time are only worked on once. Only the most recently
+    used translations are kept. The work is done on
+    the executor, so the event loop stays responsive, by default on a thread
+    pool (translation is thread-safe, see :func:`asl_to_lang`). The executor
+    has to run the calls in this process, as the methods share the
+    instruction sets of the service, so a process pool cannot be used.
+
+    The methods that can be requested are :meth:`translate`, :meth:`decode`
+    and :meth:`lookup_encoding`. Requests are handled by :meth:`handle_line`,
+    see :func:`serve` for the protocol.
+
+    :param executor: The executor running the requests in this process,
+                     for instance a thread pool (opt)
+    :type executor: concurrent.futures.Executor or None
+    :param cache_size: The number of translations that are kept
+    :type cache_size: int
+    :raises ValueError: If the executor is a process pool
+    """
+
+    #: The methods that can be requested
+    METHODS = ("translate", "decode", "lookup_encoding")
+
+    def __init__(self, executor=None, cache_size=CACHE_SIZE):
+        if isinstance(executor, ProcessPoolExecutor):
+            raise ValueError("The requests cannot be run in other processes")
+        self.executor = executor if executor is not None else ThreadPoolExecutor()
+        self.isas = {}
+        self.isa_lock = threading.Lock()
+        self.cache_size = cache_size
+        self.translations = collections.OrderedDict()
+        self.pending = {}
+        self.requests = {}
+
+    def warm_up(self):
+        """Parses a snippet so that later requests don't pay for filling the ANTLR caches"""
+
+        parse_snippet(WARM_UP_SNIPPET)
+
+    def translate(self, code, fields=(), language="c", cse=False, variables=None):
+        """Translates a processed ASL snippet, see :func:`asl_to_lang`
+
+        :param code: The processed ASL snippet
+        :type code: str
+        :param fields: The fields as pairs of name and length
+        :type fields: [[str, int]]
+        :param language: The name of the language ("c", "py" or "vhdl")
+        :type language: str
+        :param cse: Whether to hoist repeated pure subexpressions into temporaries
+        :type cse: bool
+        :param variables: Further pre-existing variables in the representation
+                          of :func:`json_variables` (without "existed")
+        :type variables: {str: dict} or None
+        :returns: An object with the "variables" (see :func:`json_variables`)
+                  and the lines of "code"
+        :rtype: dict
+        """
+
+        check_param("code", code, (str,))
+        check_param("fields", fields, (list, tuple))
+        for field in fields:
+            if not isinstance(field, (list, tuple)) or len(field) != 2 or not isinstance(field[0], str):
+                raise ServiceError(INVALID_PARAMS, "Invalid field: {0}".format(json.dumps(field)))
+            check_param("length of field {0}".format(field[0]), field[1], (int,))
+        check_param("language", language, (str,))
+        if language not in LANGUAGES:
+            raise ServiceError(INVALID_PARAMS, "Unknown language {0!r}".format(language))
+        check_param("cse", cse, (bool,))
+        if variables is not None:
+            check_param("variables", variables, (dict,))
+        check_syntax(code)
+        fields = [(name, width) for (name, width) in fields]
+        variables = variables_from_json(variables) if variables is not None else None
+        try:
+            (table, lines) = asl_to_lang(code, fields, LANGUAGES[language], cse, variables=variables)
+        except ASLTranslationError as e:
+            raise ServiceError(INVALID_PARAMS, "Cannot translate: {0}".format(e))
+        return {"variables": json_variables(table), "code": lines}
+
+    def isa(self, decoder, instructions):
+        """Returns the instruction set of the files, parsing them only if they changed
+
+        :param decoder: The path of the decoder file
+        :type decoder: str
+        :param instructions: The path of the instructions file
+        :type instructions: str
+        :rtype: ISA
+        """
+
+        check_param("decoder", decoder, (str,))
+        check_param("instructions", instructions, (str,))
+        try:
+            stamp = (os.stat(decoder).st_mtime_ns, os.stat(instructions).st_mtime_ns)
+        except OSError as e:
+            raise ServiceError(INVALID_PARAMS, str(e))
+        key = (os.path.abspath(decoder), os.path.abspath(instructions))
+        with self.isa_lock:
+            if key not in self.isas or self.isas[key][0] != stamp:
+                self.isas[key] = (stamp, load_isa(decoder, instructions))
+            return self.isas[key][1]
+
+    def decode(self, decoder, instructions, word, name=None):
+        """Returns the name of the encoding of an instruction word or None
+
+        :param decoder: The path of the decoder file
+        :type decoder: str
+        :param instructions: The path of the instructions file
+        :type instructions: str
+        :param word: The instruction word
+        :type word: int
+        :param name: The name of the decoder, by default the first one
+        :type name: str or None
+        :rtype: str or None
+        """
+
+        check_param("word", word, (int,))
+        if name is not None:
+            check_param("name", name, (str,))
+        isa = self.isa(decoder, instructions)
+        if name is not None and name not in isa.decoders:
+            raise ServiceError(INVALID_PARAMS, "Unknown decoder {0!r}".format(name))
+        return isa.decode(word, name)
+
+    def lookup_encoding(self, decoder, instructions, name):
+        """Returns an encoding of the instruction set or None if there is none with the name
+
+        :param decoder: The path of the decoder file
+        :type decoder: str
+        :param instructions: The path of the instructions file
+        :type instructions: str
+        :param name: The name of the encoding
+        :type name: str
+        :returns: An object with the "name", "instruction", "fields" (as
+                  triples of name, start and run) and the processed ASL code of
+                  "decode" and "execute" of the encoding
+        :rtype: dict or None
+        """
+
+        check_param("name", name, (str,))
+        encoding = self.isa(decoder, instructions).encodings.get(name)
+        if encoding is None:
+            return None
+        return {"name": encoding.name, "instruction": encoding.instruction, "fields": encoding.fields,
+                "decode": encoding.decode, "execute": encoding.execute}
+
+    async def call(self, method, params):
+        """(Internal) Runs a method on the executor, sharing the work of identical translations"""
+
+        method_function = getattr(self, method)
+        try:
+            if isinstance(params, list):
+                arguments = inspect.signature(method_function).bind(*params)
+            else:
+                arguments = inspect.signature(method_function).bind(**params)
+        except TypeError as e:
+            raise ServiceError(INVALID_PARAMS, str(e))
+        call = functools.partial(method_function, *arguments.args, **arguments.kwargs)
+        loop = asyncio.get_running_loop()
+        if method != "translate":
+            return await loop.run_in_executor(self.executor, call)
+        key = json.dumps(params, sort_keys=True)
+        if key in self.translations:
+            self.translations.move_to_end(key)
+            return self.translations[key]
+        if key not in self.pending:
+            self.pending[key] = asyncio.ensure_future(loop.run_in_executor(self.executor, call))
+            self.pending[key].add_done_callback(lambda future: self.finish(key, future))
+        # the shared future must not be cancelled with one of the requests waiting for it
+        return await asyncio.shield(self.pending[key])
+
+    def finish(self, key, future):
+        """(Internal) Caches the result of a translation that is done, dropping the least recently used"""
+
+        del self.pending[key]
+        if not future.cancelled() and future.exception() is None:
+            self.translations[key] = future.result()
+            while len(self.translations) > self.cache_size:
+                self.translations.popitem(last=False)
+
+    async def handle(self, message, requests=None):
+        """Handles one JSON-RPC request and returns the response
+
+        Besides the methods, the notification `$/cancelRequest` with the id of
+        a request (as `params.id`) is understood, the cancelled request is
+        answered with an error.
+
+        :param message: The decoded request
+        :type message: Any
+        :param requests: The running requests that can be cancelled by id, by
+                         default the ones shared by all clients
+        :type requests: {Any: asyncio.Task} or None
+        :returns: The response or None for notifications
+        :rtype: dict or None
+        """
+
+        requests = requests if requests is not None else self.requests
+        if not isinstance(message, dict) or not isinstance(message.get("method"), str):
+            return error_response(None, INVALID_REQUEST, "Invalid request")
+        id = message.get("id")
+        method = message["method"]
+        params = message.get("params", {})
+        if method == "$/cancelRequest":
+            task = requests.get(params.get("id") if isinstance(params, dict) else None)
+            if task is not None:
+                task.cancel()
+            return None
+        if method not in self.METHODS:
+            return error_response(id, METHOD_NOT_FOUND, "Unknown method {0!r}".format(method))
+        if not isinstance(params, (dict, list)):
+            return error_response(id, INVALID_PARAMS, "Invalid params")
+        task = asyncio.ensure_future(self.call(method, params))
+        if id is not None:
+            requests[id] = task
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise
+            return error_response(id, REQUEST_CANCELLED, "Request cancelled")
+        except ServiceError as e:
+            return error_response(id, e.code, e.message)
+        except Exception as e:
+            return error_response(id, INTERNAL_ERROR, "{0}: {1}".format(type(e).__name__, e))
+        finally:
+            if requests.get(id) is task:
+                del requests[id]
+        if id is None:
+            return None
+        return {"jsonrpc": "2.0", "id": id, "result": result}
+
+    async def handle_line(self, line, requests=None):
+        """Handles a line of the protocol, a request or a batch of requests
+
+        The requests of a batch are handled concurrently.
+
+        :param line: The JSON encoded request or list of requests
+        :type line: str or bytes
+        :param requests: The running requests, see :meth:`handle`
+        :type requests: {Any: asyncio.Task} or None
+        :returns: The JSON encoded response(s) or None if there is nothing to
+                  respond
+        :rtype: str or None
+        """
+
+        try:
+            message = json.loads(line)
+        except ValueError as e:
+            return json.dumps(error_response(None, PARSE_ERROR, str(e)))
+        if isinstance(message, list):
+            if not message:
+                return json.dumps(error_response(None, INVALID_REQUEST, "Empty batch"))
+            responses = await asyncio.gather(*(self.handle(request, requests) for request in message))
+            responses = [response for response in responses if response is not None]
+            return json.dumps(responses) if responses else None
+        response = await self.handle(message, requests)
+        return json.dumps(response) if response is not None else None
+
+    async def connection(self, reader, writer):
+        """(Internal) Serves the requests of one client, responses are sent as they are done"""
+
+        async def respond(line):
+            response = await self.handle_line(line, requests)
+            if response is not None:
+                writer.write(response.encode("utf-8") + b"\n")
+                await writer.drain()
+
+        requests = {}
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.ensure_future(respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        finally:
+            writer.close()
+
+
+def error_response(id, code, message):
+    """(Internal) Returns a JSON-RPC error response"""
+
+    return {"jsonrpc": "2.0", "id": id, "error": {"code": code, "message": message}}
+
+
+async def serve(service=None, path=None, host="127.0.0.1", port=0):
+    """Starts serving translation requests with JSON-RPC 2.0
+
+    Every request (or batch of requests) is one line of JSON, the responses
+    are sent back as lines too, in the order the requests are done. For
+    instance the request::
+
+        {"jsonrpc": "2.0", "id": 1, "method": "translate",
+         "params": {"code": "integer d = UInt(Rd); NEWLINE", "fields": [["Rd", 4]]}}
+
+    is answered with::
+
+        {"jsonrpc": "2.0", "id": 1, "result": {"variables": {...}, "code": ["int64_t d = ..."]}}
+
+    :param service: The service answering the requests, by default a new one
+                    that is warmed up first
+    :type service: TranslationService or None
+    :param path: The path of the Unix socket to listen on, if not given the
+                 service listens on host and port instead
+    :type path: str or None
+    :param host: The address to listen on (by default only locally)
+    :type host: str
+    :param port: The port to listen on, by default any free one
+    :type port: int
+    :returns: The server (see `server.sockets` for the address)
+    :rtype: asyncio.AbstractServer
+    """
+
+    if service is None:
+        service = TranslationService()
+        service.warm_up()
+    if path is not None:
+        return await asyncio.start_unix_server(service.connection, path)
+    return await asyncio.start_server(service.connection, host, port)
+
+
+def run_service(path=None, host="127.0.0.1", port=0, jobs=None):
+    """Serves translation requests until interrupted, see :func:`serve`
+
+    :param jobs: The number of worker threads, by default as many as
+                 :class:`ThreadPoolExecutor` chooses
+    :type jobs: int or None
+    """
+
+    async def main():
+        service = TranslationService(ThreadPoolExecutor(jobs))
+        service.warm_up()
+        server = await serve(service, path, host, port)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
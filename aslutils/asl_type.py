@@ -1,6 +1,10 @@
 from enum import Enum
 
 
+class ASLTranslationError(Exception):
+    """Raised by the code generators for valid ASL that cannot be translated to the target language"""
+
+
 class ASLType():
     """Type information for an ASL expression
 
@@ -16,6 +20,11 @@ class ASLType():
     :type type: ASLType.Kind
     :param value: for bits and bitpatterns this specifies the length if known,
                   for other it specifies the type name (opt)
+
+    Instances are immutable and interned, so constructing the same type twice
+    returns the same object and types can be used as dictionary keys. Two
+    types are equal if they have the same kind and value, compare the
+    attribute type to test for a kind.
     """
 
     class Kind(Enum):
@@ -26,23 +35,64 @@ class ASLType():
         real = 5
         other = 6
 
-    def __init__(self, type, value=None):
-        self.type = type
-        self.value = value
+    __slots__ = ("type", "value", "_c_types")
+
+    #: The interned instances by (type, value)
+    _instances = {}
+
+    def __new__(cls, type, value=None):
+        key = (type, value)
+        instance = cls._instances.get(key)
+        if instance is None:
+            instance = super().__new__(cls)
+            object.__setattr__(instance, "type", type)
+            object.__setattr__(instance, "value", value)
+            object.__setattr__(instance, "_c_types", {})
+            instance = cls._instances.setdefault(key, instance)
+        return instance
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ASLType instances are immutable")
+
+    def __reduce__(self):
+        return (ASLType, (self.type, self.value))
 
     def __eq__(self, other):
         if type(other) == ASLType:
-            return self.type == other.type
-        elif type(other) == ASLType.Kind:
-            return self.type == other
+            return self.type == other.type and self.value == other.value
         else:
             return False
 
-    def c_type(self):
-        """Returns type in C (as a str) that corresponds the closest to self"""
+    def __hash__(self):
+        return hash((self.type, self.value))
+
+    def __repr__(self):
+        return "ASLType({0}, {1!r})".format(self.type, self.value)
+
+    def c_type(self, int128=True):
+        """Returns type in C (as a str) that corresponds the closest to self
+
+        Bitstrings are mapped to the narrowest unsigned integer type that can
+        hold them (uint8_t up to uint64_t). Bitstrings of up to 128 bits use
+        unsigned __int128 if int128 is True. Wider bitstrings are not
+        supported by the C backend. Bitstrings of unknown length are mapped to
+        uint64_t.
+
+        :param int128: Whether the C compiler supports unsigned __int128
+        :type int128: bool
+        :raises ASLTranslationError: For bitstrings that are too wide
+        """
+
+        c_type = self._c_types.get(int128)
+        if c_type is None:
+            c_type = self._c_types[int128] = self._c_type(int128)
+        return c_type
+
+    def _c_type(self, int128):
+        """(Internal) Computes the result of c_type"""
 
         if self.type == self.Kind.bits:
-            return "u_int64_t"
+            return bits_c_type(self.value, int128)
         elif self.type == self.Kind.int:
             return "int64_t"
         elif self.type == self.Kind.bool:
@@ -54,3 +104,41 @@ class ASLType():
         else:
             assert False
             return None
+
+
+def bits_c_type(width, int128=True):
+    """Returns the narrowest C type (as a str) that holds a bitstring of the given width
+
+    :param width: The length of the bitstring or None if unknown
+    :type width: int or None
+    :param int128: Whether the C compiler supports unsigned __int128
+    :type int128: bool
+    :raises ASLTranslationError: If the width exceeds 128 bits, or 64 bits
+                                 without unsigned __int128
+    """
+
+    if width is None:
+        return "uint64_t"
+    for bits in (8, 16, 32, 64):
+        if width <= bits:
+            return "uint{0}_t".format(bits)
+    if width <= 128 and int128:
+        return "unsigned __int128"
+    raise ASLTranslationError("Bitstrings of {0} bits are wider than the widest C type ({1} bits)"
+                              .format(width, 128 if int128 else 64))
+
+
+def bits_c_literal(value):
+    """Returns the C code (as a str) of a non-negative constant of up to 128 bits
+
+    C has no literals wider than 64 bits, wider constants are put together
+    from their halves as unsigned __int128.
+
+    :param value: The constant
+    :type value: int
+    """
+
+    value = int(value)
+    if value >> 64:
+        return "(((unsigned __int128){0} << 64) | {1})".format(hex(value >> 64), hex(value & ((1 << 64) - 1)))
+    return hex(value)
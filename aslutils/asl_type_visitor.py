@@ -1,6 +1,34 @@
 from .ASLParser import ASLParser
 from .ASLVisitor import ASLVisitor
 from .asl_type import ASLType
+from .asl_builtins import lookup_builtin
+
+
+def slice_ranges(ctx):
+    """Returns the ranges of a slice expression, least significant first
+
+    A slice such as `x{lo -: hi, n}` consists of the range `lo -: hi` (the bits
+    from lo up to but excluding hi) followed by the single bit n. The bits
+    selected by the first range are the most significant ones of the result.
+
+    :param ctx: The slice expression
+    :type ctx: ASLParser.ExpressionContext
+    :returns: A list of ranges (low, high) where high is None for single bits
+    :rtype: [(ASLParser.ExpressionContext, ASLParser.ExpressionContext or None)]
+    """
+
+    ranges = []
+    cur_idx = ctx.getChildCount() - 3
+    while True:
+        if ctx.getChild(cur_idx).getSymbol().type == ASLParser.RangeDown:
+            ranges.append((ctx.getChild(cur_idx - 1), ctx.getChild(cur_idx + 1)))
+            cur_idx -= 2
+        else:
+            ranges.append((ctx.getChild(cur_idx + 1), None))
+        if ctx.getChild(cur_idx).getSymbol().type == ASLParser.LeftBrace:
+            break
+        cur_idx -= 2
+    return ranges
 
 
 class ASLTypeVisitor(ASLVisitor):
@@ -37,32 +65,11 @@ class ASLTypeVisitor(ASLVisitor):
         elif not ctx.Identifier() and ctx.LeftParen():
             return self.visit(ctx.expression(0))
         elif ctx.Identifier() and ctx.LeftParen():
-            function = ctx.Identifier().getText()
-            if function == "Replicate":
-                assert type1 == ASLType.Kind.bits
-                arg2_val = self.parent.value_visitor.visit(ctx.expression(1))
-                if type1.value is not None and arg2_val is not None:
-                    return ASLType(ASLType.Kind.bits, type1.value * arg2_val)
-                else:
-                    return None
-            if function == "Zeros":
-                assert type1 == ASLType.Kind.int
-                arg_val = self.parent.value_visitor.visit(ctx.expression(0))
-                return ASLType(ASLType.Kind.bits, arg_val)
-            if function == "UInt":
-                return ASLType(ASLType.Kind.int)
-            if function == "ZeroExtend":
-                arg_val = self.parent.value_visitor.visit(ctx.expression(0))
-                return ASLType(ASLType.Kind.bits, arg_val)
-            if function == "SignExtend":
-                arg_val = self.parent.value_visitor.visit(ctx.expression(0))
-                return ASLType(ASLType.Kind.bits, arg_val)
-            if function == "T32ExpandImm" or function == "A32ExpandImm":
-                return ASLType(ASLType.Kind.bits, 32)
-            if function == "AdvSIMDExpandImm":
-                return ASLType(ASLType.Kind.bits, 64)
-            else:
+            builtin = lookup_builtin(ctx.Identifier().getText())
+            if builtin is None:
                 return None
+            types = list(map(lambda x: self.visit(x), ctx.expression()))
+            return builtin.type(types, lambda i: self.parent.value_visitor.visit(ctx.expression(i)))
         elif ctx.LeftBracket():
             return None
         elif not ctx.In() and ctx.LeftBrace():
@@ -70,27 +77,22 @@ class ASLTypeVisitor(ASLVisitor):
                 assert False
                 return None
             else:
-                cur_idx = ctx.getChildCount() - 3
                 total_bits = 0
-                while True:
-                    expr_type = self.visit(ctx.getChild(cur_idx + 1))
-                    assert not expr_type or expr_type == ASLType.Kind.int
-                    if ctx.getChild(cur_idx).getSymbol().type == ASLParser.RangeDown:
-                        min_slice = self.visit(ctx.getChild(cur_idx - 1))
-                        assert not min_slice or min_slice == ASLType.Kind.int
-                        expr_val = self.parent.value_visitor.visit(ctx.getChild(cur_idx + 1))
-                        min_val = self.parent.value_visitor.visit(ctx.getChild(cur_idx - 1))
-                        if (expr_val is not None) and (min_val is not None):
-                            total_bits += expr_val - min_val
-                        else:
-                            total_bits = None
-                            break
-                    else:
+                for (low, high) in slice_ranges(ctx):
+                    low_type = self.visit(low)
+                    assert not low_type or low_type.type == ASLType.Kind.int
+                    if high is None:
                         total_bits += 1
-                    if ctx.getChild(cur_idx).getSymbol().type == ASLParser.LeftBrace:
-                        break
+                        continue
+                    high_type = self.visit(high)
+                    assert not high_type or high_type.type == ASLType.Kind.int
+                    low_val = self.parent.value_visitor.visit(low)
+                    high_val = self.parent.value_visitor.visit(high)
+                    if (low_val is not None) and (high_val is not None):
+                        total_bits += high_val - low_val
                     else:
-                        cur_idx -= 2
+                        total_bits = None
+                        break
                 return ASLType(ASLType.Kind.bits, total_bits)
         elif ctx.Dot():
             identName = ctx.Identifier().getText()
@@ -108,13 +110,15 @@ class ASLTypeVisitor(ASLVisitor):
         elif ctx.Negation():
             return ASLType(ASLType.Kind.bool)
         elif ctx.Colon():
+            if type1 is None or type2 is None or type1.value is None or type2.value is None:
+                return ASLType(ASLType.Kind.bits)
             return ASLType(ASLType.Kind.bits, type1.value + type2.value)
         elif ctx.Mult():
             if type1 is None:
                 return type2
             elif type2 is None:
                 return type1
-            elif type1 != type2:
+            elif type1.type != type2.type:
                 return ASLType(ASLType.Kind.real)
             else:
                 return type1
@@ -131,6 +135,9 @@ class ASLTypeVisitor(ASLVisitor):
         elif ctx.Divide():
             return ASLType(ASLType.Kind.real)
         elif ctx.LeftShift() or ctx.RightShift():
+            # shifting a bitstring keeps its length
+            if type1 is not None and type1.type == ASLType.Kind.bits:
+                return type1
             return ASLType(ASLType.Kind.int)
         elif ctx.Equal() or ctx.NotEqual() or ctx.Greater() or ctx.Less() \
                 or ctx.GreaterEqual() or ctx.LessEqual() or ctx.Land() or ctx.Lor():
@@ -1,14 +1,42 @@
 from .ASLParser import ASLParser
 from .ASLVisitor import ASLVisitor
+from .asl_bitvec import BitVec, BitPattern
+from .asl_builtins import lookup_builtin
+from .asl_type import ASLType
+from .asl_type_visitor import slice_ranges
+
+
+def match_value(value, pattern):
+    """Returns whether the constant value matches the constant pattern
+
+    Bitpatterns only compare the bits that are not don't cares, all other
+    values are compared for equality.
+    """
+
+    if isinstance(pattern, BitPattern):
+        return pattern.matches(value)
+    elif isinstance(value, BitPattern):
+        return value.matches(pattern)
+    else:
+        return value == pattern
+
+
+def plain_value(value):
+    """(Internal) Returns bitstrings as int and all other values unchanged"""
+
+    return value.value if isinstance(value, BitVec) else value
 
 
 class ASLValueVisitor(ASLVisitor):
     """Visits expressions and returns their value as a python type if it's a constant otherwise None.
 
-    For bits a value of type int is returned. For bitpatterns the returned value
-    is the pair of (value: int, mask: int). For other a string is returned.
-    For the other types (int, bool, real) a value of the directly corresponding
-    python type is returned (so: int, bool, float).
+    For bits a :class:`BitVec` is returned and for bitpatterns a
+    :class:`BitPattern`, both carry their length. For other a string is
+    returned. For the other types (int, bool, real) a value of the directly
+    corresponding python type is returned (so: int, bool, float). Calls are
+    folded if the function is a builtin with an evaluation rule (see
+    :mod:`asl_builtins`), bitstring arguments are passed to the evaluation rule
+    as int.
 
     :param parent: The parent object that invokes this object. The parent object
                    must have a field named `type_visitor` which is of type
@@ -21,15 +49,15 @@ class ASLValueVisitor(ASLVisitor):
 
     def visitExpression(self, ctx: ASLParser.ExpressionContext):
         type = self.parent.type_visitor.visit(ctx)
-        if not type:
+        if type is None:
             return None
         if ctx.expression(0):
             val1 = self.visit(ctx.expression(0))
-            if not val1:
+            if val1 is None:
                 return None
         if ctx.expression(1):
             val2 = self.visit(ctx.expression(1))
-            if not val2:
+            if val2 is None:
                 return None
         if ctx.If():
             if val1:
@@ -43,11 +71,33 @@ class ASLValueVisitor(ASLVisitor):
         elif not ctx.Identifier() and ctx.LeftParen():
             return val1
         elif ctx.Identifier() and ctx.LeftParen():
-            return None
+            builtin = lookup_builtin(ctx.Identifier().getText())
+            if builtin is None or builtin.evaluate is None:
+                return None
+            values = list(map(lambda x: self.visit(x), ctx.expression()))
+            if None in values:
+                return None
+            types = list(map(lambda x: self.parent.type_visitor.visit(x), ctx.expression()))
+            result = builtin.evaluate(list(map(plain_value, values)), types)
+            if type.type == ASLType.Kind.bits and type.value is not None \
+                    and isinstance(result, int) and not isinstance(result, bool):
+                return BitVec(result, type.value)
+            return result
         elif ctx.LeftBracket():
             return None
         elif not ctx.In() and ctx.LeftBrace():
-            return None
+            if ctx.Dot():
+                return None
+            if not isinstance(val1, (int, BitVec)):
+                return None
+            result = BitVec(0, 0)
+            for (low, high) in slice_ranges(ctx):
+                low_val = plain_value(self.visit(low))
+                high_val = low_val + 1 if high is None or low_val is None else plain_value(self.visit(high))
+                if low_val is None or high_val is None:
+                    return None
+                result = BitVec(plain_value(val1) >> low_val, high_val - low_val).concat(result)
+            return result
         elif ctx.Dot():
             return None
         elif ctx.Not():
@@ -64,20 +114,26 @@ class ASLValueVisitor(ASLVisitor):
             val = self.visit(ctx.expression(0))
             return not val
         elif ctx.Colon():
-            type2 = self.parent.type_visitor.visit(ctx.expression(1))
-            return val2 + (val1 << type2.value)
+            if not isinstance(val1, BitVec) or not isinstance(val2, BitVec):
+                return None
+            return val1.concat(val2)
         elif ctx.Mult():
             return val1 * val2
-        elif ctx.Div():
-            return val1 // val2
-        elif ctx.Mod():
-            return val1 % val2
-        elif ctx.Divide():
-            return val1 / val2
+        elif ctx.Div() or ctx.Mod() or ctx.Divide():
+            if val2 == 0:
+                return None
+            if ctx.Div():
+                return val1 // val2
+            elif ctx.Mod():
+                return val1 % val2
+            else:
+                return val1 / val2
         elif ctx.LeftShift() or ctx.RightShift():
-            return val1 << val2 if ctx.LeftShift else val1 >> val2
+            val2 = plain_value(val2)
+            return val1 << val2 if ctx.LeftShift() else val1 >> val2
         elif ctx.Equal() or ctx.NotEqual():
-            return val1 == val2 if ctx.Equal() else val1 != val2
+            equal = match_value(val1, val2)
+            return equal if ctx.Equal() else not equal
         elif ctx.Greater() or ctx.Less():
             return val1 > val2 if ctx.Greater() else val1 < val2
         elif ctx.GreaterEqual() or ctx.LessEqual():
@@ -93,7 +149,9 @@ class ASLValueVisitor(ASLVisitor):
                 return val1 ^ val2
         elif ctx.In():
             exprs = list(map(lambda x: self.visit(x), ctx.expression()))
-            return exprs[0] in exprs[1:]
+            if None in exprs:
+                return None
+            return any(match_value(exprs[0], expr) for expr in exprs[1:])
         elif ctx.Unknown():
             return None
         elif ctx.Identifier():
@@ -112,15 +170,12 @@ class ASLValueVisitor(ASLVisitor):
         elif ctx.Hex():
             return int(ctx.Hex().getText(), 16)
         elif ctx.BitVector():
-            pattern = ctx.BitVector().getText()[1:-1].translate({ord(' '): ''})
-            return int(pattern, 2)
+            return BitVec.from_string(ctx.BitVector().getText()[1:-1])
         elif ctx.BitPattern():
-            value = ctx.BitPattern().getText()[1:-1].translate({ord('x'): '0', ord(' '): ''})
-            mask = ctx.BitPattern().getText()[1:-1].translate({ord('x'): '0', ord('0'): '1', ord(' '): ''})
-            return (int(value, 2), int(mask, 2))
+            return BitPattern.from_string(ctx.BitPattern().getText()[1:-1])
         elif ctx.FixedPointNum():
             return float(ctx.FixedPointNum().getText())
         elif ctx.Bool():
-            return bool(ctx.Bool().getText().title())
+            return ctx.Bool().getText() == "TRUE"
         else:
             return ctx.String().getText()
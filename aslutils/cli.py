@@ -0,0 +1,87 @@
+import argparse
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .isa_output import OUTPUT_LANGUAGES, OutputTree, print_report, watch
+
+
+def state_entry(string):
+    """(Internal) Parses a state variable given as name:length or name:length:count"""
+
+    parts = string.split(":")
+    if len(parts) not in (2, 3) or not parts[0]:
+        raise argparse.ArgumentTypeError("Expected name:length or name:length:count, got {0!r}".format(string))
+    try:
+        return tuple([parts[0]] + [int(part) for part in parts[1:]])
+    except ValueError:
+        raise argparse.ArgumentTypeError("Invalid length in {0!r}".format(string))
+
+
+def argument_parser():
+    """(Internal) Returns the parser of the command line arguments"""
+
+    parser = argparse.ArgumentParser(prog="aslutils",
+                                     description="Translates the encodings of an instruction set to C, Python "
+                                                 "or VHDL, one file per encoding and language.")
+    parser.add_argument("decoder", help="the ASL decoder file")
+    parser.add_argument("instructions", nargs="+", help="the ASL instructions files")
+    parser.add_argument("-o", "--output", required=True, help="the directory of the generated files")
+    parser.add_argument("-l", "--language", action="append", choices=sorted(OUTPUT_LANGUAGES),
+                        help="a language to generate (can be repeated, default: c)")
+    parser.add_argument("-s", "--state", action="append", type=state_entry, default=[],
+                        help="a state variable as name:length or name:length:count (can be repeated)")
+    parser.add_argument("--cse", action="store_true", help="hoist repeated subexpressions into temporaries")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="the number of processes translating in parallel (default: 1)")
+    parser.add_argument("--cache-dir", help="a directory to keep the translated code in for later runs")
+    parser.add_argument("--profile", action="store_true", help="print the time spent in every phase to stderr")
+    parser.add_argument("-w", "--watch", action="store_true",
+                        help="keep running and regenerate the encodings that change")
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between polls in watch mode")
+    return parser
+
+
+def print_profile(profile, total):
+    """(Internal) Prints the seconds spent in every phase to stderr"""
+
+    for (phase, seconds) in profile.items():
+        print("{0:>10}: {1:8.3f}s".format(phase, seconds), file=sys.stderr)
+    print("{0:>10}: {1:8.3f}s".format("total", total), file=sys.stderr)
+
+
+def main(argv=None):
+    """Runs the command line interface (the `aslutils` command)
+
+    :param argv: The arguments, by default the ones of the process
+    :type argv: [str] or None
+    :returns: The exit status
+    :rtype: int
+    """
+
+    start = time.perf_counter()
+    args = argument_parser().parse_args(argv)
+    if args.jobs < 1:
+        argument_parser().error("--jobs has to be at least 1")
+    tree = OutputTree(args.decoder, args.instructions, args.output, args.language or ["c"], args.state, args.cse,
+                      args.cache_dir)
+    executor = ProcessPoolExecutor(args.jobs) if args.jobs > 1 else None
+    try:
+        if not args.watch:
+            profile = {} if args.profile else None
+            print_report(tree, tree.update(executor, profile))
+            if profile is not None:
+                print_profile(profile, time.perf_counter() - start)
+            return 0
+        try:
+            watch([tree], args.interval, executor=executor)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
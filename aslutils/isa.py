@@ -0,0 +1,299 @@
+import re
+
+from .parse_asl_file import NopDecodeListener, NopInstrsListener
+from .parse_asl_file import parse_asl_decoder_file, parse_asl_instructions_file
+from .parse_asl_file import mask_bits, value_bits
+
+
+class Encoding():
+    """An encoding of an instruction together with its code
+
+    :ivar self.name: The name of the encoding
+    :vartype self.name: str
+    :ivar self.instruction: The name of the instruction the encoding belongs to
+    :vartype self.instruction: str or None
+    :ivar self.fields: The fields of the encoding as (name, start, run), taken
+                       from the decoder file
+    :vartype self.fields: [(str, int, int)]
+    :ivar self.decode: The processed ASL code of `__decode` if any
+    :vartype self.decode: str or None
+    :ivar self.execute: The processed ASL code of `__execute` of the
+                        instruction if any
+    :vartype self.execute: str or None
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.instruction = None
+        self.fields = []
+        self.decode = None
+        self.execute = None
+
+
+class DecodeRule():
+    """One rule of a flattened decoder
+
+    An instruction word matches the rule if `(word & mask) == value`, it matches
+    none of the excluded (mask, value) pairs and the bits selected by the ranges
+    lie within their bounds. The rules of a decoder are ordered, the first
+    matching rule decides the encoding.
+
+    :ivar self.mask: The bits of the word that are tested
+    :vartype self.mask: int
+    :ivar self.value: The value the tested bits have to have
+    :vartype self.value: int
+    :ivar self.excluded: The (mask, value) pairs the word must not match
+    :vartype self.excluded: [(int, int)]
+    :ivar self.ranges: The ranges (start, run, low, high) where the bits
+                       `start +: run` of the word have to be between low and high
+                       (inclusive)
+    :vartype self.ranges: [(int, int, int, int)]
+    :ivar self.encoding: The name of the encoding or None if the words matching
+                         the rule are unallocated, unused or undocumented.
+    :vartype self.encoding: str or None
+    """
+
+    def __init__(self, mask, value, excluded, ranges, encoding):
+        self.mask = mask
+        self.value = value
+        self.excluded = excluded
+        self.ranges = ranges
+        self.encoding = encoding
+
+    def matches(self, word):
+        """Returns whether the instruction word matches the rule"""
+
+        if (word & self.mask) != self.value:
+            return False
+        for (mask, value) in self.excluded:
+            if (word & mask) == value:
+                return False
+        for (start, run, low, high) in self.ranges:
+            if not low <= (word >> start) & ((1 << run) - 1) <= high:
+                return False
+        return True
+
+
+class DecodeNode():
+    """A node of a decoder tree, either the root of a decoder or a `when`
+
+    :param conditions: The conditions of the `when` as (start, run, value)
+                       where the bits `start +: run` of the word have to match
+                       the value (empty for the root)
+    :type conditions: [(int, int, WhenValue)]
+
+    :ivar self.fields: The fields declared in the node by name as (start, run)
+    :vartype self.fields: {str: (int, int)}
+    :ivar self.case: The fields of the nested case as (start, run) or None
+    :vartype self.case: [(int, int)] or None
+    :ivar self.children: The nodes of the `when`s of the nested case
+    :vartype self.children: [DecodeNode]
+    :ivar self.leaf: Whether decoding ends at the node
+    :vartype self.leaf: bool
+    :ivar self.encoding: The name of the encoding if the node is a leaf or None
+                         if the words are unallocated, unused or undocumented.
+    :vartype self.encoding: str or None
+    """
+
+    def __init__(self, conditions):
+        self.conditions = conditions
+        self.fields = {}
+        self.case = None
+        self.children = []
+        self.leaf = False
+        self.encoding = None
+
+
+class ISA():
+    """The instruction set described by a decoder and an instructions file
+
+    :ivar self.encodings: The encodings by name (in the order of the
+                          instructions file, followed by encodings that only
+                          appear in the decoder)
+    :vartype self.encodings: {str: Encoding}
+    :ivar self.decoders: The flattened rules of every decoder (`__decode name`)
+                         by decoder name
+    :vartype self.decoders: {str: [DecodeRule]}
+    :ivar self.trees: The decoder trees by decoder name
+    :vartype self.trees: {str: DecodeNode}
+    """
+
+    def __init__(self):
+        self.encodings = {}
+        self.decoders = {}
+        self.trees = {}
+
+    def encoding(self, name):
+        """(Internal) Returns the encoding with the given name, creating it if needed"""
+
+        if name not in self.encodings:
+            self.encodings[name] = Encoding(name)
+        return self.encodings[name]
+
+    def decode(self, word, decoder=None):
+        """Returns the name of the encoding of the word or None
+
+        Walks the rules one by one, so this is only meant as reference for the
+        generated decoders.
+
+        :param decoder: The name of the decoder, by default the first one
+        :type decoder: str or None
+        """
+
+        rules = self.decoders[decoder if decoder is not None else next(iter(self.decoders))]
+        for rule in rules:
+            if rule.matches(word):
+                return rule.encoding
+        return None
+
+
+class ISAInstrsListener(NopInstrsListener):
+    """(Internal) Collects the code of every encoding of an instructions file"""
+
+    def __init__(self, isa):
+        self.isa = isa
+        self.instruction = None
+        self.encodings = []
+
+    def listen_instruction(self, name):
+        self.instruction = name
+        self.encodings = []
+        return True
+
+    def listen_encoding(self, name):
+        encoding = self.isa.encoding(name)
+        encoding.instruction = self.instruction
+        self.encodings.append(encoding)
+        return True
+
+    def listen_decode(self, code):
+        self.encodings[-1].decode = code
+
+    def listen_execute(self, code):
+        for encoding in self.encodings:
+            encoding.execute = code
+
+
+class ISADecodeListener(NopDecodeListener):
+    """(Internal) Flattens the decoder trees into lists of rules
+
+    Keeps a stack of scopes, one per `when`, holding the conditions on the word,
+    the fields declared so far and the node of the decoder tree. Every leaf adds a rule with the conditions
+    of its scope. Since a word that matches a `when` but none of the nested
+    cases is not decoded by later `when`s, a catch-all rule without encoding is
+    added after nested cases.
+    """
+
+    def __init__(self, isa):
+        self.isa = isa
+        self.rules = None
+        self.scopes = []
+        self.cases = []
+
+    def listen_decode(self, name):
+        self.rules = self.isa.decoders.setdefault(name, [])
+        root = self.isa.trees[name] = DecodeNode([])
+        self.scopes = [{"mask": 0, "value": 0, "excluded": [], "ranges": [], "fields": {}, "leaf": False,
+                        "node": root}]
+        return True
+
+    def listen_case(self, fields):
+        scope = self.scopes[-1]
+        positions = []
+        for field in fields:
+            if field.name is not None:
+                positions.append(scope["fields"][field.name])
+            else:
+                positions.append((field.start, field.run))
+        self.cases.append(positions)
+        scope["node"].case = positions
+        return True
+
+    def after_listen_case(self, fields):
+        self.cases.pop()
+
+    def listen_when(self, values):
+        parent = self.scopes[-1]
+        scope = {"mask": parent["mask"], "value": parent["value"], "excluded": list(parent["excluded"]),
+                 "ranges": list(parent["ranges"]), "fields": dict(parent["fields"]), "leaf": False,
+                 "node": DecodeNode([(start, run, value) for ((start, run), value) in zip(self.cases[-1], values)])}
+        parent["node"].children.append(scope["node"])
+        for ((start, run), value) in zip(self.cases[-1], values):
+            if value.value is not None:
+                scope["mask"] |= mask_bits(value.value) << start
+                scope["value"] |= value_bits(value.value) << start
+            elif value.notvalue is not None:
+                scope["excluded"].append((mask_bits(value.notvalue) << start, value_bits(value.notvalue) << start))
+            elif value.range is not None:
+                scope["ranges"].append((start, run) + value.range)
+        self.scopes.append(scope)
+        return True
+
+    def after_listen_when(self, values):
+        scope = self.scopes.pop()
+        if not scope["leaf"] and not self.covers(self.rules[-1] if self.rules else None, scope):
+            self.add_rule(scope, None, False)
+
+    def listen_field(self, name, start, run):
+        self.scopes[-1]["fields"][name] = (start, run)
+        self.scopes[-1]["node"].fields[name] = (start, run)
+
+    def listen_encoding(self, name):
+        scope = self.scopes[-1]
+        encoding = self.isa.encoding(name)
+        if not encoding.fields:
+            encoding.fields = [(field, start, run) for (field, (start, run)) in scope["fields"].items()]
+        self.add_rule(scope, name)
+
+    def listen_undocumented(self):
+        self.add_rule(self.scopes[-1], None)
+
+    def listen_unallocated(self):
+        self.add_rule(self.scopes[-1], None)
+
+    def listen_unused(self):
+        self.add_rule(self.scopes[-1], None)
+
+    def covers(self, rule, scope):
+        """(Internal) Returns whether the rule matches every word that the conditions of the scope match"""
+
+        return rule is not None and rule.mask == scope["mask"] and rule.value == scope["value"] \
+            and rule.excluded == scope["excluded"] and rule.ranges == scope["ranges"]
+
+    def add_rule(self, scope, encoding, leaf=True):
+        """(Internal) Adds a rule for the conditions of the scope, leaf is False for catch-all rules"""
+
+        if leaf:
+            scope["leaf"] = True
+            scope["node"].leaf = True
+            scope["node"].encoding = encoding
+        self.rules.append(DecodeRule(scope["mask"], scope["value"], scope["excluded"], scope["ranges"], encoding))
+
+
+def load_isa(decoder_filename, instructions_filename):
+    """Parses a decoder and an instructions file into an :class:`ISA`
+
+    :param decoder_filename: A path to the decoder file
+    :type decoder_filename: str
+    :param instructions_filename: A path to the instructions file or a list of
+                                  paths if the instructions are split into
+                                  several files
+    :type instructions_filename: str or [str]
+    :rtype: ISA
+    """
+
+    isa = ISA()
+    if isinstance(instructions_filename, str):
+        instructions_filename = [instructions_filename]
+    for filename in instructions_filename:
+        parse_asl_instructions_file(filename, ISAInstrsListener(isa))
+    parse_asl_decoder_file(decoder_filename, ISADecodeListener(isa))
+    return isa
+
+
+def canonical_snippet(code):
+    """(Internal) Returns the processed ASL code with all whitespace outside of strings normalized"""
+
+    if code is None:
+        return None
+    return " ".join(re.findall(r'"[^"]*"|\S+', code))
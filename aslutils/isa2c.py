@@ -0,0 +1,371 @@
+from .asl2c import CVisitor
+from .asl_code_visitor import CodeBlock, indent_lines
+from .asl_type import bits_c_type
+from .isa_decision import DecisionLeaf, decision_trees, shared_switches, switch_groups
+from .isa_snippets import SharedSnippets, referenced_names
+from .parse_asl_file import mask_bits, value_bits
+
+
+#: The runtime the generated C code relies on
+RUNTIME_HEADER = """#ifndef ASL_RUNTIME_H
+#define ASL_RUNTIME_H
+
+#include <assert.h>
+#include <stdbool.h>
+#include <stdint.h>
+
+/* Status returned by the execute functions */
+#define ASL_OK 0
+#define ASL_UNDEFINED 1
+#define ASL_UNPREDICTABLE 2
+#define ASL_UNALLOCATED 3
+
+/* UNDEFINED and UNPREDICTABLE end the execution of the instruction */
+#ifndef undefined
+#define undefined() return ASL_UNDEFINED
+#endif
+#ifndef unpredictable
+#define unpredictable() return ASL_UNPREDICTABLE
+#endif
+
+/* The runtime functions work on the widest bitstrings the compiler supports */
+#ifdef __SIZEOF_INT128__
+typedef unsigned __int128 asl_bits_t;
+typedef __int128 asl_int_t;
+#else
+typedef uint64_t asl_bits_t;
+typedef int64_t asl_int_t;
+#endif
+#define ASL_BITS_WIDTH ((int64_t)sizeof(asl_bits_t) * 8)
+
+static inline asl_int_t SInt(asl_bits_t x, int64_t width)
+{
+    asl_bits_t sign = (asl_bits_t)1 << (width - 1);
+    return (asl_int_t)((x ^ sign) - sign);
+}
+
+static inline asl_bits_t SignExtend(asl_bits_t x, int64_t width, int64_t from_width)
+{
+    asl_bits_t sign = (asl_bits_t)1 << (from_width - 1);
+    asl_bits_t result = (x ^ sign) - sign;
+    return width < ASL_BITS_WIDTH ? result & (((asl_bits_t)1 << width) - 1) : result;
+}
+
+static inline asl_bits_t Replicate(asl_bits_t x, int64_t count, int64_t width)
+{
+    asl_bits_t result = 0;
+    for (int64_t i = 0; i < count; i++) {
+        result = width < ASL_BITS_WIDTH ? (result << width) | x : x;
+    }
+    return result;
+}
+
+#endif
+"""
+
+#: Maximum number of case labels of a switch
+MAX_LABELS = 1024
+
+#: Minimum ratio of labels to the range they span for a switch to be emitted
+MIN_DENSITY = 0.5
+
+
+def indent(lines):
+    """(Internal) Returns the lines as a block one level deeper, to be appended as one item"""
+
+    return CodeBlock(lines)
+
+
+def state_loads(state, names=None):
+    """(Internal) Returns the lines copying the state variables (or those in names) into locals"""
+
+    lines = []
+    for entry in state:
+        if names is not None and entry[0] not in names:
+            continue
+        if len(entry) > 2:
+            lines.append("    {0} *{1} = state->{1};".format(bits_c_type(entry[1]), entry[0]))
+        else:
+            lines.append("    {0} {1} = state->{1};".format(bits_c_type(entry[1]), entry[0]))
+    return lines
+
+
+def snippet_function(snippet, state):
+    """(Internal) Returns the lines of the static inline function of an `__execute` snippet"""
+
+    parameters = "".join(", {0} {1}".format(type.c_type(CVisitor.int128), name) for (name, type) in snippet.parameters)
+    lines = ["static inline int {0}(struct asl_state *state{1})".format(snippet.name, parameters), "{"]
+    lines += state_loads(state)
+    lines.append(indent(snippet.lines))
+    for entry in state:
+        if len(entry) == 2:
+            lines.append("    state->{0} = {0};".format(entry[0]))
+    lines += ["    return ASL_OK;", "}"]
+    return lines
+
+
+def encoding_function(encoding, snippets, word_type):
+    """(Internal) Returns the lines of the static inline function of an encoding
+
+    The function extracts the fields, runs `__decode` and calls the function
+    of the `__execute` snippet (see :class:`SharedSnippets`).
+    """
+
+    (key, snippet, arguments) = snippets.encodings[encoding.name]
+    lines = ["static inline int execute_{0}({1} word, struct asl_state *state)".format(encoding.name, word_type),
+             "{"]
+    for (field, start, run) in encoding.fields:
+        lines.append("    {0} {1} = (word >> {2}) & {3};".format(bits_c_type(run), field, start, hex((1 << run) - 1)))
+    if encoding.decode:
+        lines += state_loads(snippets.state, referenced_names(encoding.decode)[0])
+    lines.append(indent(snippets.decodes[key][1]))
+    if snippet is not None:
+        lines.append("    return {0}(state{1});".format(snippet.name, "".join(", " + arg for arg in arguments)))
+    else:
+        lines.append("    return ASL_OK;")
+    lines.append("}")
+    return lines
+
+
+def field_values(start, run, value):
+    """(Internal) Returns the list of the values of a field matching a when value or None if there are too many"""
+
+    if value.empty:
+        values = range(1 << run) if run <= 16 else None
+    elif value.value is not None:
+        mask = mask_bits(value.value)
+        bits = value_bits(value.value)
+        free = [i for i in range(run) if not (mask >> i) & 1]
+        if len(free) > 16:
+            return None
+        values = []
+        for n in range(1 << len(free)):
+            values.append(bits | sum(((n >> j) & 1) << i for (j, i) in enumerate(free)))
+    elif value.notvalue is not None:
+        if run > 16:
+            return None
+        (mask, bits) = (mask_bits(value.notvalue), value_bits(value.notvalue))
+        values = [v for v in range(1 << run) if (v & mask) != bits]
+    else:
+        values = range(value.range[0], value.range[1] + 1)
+    return values if values is not None and len(values) <= MAX_LABELS else None
+
+
+def case_labels(node):
+    """(Internal) Returns the case labels of every child of a node or None if no switch can be used
+
+    The key of the switch is the concatenation of the fields of the case, the
+    first field being the most significant. Since the first matching `when`
+    is taken, labels that are already taken by earlier children are dropped.
+    """
+
+    taken = set()
+    labels = []
+    for child in node.children:
+        keys = [0]
+        for (start, run, value) in child.conditions:
+            values = field_values(start, run, value)
+            if values is None or len(keys) * len(values) > MAX_LABELS:
+                return None
+            keys = [(key << run) | v for key in keys for v in values]
+        keys = [key for key in keys if key not in taken]
+        taken.update(keys)
+        labels.append(keys)
+        if len(taken) > MAX_LABELS:
+            return None
+    if taken and len(taken) / (max(taken) - min(taken) + 1) < MIN_DENSITY:
+        return None
+    return labels
+
+
+def when_condition(child):
+    """(Internal) Returns the C condition of a `when` on `word`"""
+
+    mask = 0
+    bits = 0
+    conditions = []
+    for (start, run, value) in child.conditions:
+        if value.value is not None:
+            mask |= mask_bits(value.value) << start
+            bits |= value_bits(value.value) << start
+        elif value.notvalue is not None:
+            conditions.append("(word & {0}) != {1}".format(hex(mask_bits(value.notvalue) << start),
+                                                           hex(value_bits(value.notvalue) << start)))
+        elif value.range is not None:
+            field = "((word >> {0}) & {1})".format(start, hex((1 << run) - 1))
+            conditions.append("{0} >= {1} && {0} <= {2}".format(field, value.range[0], value.range[1]))
+    if mask:
+        conditions.insert(0, "(word & {0}) == {1}".format(hex(mask), hex(bits)))
+    return " && ".join("({0})".format(condition) for condition in conditions) if conditions else None
+
+
+def node_code(node, depth, shared):
+    """(Internal) Returns the lines of the decoder for the words reaching the node
+
+    Every path through the lines ends in a return statement. The functions of
+    the encodings are looked up in shared (see :class:`SharedSnippets`).
+    """
+
+    if node.leaf:
+        if node.encoding is None:
+            return ["return ASL_UNALLOCATED;"]
+        return ["return execute_{0}(word, state);".format(shared[node.encoding])]
+    if node.case is None or not node.children:
+        return ["return ASL_UNALLOCATED;"]
+    if not node.case:
+        return node_code(node.children[0], depth, shared)
+    labels = case_labels(node)
+    if labels is None:
+        lines = []
+        for child in node.children:
+            condition = when_condition(child)
+            if condition is None:
+                return lines + node_code(child, depth, shared)
+            lines.append("if ({0}) {{".format(condition))
+            lines.append(indent(node_code(child, depth, shared)))
+            lines.append("}")
+        return lines + ["return ASL_UNALLOCATED;"]
+    key = "key{0}".format(depth)
+    parts = []
+    position = 0
+    for (start, run) in reversed(node.case):
+        part = "((word >> {0}) & {1})".format(start, hex((1 << run) - 1))
+        parts.insert(0, "({0} << {1})".format(part, position) if position else part)
+        position += run
+    lines = ["uint64_t {0} = {1};".format(key, " | ".join(parts) if parts else "0"),
+             "switch ({0}) {{".format(key)]
+    for (child, keys) in zip(node.children, labels):
+        code = node_code(child, depth + 1, shared)
+        # unallocated words are handled by the default label
+        if not keys or code == ["return ASL_UNALLOCATED;"]:
+            continue
+        lines.append(" ".join("case {0}:".format(hex(k)) for k in sorted(keys)))
+        lines.append(indent(["{", indent(code), "}"]))
+    lines += ["default:", "    return ASL_UNALLOCATED;", "}"]
+    return lines
+
+
+def switch_code(node, functions, shared, top=True):
+    """(Internal) Returns the lines of the decoder for the words reaching a node of a decision tree
+
+    Every path through the lines ends in a return statement. Shared switches
+    are called through their functions (by id), the functions of the encodings
+    are looked up in shared (see :class:`SharedSnippets`).
+    """
+
+    if isinstance(node, DecisionLeaf):
+        if node.encoding is None:
+            return ["return ASL_UNALLOCATED;"]
+        return ["return execute_{0}(word, state);".format(shared[node.encoding])]
+    if not top and id(node) in functions:
+        return ["return {0}(word, state);".format(functions[id(node)])]
+    lines = ["switch ((word >> {0}) & {1}) {{".format(node.start, hex((1 << node.run) - 1))]
+    groups = switch_groups(node)
+    for (child, values) in groups[:-1]:
+        lines.append(" ".join("case {0}:".format(hex(value)) for value in values))
+        lines.append(indent(["{", indent(switch_code(child, functions, shared, False)), "}"]))
+    lines += ["default:", indent(["{", indent(switch_code(groups[-1][0], functions, shared, False)), "}"])]
+    return lines + ["}"]
+
+
+def tree_code(name, tree, word_type, shared):
+    """(Internal) Returns the lines of the execute function of a decoder following its decision tree"""
+
+    functions = {}
+    lines = []
+    for (i, node) in enumerate(shared_switches(tree)):
+        functions[id(node)] = "asl_decode_{0}_{1}".format(name, i)
+        lines += ["", "static int {0}({1} word, struct asl_state *state)".format(functions[id(node)], word_type),
+                  "{"]
+        lines.append(indent(switch_code(node, functions, shared)))
+        lines.append("}")
+    lines += ["", "int asl_execute_{0}({1} word, struct asl_state *state)".format(name, word_type), "{"]
+    lines.append(indent(switch_code(tree, functions, shared)))
+    return lines + ["}"]
+
+
+def isa_to_c(isa, state=(), word_width=32, header="asl_runtime.h", cse=False, optimize=False, profile=None,
+             stats=None):
+    """Generates a C translation unit executing the instruction set
+
+    The translation unit contains:
+
+     * `struct asl_state` with a member for every state variable.
+     * A `static inline int snippet_<encoding>(state, ...)` function for every
+       distinct `__execute` snippet and a `static inline int
+       execute_<encoding>(word, state)` function for every encoding, which
+       runs `__decode` and calls the function of its `__execute` snippet. Each
+       snippet is translated once with :func:`asl_to_c` (see
+       :class:`SharedSnippets`). The functions return ASL_OK or the status of
+       UNDEFINED or UNPREDICTABLE. Encodings with the same code and fields
+       share the function of the first one.
+     * An `int asl_execute_<decoder>(word, state)` function for every decoder
+       which decodes the word with nested `switch` statements over the values
+       of the fields of the cases and calls the function of the encoding. It
+       returns the status of the encoding or ASL_UNALLOCATED. Cases whose
+       `when` values are sparse or have too many don't care bits are decoded
+       with if statements instead. If optimize is set, the decision trees of
+       :func:`decision_trees` are used instead of the decoder trees.
+
+    :param isa: The instruction set, see :func:`load_isa`
+    :type isa: ISA
+    :param state: The variables of the state, see :func:`encoding_source`.
+                  Variables that are not bitstrings are not supported.
+    :type state: [(str, int)] or [(str, int, int)]
+    :param word_width: The length of the instruction words in bits
+    :type word_width: int
+    :param header: The name of the file the runtime (:data:`RUNTIME_HEADER`)
+                   is included from or None to put the runtime into the
+                   translation unit
+    :type header: str or None
+    :param cse: Whether to hoist repeated pure subexpressions into temporaries
+    :type cse: bool
+    :param optimize: Whether to decode with the decision trees built from the
+                     flattened rules
+    :type optimize: bool
+    :param profile: Relative frequencies of the encodings by name, used to
+                    build the decision trees (opt)
+    :type profile: {str: float} or None
+    :param stats: If given, the statistics of the deduplication of the
+                  snippets are stored under "snippets" (see
+                  :meth:`SharedSnippets.stats`) and, if optimize is set, the
+                  statistics of the decision trees by decoder name
+    :type stats: dict or None
+    :returns: The C source code
+    :rtype: str
+    """
+
+    word_type = bits_c_type(word_width)
+    lines = ["/* Generated by aslutils, do not edit */", ""]
+    if header is None:
+        lines += RUNTIME_HEADER.splitlines()
+    else:
+        lines.append('#include "{0}"'.format(header))
+    lines += ["", "struct asl_state {"]
+    for entry in state:
+        if len(entry) > 2:
+            lines.append("    {0} {1}[{2}];".format(bits_c_type(entry[1]), entry[0], entry[2]))
+        else:
+            lines.append("    {0} {1};".format(bits_c_type(entry[1]), entry[0]))
+    lines.append("};")
+    snippets = SharedSnippets(isa, CVisitor, state, cse)
+    shared = snippets.shared
+    if stats is not None:
+        stats["snippets"] = snippets.stats()
+    for snippet in snippets.executes:
+        lines.append("")
+        lines += snippet_function(snippet, state)
+    for encoding in isa.encodings.values():
+        if shared[encoding.name] != encoding.name:
+            continue
+        lines.append("")
+        lines += encoding_function(encoding, snippets, word_type)
+    if optimize:
+        for (name, tree) in decision_trees(isa, profile, stats).items():
+            lines += tree_code(name, tree, word_type, shared)
+        return "\n".join(indent_lines(lines)) + "\n"
+    for (name, root) in isa.trees.items():
+        lines += ["", "int asl_execute_{0}({1} word, struct asl_state *state)".format(name, word_type), "{"]
+        lines.append(indent(node_code(root, 0, shared)))
+        lines.append("}")
+    return "\n".join(indent_lines(lines)) + "\n"
@@ -0,0 +1,193 @@
+from .asl2py import PythonVisitor
+from .asl_compile import variables_of
+from .isa_decision import DecisionLeaf, decision_trees, shared_switches, switch_groups
+from .isa_snippets import SharedSnippets, referenced_names
+
+
+def rule_condition(rule):
+    """(Internal) Returns the python condition of a decode rule on `word` or None if it always matches"""
+
+    conditions = []
+    if rule.mask:
+        conditions.append("(word & {0}) == {1}".format(hex(rule.mask), hex(rule.value)))
+    for (mask, value) in rule.excluded:
+        conditions.append("(word & {0}) != {1}".format(hex(mask), hex(value)))
+    for (start, run, low, high) in rule.ranges:
+        conditions.append("{0} <= ((word >> {1}) & {2}) <= {3}".format(low, start, hex((1 << run) - 1), high))
+    return " and ".join(conditions) if conditions else None
+
+
+def decoder_source(name, rules):
+    """(Internal) Returns the lines of the flat decode function of a decoder"""
+
+    lines = ["def decode_{0}(word):".format(name)]
+    for rule in rules:
+        condition = rule_condition(rule)
+        if condition is None:
+            lines.append("    return {0!r}".format(rule.encoding))
+            return lines
+        lines.append("    if {0}:".format(condition))
+        lines.append("        return {0!r}".format(rule.encoding))
+    lines.append("    return None")
+    return lines
+
+
+def switch_source(node, functions, depth):
+    """(Internal) Returns the lines deciding the encoding of the words reaching a node of a decision tree
+
+    Every path through the lines ends in a return statement. Shared switches
+    are called through their functions (by id).
+    """
+
+    if isinstance(node, DecisionLeaf):
+        return ["return {0!r}".format(node.encoding)]
+    if depth and id(node) in functions:
+        return ["return {0}(word)".format(functions[id(node)])]
+    field = "(word >> {0}) & {1}".format(node.start, hex((1 << node.run) - 1)) if node.start else \
+        "word & {0}".format(hex((1 << node.run) - 1))
+    if all(isinstance(child, DecisionLeaf) for child in node.children):
+        table = ", ".join(repr(child.encoding) for child in node.children)
+        return ["return ({0})[{1}]".format(table, field)]
+    variable = "field{0}".format(depth)
+    lines = ["{0} = {1}".format(variable, field)]
+    groups = switch_groups(node)
+    for (child, values) in groups[:-1]:
+        if len(values) == 1:
+            lines.append("if {0} == {1}:".format(variable, hex(values[0])))
+        else:
+            lines.append("if {0} in {{{1}}}:".format(variable, ", ".join(hex(value) for value in values)))
+        lines += ["    " + line for line in switch_source(child, functions, depth + 1)]
+    return lines + switch_source(groups[-1][0], functions, depth + 1)
+
+
+def tree_source(name, tree):
+    """(Internal) Returns the lines of the decode function of a decoder following its decision tree"""
+
+    functions = {}
+    lines = []
+    for (i, node) in enumerate(shared_switches(tree)):
+        functions[id(node)] = "_decode_{0}_{1}".format(name, i)
+        lines += ["def {0}(word):".format(functions[id(node)])]
+        lines += ["    " + line for line in switch_source(node, functions, 0)]
+        lines += ["", ""]
+    lines.append("def decode_{0}(word):".format(name))
+    return lines + ["    " + line for line in switch_source(tree, functions, 0)]
+
+
+def snippet_source(snippet, state):
+    """(Internal) Returns the lines of the function of an `__execute` snippet"""
+
+    lines = ["def {0}(state{1}):".format(snippet.name, "".join(", " + name for (name, _) in snippet.parameters))]
+    for var in variables_of(state):
+        lines.append("    {0} = state[{0!r}]".format(var))
+    lines += ["    " + line for line in snippet.lines]
+    for var in variables_of(state):
+        lines.append("    state[{0!r}] = {0}".format(var))
+    lines.append("    return state")
+    return lines
+
+
+def encoding_function_source(encoding, snippets):
+    """(Internal) Returns the lines of the function of an encoding
+
+    Like the functions of :func:`encoding_source`, but `__decode` and
+    `__execute` are taken from the shared snippets (see
+    :class:`SharedSnippets`).
+    """
+
+    (key, snippet, arguments) = snippets.encodings[encoding.name]
+    lines = ["def execute_{0}(word, state):".format(encoding.name)]
+    if encoding.fields:
+        lines.append("    if word.__class__ is int:")
+        for (field, start, run) in encoding.fields:
+            lines.append("        {0} = (word >> {1}) & {2}".format(field, start, hex((1 << run) - 1)))
+        lines.append("    else:")
+        for (field, start, run) in encoding.fields:
+            lines.append("        {0} = word[{1!r}]".format(field, field))
+    if encoding.decode:
+        names = referenced_names(encoding.decode)[0]
+        for var in variables_of(snippets.state):
+            if var in names:
+                lines.append("    {0} = state[{0!r}]".format(var))
+    lines += ["    " + line for line in snippets.decodes[key][1]]
+    if snippet is not None:
+        lines.append("    return {0}(state{1})".format(snippet.name, "".join(", " + arg for arg in arguments)))
+    else:
+        lines.append("    return state")
+    return lines
+
+
+def isa_to_py(isa, state=(), cse=False, optimize=False, profile=None, stats=None):
+    """Generates a python module executing the instruction set
+
+    The module contains a decode function `decode_<name>(word)` for every
+    decoder, which returns the name of the encoding of the word or None, and an
+    execute function `execute_<encoding>(word, state)` for every encoding (see
+    :func:`encoding_source`). The `__decode` and `__execute` snippets are
+    translated once (see :class:`SharedSnippets`), every `__execute` snippet
+    becomes a function `snippet_<encoding>(state, ...)` called by the execute
+    functions. Encodings with the same code and fields share the function of
+    the first one, the others are aliases of it. They are collected in the
+    dicts `DECODE` (by decoder name) and `EXECUTE` (by encoding name). The
+    function `execute(word, state, decoder)` decodes and executes an
+    instruction word.
+
+    Since the result is a regular module, it can be written to a file and
+    imported, which lets python cache the compiled byte code.
+
+    :param isa: The instruction set, see :func:`load_isa`
+    :type isa: ISA
+    :param state: The variables of the state, see :func:`encoding_source`
+    :type state: [(str, int or None)] or [(str, int, int)]
+    :param cse: Whether to hoist repeated pure subexpressions into temporaries
+    :type cse: bool
+    :param optimize: Whether to decode with the decision trees of
+                     :func:`decision_trees` instead of testing the rules one
+                     after the other
+    :type optimize: bool
+    :param profile: Relative frequencies of the encodings by name, used to
+                    build the decision trees (opt)
+    :type profile: {str: float} or None
+    :param stats: If given, the statistics of the deduplication of the
+                  snippets are stored under "snippets" (see
+                  :meth:`SharedSnippets.stats`) and, if optimize is set, the
+                  statistics of the decision trees by decoder name
+    :type stats: dict or None
+    :returns: The source of the module
+    :rtype: str
+    """
+
+    lines = ["# Generated by aslutils, do not edit", "",
+             "from aslutils.asl_runtime import *  # noqa: F401,F403"]
+    if optimize:
+        for (name, tree) in decision_trees(isa, profile, stats).items():
+            lines += ["", ""] + tree_source(name, tree)
+    else:
+        for (name, rules) in isa.decoders.items():
+            lines += ["", ""] + decoder_source(name, rules)
+    snippets = SharedSnippets(isa, PythonVisitor, state, cse)
+    shared = snippets.shared
+    if stats is not None:
+        stats["snippets"] = snippets.stats()
+    for snippet in snippets.executes:
+        lines += ["", ""] + snippet_source(snippet, state)
+    executed = []
+    for encoding in isa.encodings.values():
+        if encoding.decode is None and encoding.execute is None:
+            continue
+        executed.append(encoding.name)
+        if shared[encoding.name] != encoding.name:
+            lines += ["", "", "execute_{0} = execute_{1}".format(encoding.name, shared[encoding.name])]
+            continue
+        lines += ["", ""] + encoding_function_source(encoding, snippets)
+    lines += ["", ""]
+    lines.append("DECODE = {{{0}}}".format(", ".join("{0!r}: decode_{0}".format(name) for name in isa.decoders)))
+    lines.append("EXECUTE = {{{0}}}".format(", ".join("{0!r}: execute_{0}".format(name) for name in executed)))
+    default = next(iter(isa.decoders), None)
+    lines += ["", "",
+              "def execute(word, state, decoder={0!r}):".format(default),
+              "    encoding = DECODE[decoder](word)",
+              "    if encoding is None:",
+              "        undefined()",
+              "    return EXECUTE[encoding](word, state)"]
+    return "\n".join(lines) + "\n"
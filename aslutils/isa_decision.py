@@ -0,0 +1,319 @@
+import math
+
+
+#: The maximum number of bits a switch of the decision tree tests at once
+MAX_RUN = 8
+
+
+class DecisionLeaf():
+    """A leaf of a decision tree
+
+    :ivar self.encoding: The name of the encoding or None if unallocated
+    :vartype self.encoding: str or None
+    """
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+
+
+class DecisionSwitch():
+    """An inner node of a decision tree testing the bits `start +: run` of the word
+
+    :ivar self.start: The first bit tested
+    :vartype self.start: int
+    :ivar self.run: The number of bits tested
+    :vartype self.run: int
+    :ivar self.children: The node for every value of the bits (2**run nodes).
+                         Equal subtrees are shared, so the tree is a DAG.
+    :vartype self.children: [DecisionLeaf or DecisionSwitch]
+    """
+
+    def __init__(self, start, run, children):
+        self.start = start
+        self.run = run
+        self.children = children
+
+
+def rule_bits(rule):
+    """(Internal) Returns the mask of all bits of the word that a rule looks at"""
+
+    bits = rule.mask
+    for (mask, value) in rule.excluded:
+        bits |= mask
+    for (start, run, low, high) in rule.ranges:
+        bits |= ((1 << run) - 1) << start
+    return bits
+
+
+def rule_state(rule, known_mask, known_value):
+    """(Internal) Returns whether a rule matches given the known bits of the word
+
+    :returns: True if it matches every word with the known bits, False if it
+              matches none and None if it depends on bits that are not known
+    """
+
+    common = rule.mask & known_mask
+    if (known_value & common) != (rule.value & common):
+        return False
+    decided = rule.mask & ~known_mask == 0
+    for (mask, value) in rule.excluded:
+        common = mask & known_mask
+        if (known_value & common) != (value & common):
+            continue
+        if mask & ~known_mask == 0:
+            return False
+        decided = False
+    for (start, run, low, high) in rule.ranges:
+        field_mask = ((1 << run) - 1) << start
+        if field_mask & ~known_mask != 0:
+            decided = False
+        elif not low <= (known_value >> start) & ((1 << run) - 1) <= high:
+            return False
+    return True if decided else None
+
+
+class DecisionTreeBuilder():
+    """(Internal) Builds the decision tree of an ordered list of decode rules
+
+    Every node tracks the bits of the word that are known on the path to it.
+    Rules that cannot match are dropped, as are all rules after the first one
+    that is certain to match. If the first remaining rule is certain to match,
+    the node is a leaf. Otherwise the window of unknown bits that minimizes the
+    expected logarithm of the number of remaining rules is tested. Nodes are
+    memoized by their remaining rules and the known bits these rules look at,
+    and switches with the same children are shared.
+
+    :param rules: The rules of the decoder
+    :type rules: [DecodeRule]
+    :param profile: Relative frequencies of the encodings (opt)
+    :type profile: {str: float} or None
+    :param max_run: The maximum number of bits tested by one switch
+    :type max_run: int
+    """
+
+    def __init__(self, rules, profile=None, max_run=MAX_RUN):
+        self.rules = rules
+        self.bits = [rule_bits(rule) for rule in rules]
+        self.max_run = max_run
+        self.weights = None
+        if profile is not None:
+            total = sum(profile.values()) or 1
+            # encodings missing from the profile still get a small weight
+            self.weights = [profile.get(rule.encoding, 0) / total + 1e-6 for rule in rules]
+        self.memo = {}
+        self.leaves = {}
+        self.switches = {}
+
+    def build(self, candidates=None, known_mask=0, known_value=0):
+        """Returns the node deciding between the candidate rules (indices)"""
+
+        if candidates is None:
+            candidates = range(len(self.rules))
+        remaining = []
+        relevant = 0
+        for i in candidates:
+            state = rule_state(self.rules[i], known_mask, known_value)
+            if state is False:
+                continue
+            remaining.append(i)
+            relevant |= self.bits[i]
+            if state is True:
+                break
+        if not remaining or (len(remaining) == 1 and rule_state(self.rules[remaining[0]], known_mask,
+                                                               known_value) is True):
+            return self.leaf(self.rules[remaining[0]].encoding if remaining else None)
+        key = (tuple(remaining), known_mask & relevant, known_value & relevant)
+        if key in self.memo:
+            return self.memo[key]
+        (start, run) = self.best_window(remaining, relevant & ~known_mask, known_mask)
+        children = []
+        for value in range(1 << run):
+            children.append(self.build(remaining, known_mask | (((1 << run) - 1) << start),
+                                       known_value | (value << start)))
+        if all(child is children[0] for child in children):
+            node = children[0]
+        else:
+            # equal subtrees are built from equal children, so sharing them by identity suffices
+            shape = (start, run, tuple(id(child) for child in children))
+            if shape not in self.switches:
+                self.switches[shape] = DecisionSwitch(start, run, children)
+            node = self.switches[shape]
+        self.memo[key] = node
+        return node
+
+    def leaf(self, encoding):
+        """(Internal) Returns the shared leaf of the encoding"""
+
+        if encoding not in self.leaves:
+            self.leaves[encoding] = DecisionLeaf(encoding)
+        return self.leaves[encoding]
+
+    def windows(self, relevant, known_mask):
+        """(Internal) Yields the candidate windows (start, run) of unknown bits starting and ending at relevant bits"""
+
+        for start in range(relevant.bit_length()):
+            if not (relevant >> start) & 1:
+                continue
+            for run in range(1, self.max_run + 1):
+                if (known_mask >> (start + run - 1)) & 1:
+                    break
+                if (relevant >> (start + run - 1)) & 1:
+                    yield (start, run)
+
+    def best_window(self, remaining, relevant, known_mask):
+        """(Internal) Returns the window whose test minimizes the expected log of the remaining rules"""
+
+        best = None
+        for (start, run) in self.windows(relevant, known_mask):
+            window = ((1 << run) - 1) << start
+            counts = [0] * (1 << run)
+            weights = [0.0] * (1 << run)
+            for i in remaining:
+                rule = self.rules[i]
+                care = (rule.mask & window) >> start
+                value = (rule.value & window) >> start
+                matching = [v for v in range(1 << run) if (v & care) == value]
+                for v in matching:
+                    counts[v] += 1
+                    if self.weights is not None:
+                        weights[v] += self.weights[i] / len(matching)
+            if self.weights is None:
+                weights = [1.0] * (1 << run)
+            total = sum(weights) or 1
+            cost = sum(w * math.log2(1 + n) for (w, n) in zip(weights, counts)) / total
+            if best is None or (cost, run) < best[0]:
+                best = ((cost, run), (start, run))
+        return best[1]
+
+
+def build_decision_tree(rules, profile=None, max_run=MAX_RUN):
+    """Builds a decision tree equivalent to the ordered list of decode rules
+
+    Instead of testing the rules one after the other, the tree tests windows of
+    up to max_run bits of the word at every node (one lookup per node). The
+    windows are chosen to minimize the expected number of tests, optionally
+    weighted by the frequencies of the encodings.
+
+    :param rules: The rules of a decoder (see :class:`ISA`)
+    :type rules: [DecodeRule]
+    :param profile: Relative frequencies of the encodings by name (opt)
+    :type profile: {str: float} or None
+    :param max_run: The maximum number of bits tested at one node
+    :type max_run: int
+    :rtype: DecisionLeaf or DecisionSwitch
+    """
+
+    return DecisionTreeBuilder(rules, profile, max_run).build()
+
+
+def decide(tree, word):
+    """Returns the encoding of the word according to the decision tree and the number of tests
+
+    :rtype: (str or None, int)
+    """
+
+    tests = 0
+    node = tree
+    while isinstance(node, DecisionSwitch):
+        node = node.children[(word >> node.start) & ((1 << node.run) - 1)]
+        tests += 1
+    return (node.encoding, tests)
+
+
+def decision_stats(tree, profile=None):
+    """Returns statistics about the number of tests needed to decode with the tree
+
+    The average is taken over all words (uniformly) or, if a profile is given,
+    over the encodings weighted by their frequency.
+
+    :param profile: Relative frequencies of the encodings by name (opt)
+    :type profile: {str: float} or None
+    :returns: A dict with "average_tests", "max_tests" and "nodes" (the number
+              of distinct switches)
+    :rtype: {str: float or int}
+    """
+
+    memo = {}
+    switches = set()
+
+    def visit(node):
+        # maps every encoding to (probability, sum of probability * tests) over the words reaching the node
+        if id(node) in memo:
+            return memo[id(node)]
+        if isinstance(node, DecisionLeaf):
+            result = ({node.encoding: (1.0, 0.0)}, 0)
+        else:
+            switches.add(id(node))
+            leaves = {}
+            depth = 0
+            share = 1.0 / len(node.children)
+            for child in node.children:
+                (child_leaves, child_depth) = visit(child)
+                depth = max(depth, child_depth + 1)
+                for (encoding, (p, pt)) in child_leaves.items():
+                    (q, qt) = leaves.get(encoding, (0.0, 0.0))
+                    leaves[encoding] = (q + p * share, qt + (pt + p) * share)
+            result = (leaves, depth)
+        memo[id(node)] = result
+        return result
+
+    (leaves, depth) = visit(tree)
+    if profile is None:
+        average = sum(pt for (p, pt) in leaves.values())
+    else:
+        weighted = [(profile[encoding], pt / p) for (encoding, (p, pt)) in leaves.items()
+                    if profile.get(encoding) and p > 0]
+        total = sum(w for (w, tests) in weighted)
+        average = sum(w * tests for (w, tests) in weighted) / total if total else 0.0
+    return {"average_tests": average, "max_tests": depth, "nodes": len(switches)}
+
+
+def decision_trees(isa, profile=None, stats=None):
+    """Builds the decision tree of every decoder of the instruction set
+
+    :param isa: The instruction set, see :func:`load_isa`
+    :type isa: ISA
+    :param profile: Relative frequencies of the encodings by name (opt)
+    :type profile: {str: float} or None
+    :param stats: If given, the statistics of every tree (see
+                  :func:`decision_stats`) are stored by decoder name
+    :type stats: dict or None
+    :returns: The root of the tree by decoder name
+    :rtype: {str: DecisionLeaf or DecisionSwitch}
+    """
+
+    trees = {}
+    for (name, rules) in isa.decoders.items():
+        trees[name] = build_decision_tree(rules, profile)
+        if stats is not None:
+            stats[name] = decision_stats(trees[name], profile)
+    return trees
+
+
+def shared_switches(tree):
+    """(Internal) Returns the switches that are reachable on more than one path, children first"""
+
+    references = {}
+    order = []
+
+    def visit(node):
+        if isinstance(node, DecisionLeaf):
+            return
+        references[id(node)] = references.get(id(node), 0) + 1
+        if references[id(node)] > 1:
+            return
+        for child in node.children:
+            visit(child)
+        order.append(node)
+
+    visit(tree)
+    return [node for node in order if references[id(node)] > 1]
+
+
+def switch_groups(node):
+    """(Internal) Returns the children of a switch as (child, values), the child taking most values last"""
+
+    groups = {}
+    for (value, child) in enumerate(node.children):
+        groups.setdefault(id(child), (child, []))[1].append(value)
+    return sorted(groups.values(), key=lambda group: len(group[1]))
@@ -0,0 +1,227 @@
+import ctypes
+import hashlib
+import os
+import subprocess
+import tempfile
+
+from .asl_type import bits_c_type
+from .isa2c import isa_to_c
+
+
+#: The ctypes type of the C types used for bitstrings
+CTYPES = {
+    "uint8_t": ctypes.c_uint8,
+    "uint16_t": ctypes.c_uint16,
+    "uint32_t": ctypes.c_uint32,
+    "uint64_t": ctypes.c_uint64,
+}
+
+
+def ctypes_type(width):
+    """(Internal) Returns the ctypes type of a bitstring of the given length"""
+
+    c_type = bits_c_type(width)
+    assert c_type in CTYPES, "Bitstrings longer than 64 bits are not supported: {0}".format(width)
+    return CTYPES[c_type]
+
+
+def default_cache_dir():
+    """Returns the directory the shared libraries are cached in by default
+
+    This is `aslutils` in $XDG_CACHE_HOME or in ~/.cache.
+    """
+
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "aslutils")
+
+
+class NativeISA():
+    """An instruction set compiled to a shared library
+
+    Instances are created by :func:`build_native`.
+
+    :ivar self.library: The loaded library
+    :vartype self.library: ctypes.CDLL
+    :ivar self.State: The ctypes structure corresponding to `struct asl_state`
+    :vartype self.State: class
+    :ivar self.path: The path of the shared library
+    :vartype self.path: str
+    """
+
+    def __init__(self, path, state, word_width, decoder):
+        self.path = path
+        self.library = ctypes.CDLL(path)
+        self.word_type = ctypes_type(word_width)
+        self.state_spec = list(state)
+        fields = []
+        for entry in self.state_spec:
+            if len(entry) > 2:
+                fields.append((entry[0], ctypes_type(entry[1]) * entry[2]))
+            else:
+                fields.append((entry[0], ctypes_type(entry[1])))
+        self.State = type("State", (ctypes.Structure,), {"_fields_": fields})
+        self._execute = getattr(self.library, "asl_execute_" + decoder)
+        self._execute.argtypes = [self.word_type, ctypes.POINTER(self.State)]
+        self._execute.restype = ctypes.c_int
+        self._execute_batch = getattr(self.library, "asl_execute_batch_" + decoder)
+        self._execute_batch.argtypes = [ctypes.POINTER(self.word_type), ctypes.c_size_t,
+                                        ctypes.POINTER(self.State), ctypes.POINTER(ctypes.c_uint8)]
+        self._execute_batch.restype = ctypes.c_size_t
+
+    def new_state(self, **values):
+        """Returns a new state with all variables set to 0 except for the given ones"""
+
+        state = self.State()
+        self.load_state(state, values)
+        return state
+
+    def load_state(self, state, values):
+        """(Internal) Copies the values of a mapping into the state structure"""
+
+        for (name, value) in values.items():
+            if isinstance(value, (list, tuple)):
+                getattr(state, name)[:len(value)] = value
+            else:
+                setattr(state, name, value)
+
+    def store_state(self, state, values):
+        """(Internal) Copies the state structure back into the mapping"""
+
+        for entry in self.state_spec:
+            if len(entry) > 2:
+                values[entry[0]] = list(getattr(state, entry[0]))
+            else:
+                values[entry[0]] = getattr(state, entry[0])
+
+    def execute(self, word, state):
+        """Decodes and executes one instruction word
+
+        :param state: The state created by :func:`new_state` or a dict which is
+                      updated with the new values
+        :type state: State or dict
+        :returns: The status (0 if the instruction was executed, 1 if it was
+                  UNDEFINED, 2 if it was UNPREDICTABLE and 3 if it is
+                  unallocated)
+        :rtype: int
+        """
+
+        if isinstance(state, self.State):
+            return self._execute(word, ctypes.byref(state))
+        native = self.new_state(**state)
+        status = self._execute(word, ctypes.byref(native))
+        self.store_state(native, state)
+        return status
+
+    def execute_batch(self, words, state):
+        """Decodes and executes the instruction words one after the other
+
+        All instructions are executed, irrespective of their status.
+
+        :param words: The instruction words, either an object supporting the
+                      buffer protocol with items of the length of the word
+                      (such as a numpy array of the right dtype, which is used
+                      without copying) or a sequence of ints
+        :param state: The state created by :func:`new_state` or a dict which is
+                      updated with the new values
+        :type state: State or dict
+        :returns: The status of every instruction (see :func:`execute`)
+        :rtype: bytearray
+        """
+
+        words = self.word_array(words)
+        statuses = bytearray(len(words))
+        native = state if isinstance(state, self.State) else self.new_state(**state)
+        self._execute_batch(words, len(words), ctypes.byref(native),
+                            (ctypes.c_uint8 * len(statuses)).from_buffer(statuses))
+        if not isinstance(state, self.State):
+            self.store_state(native, state)
+        return statuses
+
+    def word_array(self, words):
+        """(Internal) Returns the words as ctypes array, sharing the memory if possible"""
+
+        try:
+            view = memoryview(words)
+        except TypeError:
+            view = None
+        if view is not None and view.c_contiguous and view.itemsize == ctypes.sizeof(self.word_type) \
+                and not view.readonly:
+            return (self.word_type * (view.nbytes // view.itemsize)).from_buffer(view)
+        return (self.word_type * len(words))(*words)
+
+
+def native_source(isa, state=(), word_width=32, decoder=None, cse=False):
+    """Returns the C source of the shared library built by :func:`build_native`
+
+    This is the output of :func:`isa_to_c` with the runtime included and a
+    function `asl_execute_batch_<decoder>` that executes an array of words.
+
+    :param decoder: The name of the decoder, by default the first one
+    :type decoder: str or None
+    :rtype: str
+    """
+
+    decoder = decoder if decoder is not None else next(iter(isa.trees))
+    word_type = bits_c_type(word_width)
+    lines = ["",
+             "#include <stddef.h>",
+             "",
+             "size_t asl_execute_batch_{0}(const {1} *words, size_t count, struct asl_state *state, uint8_t *status)"
+             .format(decoder, word_type),
+             "{",
+             "    for (size_t i = 0; i < count; i++) {",
+             "        status[i] = asl_execute_{0}(words[i], state);".format(decoder),
+             "    }",
+             "    return count;",
+             "}"]
+    return isa_to_c(isa, state, word_width, None, cse) + "\n".join(lines) + "\n"
+
+
+def build_native(isa, state=(), word_width=32, decoder=None, cse=False, cache_dir=None, compiler=None,
+                 flags=("-O2",)):
+    """Compiles the instruction set with the C compiler and loads it
+
+    The shared library is cached by the hash of its source, the compiler and
+    the flags in cache_dir, so later runs reuse it.
+
+    :param isa: The instruction set, see :func:`load_isa`
+    :type isa: ISA
+    :param state: The variables of the state, see :func:`isa_to_c`.
+                  Bitstrings longer than 64 bits are not supported.
+    :type state: [(str, int)] or [(str, int, int)]
+    :param word_width: The length of the instruction words in bits
+    :type word_width: int
+    :param decoder: The name of the decoder, by default the first one
+    :type decoder: str or None
+    :param cse: Whether to hoist repeated pure subexpressions into temporaries
+    :type cse: bool
+    :param cache_dir: The directory of the build artifacts, by default
+                      :func:`default_cache_dir`
+    :type cache_dir: str or None
+    :param compiler: The C compiler, by default $CC or cc
+    :type compiler: str or None
+    :param flags: The flags passed to the compiler
+    :type flags: [str]
+    :raises RuntimeError: If the compiler fails
+    :rtype: NativeISA
+    """
+
+    decoder = decoder if decoder is not None else next(iter(isa.trees))
+    compiler = compiler or os.environ.get("CC") or "cc"
+    cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+    source = native_source(isa, state, word_width, decoder, cse)
+    key = hashlib.sha256("\0".join([source, compiler] + list(flags)).encode("utf-8")).hexdigest()
+    path = os.path.join(cache_dir, "aslisa_{0}.so".format(key[:32]))
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=cache_dir) as build_dir:
+            source_path = os.path.join(build_dir, "isa.c")
+            with open(source_path, "w") as f:
+                f.write(source)
+            library = os.path.join(build_dir, "isa.so")
+            result = subprocess.run([compiler] + list(flags) + ["-shared", "-fPIC", "-o", library, source_path],
+                                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            if result.returncode != 0:
+                raise RuntimeError("Compiling the instruction set failed:\n" + result.stdout.decode("utf-8"))
+            os.replace(library, path)
+    return NativeISA(path, state, word_width, decoder)
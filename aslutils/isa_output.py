@@ -0,0 +1,317 @@
+import hashlib
+import itertools
+import os
+import sys
+import threading
+import time
+
+from .asl2 import TranslationSession
+from .asl2c import CVisitor
+from .asl2py import PythonVisitor
+from .asl2vhd import VHDLVisitor
+from .asl_bitvec import BitPattern
+from .asl_compile import CACHE_VERSION, state_variables
+from .isa import canonical_snippet, load_isa
+
+
+#: The visitor class and the file extension of the languages of output trees by name
+OUTPUT_LANGUAGES = {"c": (CVisitor, ".c"), "py": (PythonVisitor, ".py"), "vhdl": (VHDLVisitor, ".vhd")}
+
+
+def encoding_code(encoding, LangVisitor, state=(), cse=False):
+    """Returns the lines of the translated `__decode` and `__execute` code of an encoding
+
+    The constants of `__decode` are declared after its code (their
+    declarations are not generated), so `__execute` can use them.
+
+    :param encoding: The encoding
+    :type encoding: Encoding
+    :param LangVisitor: The visitor class of the language
+    :type LangVisitor: class
+    :param state: The variables of the state, see :func:`encoding_source`
+    :type state: [(str, int or None)] or [(str, int, int)]
+    :param cse: Whether to hoist repeated pure subexpressions into temporaries
+    :type cse: bool
+    :rtype: [str]
+    """
+
+    field_widths = [(field[0], field[2]) for field in encoding.fields]
+    session = TranslationSession(LangVisitor, field_widths, cse, variables=state_variables(state))
+    lines = []
+    if encoding.decode:
+        (decode_vars, code) = session.translate(encoding.decode)
+        lines += code
+        visitor = LangVisitor({})
+        for (var, (existed, type, value)) in decode_vars.items():
+            if not existed and type is not None and value is not None and not isinstance(value, BitPattern):
+                lines.append(visitor.declaration(var, type, visitor.constant(value)))
+    if encoding.execute:
+        lines += session.translate(encoding.execute)[1]
+    return lines
+
+
+def encoding_texts(encoding, languages, state=(), cse=False):
+    """(Internal) Returns the content of the generated files of an encoding by language"""
+
+    result = {}
+    for language in languages:
+        lines = encoding_code(encoding, OUTPUT_LANGUAGES[language][0], state, cse)
+        result[language] = "".join(line + "\n" for line in lines)
+    return result
+
+
+def encoding_key(encoding):
+    """(Internal) Returns what the generated code of an encoding depends on, to detect changes"""
+
+    return (canonical_snippet(encoding.decode), canonical_snippet(encoding.execute), tuple(encoding.fields))
+
+
+def write_if_changed(path, text):
+    """Writes the text to the file unless it already contains it
+
+    Files that don't change keep their modification time, so build systems
+    don't rebuild what depends on them. The file is replaced atomically.
+
+    :param path: The path of the file, missing directories are created
+    :type path: str
+    :param text: The new content of the file
+    :type text: str
+    :returns: Whether the file was written
+    :rtype: bool
+    """
+
+    try:
+        with open(path, "r") as f:
+            if f.read() == text:
+                return False
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary = "{0}.{1}.{2}.tmp".format(path, os.getpid(), threading.get_ident())
+    with open(temporary, "w") as f:
+        f.write(text)
+    os.replace(temporary, path)
+    return True
+
+
+def read_file(path):
+    """(Internal) Returns the content of the file or None if it can't be read"""
+
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def add_time(profile, phase, start):
+    """(Internal) Adds the seconds since start to the phase of the profile (if any)"""
+
+    if profile is not None:
+        profile[phase] = profile.get(phase, 0.0) + time.perf_counter() - start
+
+
+def file_stamps(paths):
+    """(Internal) Returns the modification times and sizes of the files (None for missing files)"""
+
+    stamps = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stamps.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stamps.append(None)
+    return tuple(stamps)
+
+
+class OutputTree():
+    """A directory with one generated file per encoding and language
+
+    The file of an encoding is `directory/language/encoding.extension` (see
+    :data:`OUTPUT_LANGUAGES`) and contains the code generated by
+    :func:`encoding_code`. The tree remembers what the files were generated
+    from, so :meth:`update` only translates the encodings that changed.
+
+    :param decoder: The path of the decoder file
+    :type decoder: str
+    :param instructions: The path of the instructions file or the paths of
+                         several instructions files
+    :type instructions: str or [str]
+    :param directory: The root directory of the generated files
+    :type directory: str
+    :param languages: The names of the languages to generate
+    :type languages: [str]
+    :param state: The variables of the state, see :func:`encoding_source`
+    :type state: [(str, int or None)] or [(str, int, int)]
+    :param cse: Whether to hoist repeated pure subexpressions into temporaries
+    :type cse: bool
+    :param cache_dir: If given, the generated code is also stored in this
+                      directory (keyed by what it is generated from), so later
+                      runs don't have to translate it again
+    :type cache_dir: str or None
+
+    :ivar self.isa: The instruction set of the last update or None
+    :vartype self.isa: ISA or None
+    :ivar self.keys: What the files of every encoding were generated from by
+                     encoding name
+    :vartype self.keys: {str: tuple}
+    """
+
+    def __init__(self, decoder, instructions, directory, languages=("c",), state=(), cse=False, cache_dir=None):
+        for language in languages:
+            assert language in OUTPUT_LANGUAGES, "Unknown language: {0}".format(language)
+        self.decoder = decoder
+        self.instructions = [instructions] if isinstance(instructions, str) else list(instructions)
+        self.directory = directory
+        self.languages = list(languages)
+        self.state = list(state)
+        self.cse = cse
+        self.cache_dir = cache_dir
+        self.isa = None
+        self.keys = {}
+        self.stamps = None
+
+    def path(self, name, language):
+        """Returns the path of the generated file of an encoding"""
+
+        return os.path.join(self.directory, language, name + OUTPUT_LANGUAGES[language][1])
+
+    def sources(self):
+        """Returns the paths of the files the tree is generated from"""
+
+        return [self.decoder] + self.instructions
+
+    def changed(self):
+        """Returns whether the source files changed since the last update"""
+
+        return file_stamps(self.sources()) != self.stamps
+
+    def cache_path(self, key, language):
+        """(Internal) Returns the path of the cached code of an encoding"""
+
+        digest = hashlib.sha256(repr((CACHE_VERSION, language, key, self.state, self.cse)).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest + OUTPUT_LANGUAGES[language][1])
+
+    def generate(self, encodings, keys, executor=None, profile=None):
+        """(Internal) Returns the content of the files of the encodings by encoding name and language"""
+
+        start = time.perf_counter()
+        texts = {}
+        missing = []
+        for encoding in encodings:
+            if self.cache_dir is not None:
+                cached = {language: read_file(self.cache_path(keys[encoding.name], language))
+                          for language in self.languages}
+                if None not in cached.values():
+                    texts[encoding.name] = cached
+                    continue
+            missing.append(encoding)
+        add_time(profile, "cache", start)
+        start = time.perf_counter()
+        arguments = (missing, itertools.repeat(self.languages), itertools.repeat(self.state),
+                     itertools.repeat(self.cse))
+        if executor is not None:
+            results = executor.map(encoding_texts, *arguments, chunksize=16)
+        else:
+            results = map(encoding_texts, *arguments)
+        for (encoding, result) in zip(missing, results):
+            texts[encoding.name] = result
+        add_time(profile, "translate", start)
+        start = time.perf_counter()
+        if self.cache_dir is not None:
+            for encoding in missing:
+                for language in self.languages:
+                    write_if_changed(self.cache_path(keys[encoding.name], language), texts[encoding.name][language])
+        add_time(profile, "cache", start)
+        return texts
+
+    def update(self, executor=None, profile=None):
+        """Parses the source files and regenerates the files of the encodings that changed
+
+        The first update translates every encoding (unless it is cached) but
+        still only writes the files whose content changed. Files of encodings
+        that no longer exist are removed.
+
+        :param executor: If given, the encodings are translated on it, for
+                         instance on a process pool
+        :type executor: concurrent.futures.Executor or None
+        :param profile: If given, the seconds spent in the phases "parse",
+                        "cache", "translate" and "write" are added to this dict
+        :type profile: {str: float} or None
+        :returns: A dict with the names of the "regenerated" and "removed"
+                  encodings and the number of files "written"
+        :rtype: {str: [str] or int}
+        """
+
+        start = time.perf_counter()
+        stamps = file_stamps(self.sources())
+        isa = load_isa(self.decoder, self.instructions)
+        keys = {name: encoding_key(encoding) for (name, encoding) in isa.encodings.items()}
+        add_time(profile, "parse", start)
+        changed = [encoding for (name, encoding) in isa.encodings.items() if self.keys.get(name) != keys[name]]
+        texts = self.generate(changed, keys, executor, profile)
+        start = time.perf_counter()
+        result = {"regenerated": [encoding.name for encoding in changed], "removed": [], "written": 0}
+        for encoding in changed:
+            for language in self.languages:
+                result["written"] += write_if_changed(self.path(encoding.name, language),
+                                                      texts[encoding.name][language])
+        for name in self.keys:
+            if name not in keys:
+                result["removed"].append(name)
+                for language in self.languages:
+                    if os.path.exists(self.path(name, language)):
+                        os.remove(self.path(name, language))
+        add_time(profile, "write", start)
+        self.isa = isa
+        self.keys = keys
+        self.stamps = stamps
+        return result
+
+
+def watch(trees, interval=0.5, report=None, executor=None):
+    """Keeps the output trees up to date until interrupted
+
+    The source files are polled every interval seconds, the trees whose
+    sources changed are updated. If a source file can't be parsed (for
+    instance while it is being edited), the error is reported and the tree is
+    updated again after the next change.
+
+    :param trees: The output trees, they are updated first if they never were
+    :type trees: [OutputTree]
+    :param interval: The number of seconds between polls
+    :type interval: float
+    :param report: Called with the tree and the result of
+                   :meth:`OutputTree.update` (or the exception) after every
+                   update, by default a summary is printed to stderr
+    :type report: function or None
+    :param executor: The executor the encodings are translated on, see
+                     :meth:`OutputTree.update`
+    :type executor: concurrent.futures.Executor or None
+    """
+
+    if report is None:
+        report = print_report
+    while True:
+        for tree in trees:
+            if not tree.changed():
+                continue
+            stamps = file_stamps(tree.sources())
+            try:
+                result = tree.update(executor)
+            except Exception as e:
+                tree.stamps = stamps
+                result = e
+            report(tree, result)
+        time.sleep(interval)
+
+
+def print_report(tree, result):
+    """(Internal) Prints a summary of an update to stderr"""
+
+    if isinstance(result, Exception):
+        print("{0}: {1}: {2}".format(tree.decoder, type(result).__name__, result), file=sys.stderr)
+    else:
+        print("{0}: {1} regenerated, {2} removed, {3} files written"
+              .format(tree.decoder, len(result["regenerated"]), len(result["removed"]), result["written"]),
+              file=sys.stderr)
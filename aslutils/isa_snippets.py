@@ -0,0 +1,178 @@
+import re
+
+from .asl2 import asl_to_lang, input_variables
+from .asl_bitvec import BitPattern
+from .asl_code_visitor import same_constant
+from .asl_compile import state_variables, variables_of
+from .asl_type import ASLTranslationError
+from .isa import canonical_snippet
+
+
+#: Strings in processed ASL code
+STRING = re.compile(r'"[^"]*"')
+#: Identifiers in processed ASL code
+IDENTIFIER = re.compile(r"[A-Za-z_]\w*")
+#: The length expressions of bitstring types in processed ASL code
+BITS_LENGTH = re.compile(r"\bbits\(([^()]*)\)")
+
+
+def referenced_names(code):
+    """(Internal) Returns the identifiers in processed ASL code and those used as length of a bitstring type"""
+
+    code = STRING.sub("", code)
+    lengths = set()
+    for m in BITS_LENGTH.finditer(code):
+        lengths.update(IDENTIFIER.findall(m.group(1)))
+    return (set(IDENTIFIER.findall(code)), lengths)
+
+
+def dedup_stats(snippets, unique):
+    """(Internal) Returns the statistics of the deduplication of snippets"""
+
+    return {"snippets": snippets, "unique": unique, "dedup_ratio": snippets / unique if unique else 1.0}
+
+
+class ExecuteSnippet():
+    """An `__execute` snippet translated once for all encodings sharing it
+
+    :ivar self.name: The name of the function executing the snippet
+                     (`snippet_` followed by the name of the first encoding)
+    :vartype self.name: str
+    :ivar self.parameters: The names and types of the variables the function
+                           takes (besides the state)
+    :vartype self.parameters: [(str, ASLType)]
+    :ivar self.lines: The translated code
+    :vartype self.lines: [str]
+    """
+
+    def __init__(self, name, parameters, lines):
+        self.name = name
+        self.parameters = parameters
+        self.lines = lines
+
+
+class SharedSnippets():
+    """The `__decode` and `__execute` snippets of an instruction set, each translated once
+
+    The snippets are deduplicated separately. Encodings whose `__decode` code
+    is the same (up to whitespace) and whose fields are the same share its
+    translation. Encodings whose `__execute` code is the same share an
+    :class:`ExecuteSnippet` if the variables it reads from the fields and
+    `__decode` have the same types. Variables with the same constant value in
+    all of these encodings are folded into the code, the others are passed as
+    parameters. Variables used as length of a bitstring type and bitpatterns
+    are always folded, so encodings in which they differ don't share the code.
+
+    :param isa: The instruction set, see :func:`load_isa`
+    :type isa: ISA
+    :param LangVisitor: The visitor class of the language
+    :type LangVisitor: class
+    :param state: The variables of the state, see :func:`encoding_source`
+    :type state: [(str, int or None)] or [(str, int, int)]
+    :param cse: Whether to hoist repeated pure subexpressions into temporaries
+    :type cse: bool
+
+    :ivar self.decodes: The variables known after `__decode` and its code by
+                        (canonical code, fields)
+    :vartype self.decodes: {(str, tuple): ({str: (ASLType or None, Any)}, [str])}
+    :ivar self.executes: The translated `__execute` snippets
+    :vartype self.executes: [ExecuteSnippet]
+    :ivar self.encodings: The key of the `__decode` code, the `__execute`
+                          snippet (or None) and the code of its arguments of
+                          every encoding by encoding name
+    :vartype self.encodings: {str: ((str, tuple), ExecuteSnippet or None, [str])}
+    :ivar self.shared: The name of the first encoding with the same
+                       `__decode` code, fields and call of the same
+                       `__execute` snippet by encoding name (every distinct
+                       encoding maps to itself)
+    :vartype self.shared: {str: str}
+    """
+
+    def __init__(self, isa, LangVisitor, state=(), cse=False):
+        self.LangVisitor = LangVisitor
+        self.state = list(state)
+        self.cse = cse
+        self.decodes = {}
+        self.executes = []
+        self.encodings = {}
+        self.shared = {}
+        inputs = {}
+        groups = {}
+        for encoding in isa.encodings.values():
+            key = (canonical_snippet(encoding.decode), tuple(encoding.fields))
+            if key not in self.decodes:
+                self.decodes[key] = self.translate_decode(encoding)
+            if not encoding.execute:
+                continue
+            (names, lengths) = referenced_names(encoding.execute)
+            variables = self.decodes[key][0]
+            inputs[encoding.name] = {name: variables[name] for name in sorted(names - set(variables_of(state)))
+                                     if name in variables}
+            fixed = tuple((name, repr(value)) for (name, (_, value)) in inputs[encoding.name].items()
+                          if name in lengths or isinstance(value, BitPattern))
+            group = (canonical_snippet(encoding.execute),
+                     tuple((name, type) for (name, (type, _)) in inputs[encoding.name].items()), fixed)
+            groups.setdefault(group, []).append(encoding)
+        snippets = {}
+        for members in groups.values():
+            try:
+                snippets.update(self.translate_execute(members, inputs))
+            except ASLTranslationError:
+                # the code might need some of the parameters to be constants
+                for member in members:
+                    snippets.update(self.translate_execute([member], inputs))
+        constant = LangVisitor({}).constant
+        first = {}
+        for encoding in isa.encodings.values():
+            key = (canonical_snippet(encoding.decode), tuple(encoding.fields))
+            snippet = snippets.get(encoding.name)
+            arguments = []
+            if snippet is not None:
+                for (name, _) in snippet.parameters:
+                    value = inputs[encoding.name][name][1]
+                    arguments.append(constant(value) if value is not None else name)
+            self.encodings[encoding.name] = (key, snippet, arguments)
+            call = (key, snippet.name if snippet is not None else None, tuple(arguments))
+            self.shared[encoding.name] = first.setdefault(call, encoding.name)
+
+    def translate_decode(self, encoding):
+        """(Internal) Returns the variables known after `__decode` of the encoding and its code"""
+
+        fields = [(field[0], field[2]) for field in encoding.fields]
+        variables = input_variables(fields, state_variables(self.state))
+        if not encoding.decode:
+            return (variables, [])
+        (decode_vars, code) = asl_to_lang(encoding.decode, fields, self.LangVisitor, self.cse, variables=variables)
+        return ({var: (type, value) for (var, (existed, type, value)) in decode_vars.items()}, code)
+
+    def translate_execute(self, members, inputs):
+        """(Internal) Translates the `__execute` code shared by the encodings, returns the snippet by encoding name"""
+
+        variables = state_variables(self.state)
+        parameters = []
+        for (name, (type, value)) in inputs[members[0].name].items():
+            if not all(same_constant(inputs[member.name][name][1], value) for member in members):
+                value = None
+                parameters.append((name, type))
+            variables[name] = (type, value)
+        (_, lines) = asl_to_lang(members[0].execute, [], self.LangVisitor, self.cse, variables=variables)
+        snippet = ExecuteSnippet("snippet_" + members[0].name, parameters, lines)
+        self.executes.append(snippet)
+        return {member.name: snippet for member in members}
+
+    def stats(self):
+        """Returns the statistics of the deduplication
+
+        :returns: For "decode" and "execute" the number of encodings with such
+                  a snippet as "snippets", the number of translations as
+                  "unique" and the ratio of the two as "dedup_ratio", and the
+                  same for the functions of whole "encodings"
+        :rtype: {str: {str: int or float}}
+        """
+
+        decodes = set(key for (key, _, _) in self.encodings.values() if key[0] is not None)
+        with_decode = sum(1 for (key, _, _) in self.encodings.values() if key[0] is not None)
+        with_execute = sum(1 for (_, snippet, _) in self.encodings.values() if snippet is not None)
+        return {"decode": dedup_stats(with_decode, len(decodes)),
+                "execute": dedup_stats(with_execute, len(self.executes)),
+                "encodings": dedup_stats(len(self.shared), len(set(self.shared.values())))}
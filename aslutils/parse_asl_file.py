@@ -336,9 +336,11 @@ def extract_code(tree, result):
 
     :param tree: A list of nodes which correspond to asl code
     :type tree: [Node] where Node is ([Node], str)
-    :param result: Partial results for recursion (in the top-level call this should be empty)
+    :param result: Partial results for recursion (in the top-level call this should be empty),
+                   the pieces are appended to it
     :type result: [str]
-    :returns: For efficiency the processed ASL code is split into pieces
+    :returns: For efficiency the processed ASL code is split into pieces, the
+              list passed as result
     :rtype: [str]
     """
 
@@ -351,7 +353,7 @@ def extract_code(tree, result):
                 or line.startswith("repeat") or line.startswith("while") or line.startswith("for")
             if add_start:
                 result.append(" START ")
-            result += extract_code(child[0], result)
+            extract_code(child[0], result)
             if add_start:
                 result.append(" END ")
         else:
@@ -359,6 +361,30 @@ def extract_code(tree, result):
     return result
 
 
+class ProcessedCode(str):
+    """Processed ASL code which keeps the pieces it was joined from
+
+    It is the string passed to the listeners of instruction files, the pieces
+    (the lines and the START, END and NEWLINE markers returned by
+    :func:`extract_code`) allow the parser to tokenize it line by line instead
+    of lexing the joined string again.
+
+    :param pieces: The pieces of the code
+    :type pieces: [str]
+
+    :ivar self.pieces: The pieces of the code
+    :vartype self.pieces: [str]
+    """
+
+    def __new__(cls, pieces):
+        code = super().__new__(cls, " ".join(pieces))
+        code.pieces = pieces
+        return code
+
+    def __reduce__(self):
+        return (ProcessedCode, (self.pieces,))
+
+
 def visit_instructions_listing(tree, listener):
     """(Internal) Traverses the given tree of a instructions file and invokes the listener
 
@@ -376,20 +402,15 @@ def visit_instructions_listing(tree, listener):
     for child in tree:
         line = child[1]
         if line == "__execute":
-            code = extract_code(child[0], [])
-            listener.listen_execute(" ".join(code))
+            listener.listen_execute(ProcessedCode(extract_code(child[0], [])))
         elif line.startswith("__encode"):
-            code = extract_code(child[0], [])
-            listener.listen_encode(" ".join(code))
+            listener.listen_encode(ProcessedCode(extract_code(child[0], [])))
         elif line.startswith("__decode"):
-            code = extract_code(child[0], [])
-            listener.listen_decode(" ".join(code))
+            listener.listen_decode(ProcessedCode(extract_code(child[0], [])))
         elif line.startswith("__postencode"):
-            code = extract_code(child[0], [])
-            listener.listen_postencode(" ".join(code))
+            listener.listen_postencode(ProcessedCode(extract_code(child[0], [])))
         elif line.startswith("__postdecode"):
-            code = extract_code(child[0], [])
-            listener.listen_postdecode(" ".join(code))
+            listener.listen_postdecode(ProcessedCode(extract_code(child[0], [])))
         elif line.startswith("__encoding"):
             m = re.fullmatch(r"__encoding ([a-zA-Z]\w*)", line)
             assert m
@@ -75,7 +75,7 @@ class DecoderListener(NopDecodeListener):
         print("} else")
 
     def listen_field(self, name, start, run):
-        print("u_int64_t {0} = (word >> {1}) & ((1 << {2}) - 1);"
+        print("uint64_t {0} = (word >> {1}) & ((1 << {2}) - 1);"
               .format(name, start, run))
 
     def listen_encoding(self, name):
@@ -87,14 +87,14 @@ class DecoderListener(NopDecodeListener):
 
 
 prefix = """#include <stdio.h>
-#include <sys/types.h>
+#include <stdint.h>
 #include <assert.h>
 
-#define UInt(num) ((u_int64_t)num)
+#define UInt(num) ((uint64_t)num)
 
 int main() {
 int64_t result;
-u_int32_t word = 0x80FE0000;
+uint32_t word = 0x80FE0000;
 """
 print(prefix)
 
@@ -44,6 +44,9 @@ setuptools.setup(
     url="https://github.com/alehed/aslutils.git",
     packages=setuptools.find_packages(),
     install_requires=['antlr4-python3-runtime{0}'.format(antlr_version)],
+    entry_points={
+        "console_scripts": ["aslutils=aslutils.cli:main"],
+    },
     python_requires='>=3',
     classifiers=[
         "Development Status :: 3 - Alpha",
@@ -0,0 +1,123 @@
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from aslutils.asl2 import asl_to_lang
+from aslutils.asl2c import asl_to_c
+from aslutils.asl2py import PythonVisitor, asl_to_py
+from aslutils.asl2vhd import asl_to_vhdl
+from aslutils.asl_interpreter import benchmark, compile_snippet
+from aslutils.asl_runtime import ASLUndefined, RUNTIME
+from aslutils.asl_type import ASLTranslationError
+
+
+#: Assigns to a slice of a constant and then reads the variable back
+CONSTANT_SLICE = "bits(4) y = '0000'; NEWLINE y{0 -: 2} = '11'; NEWLINE X = y; NEWLINE " \
+                 "if y == '0000' then START UNDEFINED; NEWLINE END"
+
+#: Assigns a field to two slices of a variable
+FIELD_SLICES = "bits(8) y = b; NEWLINE y{1 -: 3, 5 -: 8} = a; NEWLINE X = y; NEWLINE " \
+               "if y == '00000000' then START UNDEFINED; NEWLINE END"
+
+#: Assigns constants to a new variable in all arms of a case (like the element size of VMOV)
+BRANCH_CONSTANTS = "case opc of START when '1x' START esize = 8; NEWLINE END when '01' START esize = 16; NEWLINE END " \
+                   "otherwise START esize = 32; NEWLINE END END integer y = esize + 1; NEWLINE"
+
+
+class SliceAssignmentTest(unittest.TestCase):
+
+    def test_constant_slice(self):
+        for (asl_to_lang, line) in [(asl_to_c, "X = 3;"), (asl_to_py, "X = 3"), (asl_to_vhdl, "X := 3;")]:
+            (variables, lines) = asl_to_lang(CONSTANT_SLICE, [("X", 4)])
+            self.assertEqual(lines, [line])
+            self.assertEqual(variables["y"][2].value, 3)
+
+    def test_field_slices(self):
+        fields = [("a", 5), ("b", 8)]
+        (_, lines) = asl_to_py(FIELD_SLICES, fields)
+        for _ in range(200):
+            sample = {"a": random.randrange(32), "b": random.randrange(256)}
+            namespace = dict(sample)
+            namespace["undefined"] = lambda: namespace.update(X=None)
+            exec("\n".join(lines), namespace)
+            try:
+                expected = compile_snippet(FIELD_SLICES, fields)(sample)["X"]
+            except ASLUndefined:
+                expected = None
+            self.assertEqual(namespace["X"], expected)
+
+    def test_benchmark_agrees(self):
+        samples = [{"a": random.randrange(32), "b": random.randrange(256)} for _ in range(100)]
+        benchmark(FIELD_SLICES, [("a", 5), ("b", 8)], samples)
+
+    def test_variable_bounds(self):
+        fields = [("a", 5), ("b", 16), ("lo", 3)]
+        for snippet in ["bits(16) y = b; NEWLINE y{UInt(lo) -: UInt(lo) + 3} = a; NEWLINE",
+                        "bits(16) y = b; NEWLINE y{12 -: 15, UInt(lo) -: UInt(lo) + 2} = a; NEWLINE",
+                        "bits(16) y = b; NEWLINE y{UInt(lo)} = a{0}; NEWLINE"]:
+            (_, lines) = asl_to_py(snippet, fields)
+            for _ in range(100):
+                sample = {"a": random.randrange(32), "b": random.randrange(1 << 16), "lo": random.randrange(8)}
+                namespace = dict(sample)
+                exec("\n".join(lines), namespace)
+                self.assertEqual(namespace["y"], compile_snippet(snippet, fields)(sample)["y"])
+
+    def test_unknown_length(self):
+        # the bits of the slice are cleared instead of keeping the bits of the known length
+        (_, lines) = asl_to_lang("y{3 -: 6} = a; NEWLINE", [("a", 5)], PythonVisitor, variables={"y": (None, None)})
+        namespace = {"a": 0b10110, "y": 0x1ff}
+        exec("\n".join(lines), namespace)
+        self.assertEqual(namespace["y"], 0x1f7)
+
+    def test_unsupported_targets(self):
+        for snippet in ["x.f = 1; NEWLINE", "(x, y) = (1, 2); NEWLINE", "z{0} = '1'; NEWLINE"]:
+            with self.assertRaises(ASLTranslationError):
+                asl_to_c(snippet, [("x", 8), ("y", 8), ("a", 2)])
+
+    def test_interpreted_targets(self):
+        snippet = "bits(2) z = a; NEWLINE (x, -, y) = (b, 3, a); NEWLINE x:y:z = '10110011'; NEWLINE"
+        variables = compile_snippet(snippet, [("x", 4), ("y", 2), ("a", 2), ("b", 4)])({"a": 1, "b": 9})
+        self.assertEqual([int(variables[name]) for name in "xyz"], [0b1011, 0b00, 0b11])
+        with self.assertRaises(ASLTranslationError):
+            compile_snippet("x.f = 1; NEWLINE", [("x", 8)])
+
+
+class BranchAssignmentTest(unittest.TestCase):
+
+    def expected(self, opc):
+        variables = compile_snippet(BRANCH_CONSTANTS, [("opc", 2)])({"opc": opc})
+        return (variables["esize"], variables["y"])
+
+    def test_python(self):
+        (_, lines) = asl_to_py(BRANCH_CONSTANTS, [("opc", 2)])
+        for opc in range(4):
+            namespace = dict(RUNTIME, opc=opc)
+            exec("\n".join(lines), namespace)
+            self.assertEqual((namespace["esize"], namespace["y"]), self.expected(opc))
+
+    @unittest.skipIf(shutil.which("cc") is None, "no C compiler")
+    def test_c(self):
+        (_, lines) = asl_to_c(BRANCH_CONSTANTS, [("opc", 2)])
+        source = "#include <stdint.h>\n#include <stdio.h>\nint main(int argc, char **argv) {\n" \
+                 "uint8_t opc = argv[1][0] - '0';\n" + "\n".join(lines) + \
+                 '\nprintf("%d %d", (int)esize, (int)y);\nreturn 0;\n}\n'
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "snippet.c"), "w") as f:
+                f.write(source)
+            program = os.path.join(directory, "snippet")
+            subprocess.run(["cc", "-Werror", "-o", program, f.name], check=True)
+            for opc in range(4):
+                output = subprocess.run([program, str(opc)], check=True, capture_output=True, text=True).stdout
+                self.assertEqual(tuple(map(int, output.split())), self.expected(opc))
+
+    def test_reassigned_constant(self):
+        # the code of the value is generated before the new constant is recorded
+        snippet = "bits(2) x = a; NEWLINE x = '01'; NEWLINE x = x + '01'; NEWLINE"
+        self.assertEqual(asl_to_py(snippet, [("a", 2)])[1], ["x = a", "x = 1", "x = 2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+from aslutils.asl2py import asl_to_py
+from aslutils.asl_bitvec import BitPattern, BitVec
+
+
+class BitVecTest(unittest.TestCase):
+
+    def test_wrapping(self):
+        x = BitVec.from_string("1111")
+        self.assertEqual(x + 1, BitVec(0, 4))
+        self.assertEqual(1 + x, BitVec(0, 4))
+        self.assertEqual(BitVec(1, 4) - 2, BitVec(15, 4))
+        self.assertEqual(1 - BitVec(2, 4), BitVec(15, 4))
+        self.assertEqual(x * x, BitVec(1, 4))
+        self.assertEqual(-BitVec(1, 4), x)
+        self.assertEqual(~BitVec(0, 4), x)
+        self.assertEqual(x << 2, BitVec(0b1100, 4))
+        self.assertEqual(x >> 3, BitVec(1, 4))
+        self.assertEqual(BitVec(0x1ff, 8).value, 0xff)
+
+    def test_widths(self):
+        x = BitVec.from_string("1010")
+        for result in (x + 1, x - 1, x * 3, x & 0xff, x | 0x10, x ^ 1, ~x, x << 1, 3 * x, 0x10 | x):
+            self.assertEqual(result.width, 4)
+        self.assertEqual(x.concat(BitVec(1, 2)), BitVec.from_string("101001"))
+        self.assertEqual(x.slice(1, 2), BitVec.from_string("01"))
+        self.assertEqual(BitVec(0, 0).concat(x), x)
+        self.assertEqual(x.to_string(), "1010")
+        self.assertEqual(BitVec(0, 0).to_string(), "")
+
+    def test_comparisons(self):
+        x = BitVec(5, 4)
+        self.assertEqual(x, 5)
+        self.assertNotEqual(x, BitVec(5, 8))
+        self.assertEqual(hash(x), hash(BitVec(5, 4)))
+        self.assertTrue(x < 6 and x <= 5 and x > 4 and x >= BitVec(5, 8))
+        self.assertFalse(BitVec(0, 4))
+        self.assertEqual([10, 20][BitVec(1, 1)], 20)
+        self.assertEqual(str(x), "5")
+        self.assertEqual(repr(x), "BitVec('0101')")
+
+    def test_signed(self):
+        self.assertEqual(BitVec(0b1000, 4).signed(), -8)
+        self.assertEqual(BitVec(0b0111, 4).signed(), 7)
+        self.assertEqual(BitVec(0, 0).signed(), 0)
+
+    def test_patterns(self):
+        pattern = BitPattern.from_string("1x0x")
+        self.assertEqual((pattern.value, pattern.mask, pattern.width), (0b1000, 0b1010, 4))
+        self.assertEqual(pattern.to_string(), "1x0x")
+        self.assertEqual([value for value in range(16) if pattern.matches(BitVec(value, 4))], [8, 9, 12, 13])
+        self.assertNotEqual(pattern, BitVec(8, 4))
+
+    def test_folded_constants(self):
+        (variables, lines) = asl_to_py("bits(4) x = NOT '0000'; NEWLINE bits(4) y = x + '0001'; NEWLINE "
+                                       "bits(8) z = x:y; NEWLINE integer s = SInt(x); NEWLINE "
+                                       "bits(4) w = '0001' - '0010'; NEWLINE", [])
+        self.assertEqual(lines, [])
+        self.assertEqual({name: variables[name][2] for name in "xyzsw"},
+                         {"x": BitVec(15, 4), "y": BitVec(0, 4), "z": BitVec(0xf0, 8), "s": -1, "w": BitVec(15, 4)})
+        self.assertEqual(variables["z"][2].width, 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from aslutils.asl2 import asl_to_lang
+from aslutils.asl2c import CVisitor, asl_to_c
+from aslutils.asl2py import PythonVisitor, asl_to_py
+from aslutils.asl_interpreter import compile_snippet
+from aslutils.asl_runtime import RUNTIME
+from aslutils.asl_type import ASLTranslationError
+from aslutils.isa2c import RUNTIME_HEADER
+
+
+#: The fields of the snippets
+FIELDS = [("a", 4), ("n", 3)]
+
+#: A variable of unknown type
+UNKNOWN = {"v": (None, None)}
+
+#: Calls of the builtins whose results are wider than 64 bits, with the lengths of their fields
+WIDE = ("bits(128) r = Replicate(a, 16); NEWLINE bits(128) s = SignExtend(b, 128); NEWLINE "
+        "bits(128) u = Replicate(b, n); NEWLINE bits(128) v = SignExtend(b, m); NEWLINE "
+        "bits(128) c = '1" + "0" * 126 + "1'; NEWLINE bits(128) d = c + r; NEWLINE "
+        "integer i = SInt(s) + 1; NEWLINE", [("a", 8), ("b", 64), ("n", 7), ("m", 8)])
+
+#: The values of the fields of WIDE
+WIDE_FIELDS = {"a": 0xa5, "b": 0x80000000000000f0, "n": 2, "m": 100}
+
+
+class RuntimeBuiltinTest(unittest.TestCase):
+
+    def test_runtime_calls(self):
+        for (snippet, n, expected) in [("bits(8) x = SignExtend(a, n); NEWLINE", 7, 0x7a),
+                                       ("bits(8) x = Replicate(a, n); NEWLINE", 2, 0xaa)]:
+            (_, lines) = asl_to_lang(snippet, FIELDS, PythonVisitor)
+            namespace = dict(RUNTIME, a=0xa, n=n)
+            exec("\n".join(lines), namespace)
+            self.assertEqual(namespace["x"], expected)
+
+    def test_unknown_length(self):
+        for snippet in ["integer x = SInt(v); NEWLINE", "bits(8) x = SignExtend(v, 8); NEWLINE",
+                        "bits(8) x = Replicate(v, 2); NEWLINE"]:
+            for LangVisitor in (CVisitor, PythonVisitor):
+                with self.assertRaises(ASLTranslationError):
+                    asl_to_lang(snippet, FIELDS, LangVisitor, variables=UNKNOWN)
+
+
+
+class WideBuiltinTest(unittest.TestCase):
+
+    def setUp(self):
+        variables = compile_snippet(*WIDE)(WIDE_FIELDS)
+        self.expected = {name: int(variables[name]) for name in "rsuvdi"}
+
+    def test_python(self):
+        (_, lines) = asl_to_py(*WIDE)
+        namespace = dict(RUNTIME, **WIDE_FIELDS)
+        exec("\n".join(lines), namespace)
+        self.assertEqual({name: namespace[name] for name in "rsuvdi"}, self.expected)
+
+    @unittest.skipIf(shutil.which("cc") is None, "no C compiler")
+    def test_c(self):
+        (_, lines) = asl_to_c(*WIDE)
+        fields = "".join("uint64_t {0} = {1};\n".format(name, hex(value)) for (name, value) in WIDE_FIELDS.items())
+        prints = "".join('printf("%llx %llx\\n", (unsigned long long)({0} >> 64), (unsigned long long){0});\n'
+                         .format(name) for name in "rsuvd")
+        source = RUNTIME_HEADER + "#include <stdio.h>\nint main(void) {\n" + fields + "\n".join(lines) + "\n" + \
+            prints + 'printf("%lld\\n", (long long)i);\nreturn 0;\n}\n'
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "wide.c"), "w") as f:
+                f.write(source)
+            program = os.path.join(directory, "wide")
+            subprocess.run(["cc", "-Wall", "-Werror", "-o", program, f.name], check=True)
+            output = subprocess.run([program], check=True, capture_output=True, text=True).stdout.split("\n")
+        values = [int(high, 16) << 64 | int(low, 16) for (high, low) in map(str.split, output[:5])]
+        values.append(int(output[5]))
+        self.assertEqual(dict(zip("rsuvdi", values)), self.expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from aslutils.cli import main, state_entry
+from aslutils.isa import load_isa
+from aslutils.isa_output import OUTPUT_LANGUAGES, encoding_code
+
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+EXAMPLE = os.path.join(ROOT, "docs", "source", "example")
+DECODER = os.path.join(EXAMPLE, "arithmetic-decoder.asl")
+INSTRUCTIONS = os.path.join(EXAMPLE, "arithmetic-instrs.asl")
+
+
+class CommandLineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_main(self, *args):
+        """Returns the exit status and the output to stderr of the command"""
+
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            try:
+                status = main([DECODER, INSTRUCTIONS] + list(args))
+            except SystemExit as e:
+                status = e.code
+        return (status, stderr.getvalue())
+
+    def assertGenerated(self, output, languages, state=(), cse=False):
+        isa = load_isa(DECODER, INSTRUCTIONS)
+        for (name, encoding) in isa.encodings.items():
+            for language in languages:
+                (LangVisitor, extension) = OUTPUT_LANGUAGES[language]
+                with open(os.path.join(output, language, name + extension)) as f:
+                    lines = encoding_code(encoding, LangVisitor, state, cse)
+                    self.assertEqual(f.read(), "".join(line + "\n" for line in lines))
+
+    def test_state_entry(self):
+        self.assertEqual(state_entry("R:64:16"), ("R", 64, 16))
+        self.assertEqual(state_entry("result:64"), ("result", 64))
+        for string in ["R", ":64", "R:x", "R:1:2:3"]:
+            with self.assertRaises(argparse.ArgumentTypeError):
+                state_entry(string)
+
+    def test_generate(self):
+        output = os.path.join(self.directory, "out")
+        cache_dir = os.path.join(self.directory, "cache")
+        arguments = ["-o", output, "-l", "c", "-l", "py", "-s", "result:64", "--cse", "--cache-dir", cache_dir,
+                     "--profile"]
+        (status, stderr) = self.run_main(*arguments)
+        self.assertEqual(status, 0)
+        self.assertIn("3 regenerated, 0 removed, 6 files written", stderr)
+        for phase in ("parse", "cache", "translate", "write", "total"):
+            self.assertIn(phase + ":", stderr)
+        self.assertGenerated(output, ["c", "py"], [("result", 64)], True)
+        # the files are up to date, the second run takes the code from the cache
+        (status, stderr) = self.run_main(*arguments)
+        self.assertIn("3 regenerated, 0 removed, 0 files written", stderr)
+
+    def test_jobs(self):
+        output = os.path.join(self.directory, "out")
+        self.assertEqual(self.run_main("-o", output, "-l", "vhdl", "-j", "2")[0], 0)
+        self.assertGenerated(output, ["vhdl"])
+
+    def test_invalid_arguments(self):
+        for arguments in [["-o", self.directory, "-j", "0"], ["-o", self.directory, "-s", "R"],
+                          ["-o", self.directory, "-l", "java"], []]:
+            self.assertEqual(self.run_main(*arguments)[0], 2, arguments)
+
+    def test_module(self):
+        output = os.path.join(self.directory, "out")
+        environment = dict(os.environ, PYTHONPATH=os.path.abspath(ROOT))
+        process = subprocess.run([sys.executable, "-m", "aslutils", DECODER, INSTRUCTIONS, "-o", output],
+                                 env=environment, capture_output=True, text=True)
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertGenerated(output, ["c"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from aslutils import asl_compile
+from aslutils.asl_compile import CODE_CACHE, compile_encoding
+
+
+#: The fields of the encoding
+FIELDS = [("a", 0, 4), ("b", 4, 4)]
+
+#: The code of `__decode`
+DECODE = "integer m = UInt(a); NEWLINE integer n = UInt(b); NEWLINE"
+
+#: The state of the encoding
+STATE = [("R", None)]
+
+
+class CodeCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cached = dict(CODE_CACHE)
+        CODE_CACHE.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        CODE_CACHE.clear()
+        CODE_CACHE.update(self.cached)
+
+    def compile(self, execute):
+        return compile_encoding(DECODE, execute, FIELDS, STATE, cache_dir=self.cache_dir)
+
+    def files(self):
+        return sorted(os.listdir(self.cache_dir))
+
+    def test_hit(self):
+        execute = self.compile("R = m + n; NEWLINE")
+        self.assertEqual(execute(0x21, {"R": 0}), {"R": 3})
+        self.assertEqual(len(self.files()), 1)
+        self.assertTrue(self.files()[0].endswith(".marshal"))
+        # the code is taken from memory and then from the directory without translating the snippets again
+        with mock.patch.object(asl_compile, "encoding_source", side_effect=AssertionError("translated")):
+            self.assertEqual(self.compile("R = m + n; NEWLINE")(0x21, {"R": 0}), {"R": 3})
+            CODE_CACHE.clear()
+            self.assertEqual(self.compile("R = m + n; NEWLINE")(0x43, {"R": 0}), {"R": 7})
+
+    def test_invalidation(self):
+        self.compile("R = m + n; NEWLINE")
+        # changed code is translated and cached separately
+        execute = self.compile("R = m - n; NEWLINE")
+        self.assertEqual(execute(0x25, {"R": 0}), {"R": 3})
+        self.assertEqual(len(self.files()), 2)
+        # as is the same code with another cache version
+        CODE_CACHE.clear()
+        with mock.patch.object(asl_compile, "CACHE_VERSION", asl_compile.CACHE_VERSION + 1):
+            self.assertEqual(self.compile("R = m - n; NEWLINE")(0x25, {"R": 0}), {"R": 3})
+        self.assertEqual(len(self.files()), 3)
+
+    def test_stale_files(self):
+        self.compile("R = m + n; NEWLINE")
+        CODE_CACHE.clear()
+        (name,) = self.files()
+        with open(os.path.join(self.cache_dir, name), "wb") as f:
+            f.write(b"garbage")
+        # the broken file is ignored and replaced
+        self.assertEqual(self.compile("R = m + n; NEWLINE")(0x21, {"R": 0}), {"R": 3})
+        CODE_CACHE.clear()
+        with mock.patch.object(asl_compile, "encoding_source", side_effect=AssertionError("translated")):
+            self.assertEqual(self.compile("R = m + n; NEWLINE")(0x21, {"R": 0}), {"R": 3})
+
+
+if __name__ == "__main__":
+    unittest.main()
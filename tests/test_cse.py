@@ -0,0 +1,53 @@
+import unittest
+
+from aslutils.asl2py import asl_to_py
+
+
+#: The fields of the snippets
+FIELDS = [("a", 8), ("c", 1)]
+
+
+def translate(snippet):
+    """Returns the lines and the number of eliminated subexpressions of the snippet translated with cse"""
+
+    stats = {}
+    (_, lines) = asl_to_py(snippet, FIELDS, True, stats)
+    return (lines, stats["cse_eliminated"])
+
+
+class CommonSubexpressionTest(unittest.TestCase):
+
+    def test_reused(self):
+        (lines, eliminated) = translate("bits(4) x = a{0 -: 4}; NEWLINE bits(4) y = a{0 -: 4} EOR a{4 -: 8}; NEWLINE "
+                                        "bits(4) z = a{4 -: 8}; NEWLINE")
+        self.assertEqual(lines, ["_cse0 = (a) & 0xf", "x = _cse0", "_cse1 = ((a) >> 4) & 0xf",
+                                 "y = (_cse0) ^ (_cse1)", "z = _cse1"])
+        self.assertEqual(eliminated, 2)
+
+    def test_separate_branches(self):
+        (lines, eliminated) = translate("if c == '1' then START x = a{0 -: 4}; NEWLINE END "
+                                        "else START y = a{0 -: 4}; NEWLINE END")
+        self.assertEqual(lines, ["if (c) == (1):", "    x = (a) & 0xf", "else:", "    y = (a) & 0xf"])
+        self.assertEqual(eliminated, 0)
+
+    def test_invalidated(self):
+        (lines, eliminated) = translate("bits(4) x = a{0 -: 4}; NEWLINE a = a + 1; NEWLINE "
+                                        "bits(4) y = a{0 -: 4}; NEWLINE")
+        self.assertEqual(lines, ["x = (a) & 0xf", "a = ((a) + (1)) & 0xff", "y = (a) & 0xf"])
+        self.assertEqual(eliminated, 0)
+
+    def test_assigned_variable(self):
+        (lines, _) = translate("a = a{0 -: 4}:a{4 -: 8}; NEWLINE bits(4) x = a{4 -: 8} EOR a{0 -: 4}; NEWLINE "
+                               "bits(4) y = a{4 -: 8}; NEWLINE")
+        self.assertEqual(lines[-1], "y = _cse0")
+        self.assertEqual(lines[-3], "_cse0 = ((a) >> 4) & 0xf")
+
+    def test_no_copies(self):
+        (lines, eliminated) = translate("integer x = UInt(a{0 -: 4}) + 1; NEWLINE integer y = UInt(a{0 -: 4}); NEWLINE "
+                                        "z = a{0 -: 4}; NEWLINE")
+        self.assertEqual(lines, ["_cse0 = (a) & 0xf", "x = (_cse0) + (1)", "y = _cse0", "z = _cse0"])
+        self.assertEqual(eliminated, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import random
+import unittest
+
+from aslutils.isa import DecodeRule, ISA, load_isa
+from aslutils.isa_decision import build_decision_tree, decide, decision_stats, decision_trees
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+EXAMPLE = os.path.join(os.path.dirname(__file__), "..", "docs", "source", "example")
+
+#: The instruction sets whose decoders are compared
+ISAS = [(os.path.join(EXAMPLE, "arithmetic-decoder.asl"), os.path.join(EXAMPLE, "arithmetic-instrs.asl")),
+        (os.path.join(DATA, "registers-decoder.asl"), os.path.join(DATA, "registers-instrs.asl")),
+        (os.path.join(DATA, "widths-decoder.asl"), os.path.join(DATA, "widths-instrs.asl"))]
+
+#: The number of bits of the words of the generated decoders
+WIDTH = 10
+
+
+def random_rules(generator, count):
+    """Returns random overlapping decode rules for words of WIDTH bits, with exclusions and ranges"""
+
+    rules = []
+    for n in range(count):
+        mask = generator.getrandbits(WIDTH) & generator.getrandbits(WIDTH)
+        value = generator.getrandbits(WIDTH) & mask
+        excluded = []
+        for _ in range(generator.randint(0, 2)):
+            excluded_mask = generator.getrandbits(WIDTH) & ~mask & generator.getrandbits(WIDTH)
+            excluded.append((excluded_mask, generator.getrandbits(WIDTH) & excluded_mask))
+        ranges = []
+        if generator.random() < 0.3:
+            (start, run) = (generator.randrange(WIDTH - 3), 3)
+            low = generator.randrange(8)
+            ranges.append((start, run, low, generator.randrange(low, 8)))
+        rules.append(DecodeRule(mask, value, excluded, ranges, "e{0}".format(n) if generator.random() < 0.9 else None))
+    return rules
+
+
+class DecisionTreeTest(unittest.TestCase):
+
+    def test_instruction_sets(self):
+        generator = random.Random(0)
+        for (decoder, instrs) in ISAS:
+            isa = load_isa(decoder, instrs)
+            trees = decision_trees(isa)
+            for (name, rules) in isa.decoders.items():
+                # the words of the rules and random words
+                words = [rule.value for rule in rules] + [generator.getrandbits(32) for _ in range(2000)]
+                for word in words:
+                    self.assertEqual(decide(trees[name], word)[0], isa.decode(word, name), hex(word))
+
+    def test_generated_rules(self):
+        generator = random.Random(1)
+        for _ in range(30):
+            isa = ISA()
+            isa.decoders["d"] = random_rules(generator, generator.randint(1, 12))
+            profile = {"e{0}".format(n): generator.random() for n in range(12)}
+            for tree in (build_decision_tree(isa.decoders["d"]),
+                         build_decision_tree(isa.decoders["d"], profile),
+                         build_decision_tree(isa.decoders["d"], max_run=1)):
+                for word in range(1 << WIDTH):
+                    self.assertEqual(decide(tree, word)[0], isa.decode(word))
+
+    def test_stats(self):
+        generator = random.Random(2)
+        for _ in range(10):
+            tree = build_decision_tree(random_rules(generator, 8))
+            tests = [decide(tree, word)[1] for word in range(1 << WIDTH)]
+            stats = decision_stats(tree)
+            self.assertEqual(stats["max_tests"], max(tests))
+            self.assertAlmostEqual(stats["average_tests"], sum(tests) / len(tests))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+
+from aslutils.asl2 import asl_to_lang
+from aslutils.asl2c import CVisitor
+from aslutils.asl_bitvec import BitPattern
+from aslutils.asl_fast_path import translate_fast
+from aslutils.asl_type import ASLType
+
+
+class FastPathTest(unittest.TestCase):
+
+    def test_translated(self):
+        visitor = CVisitor({"Rd": (ASLType(ASLType.Kind.bits, 4), None)})
+        self.assertEqual(translate_fast("integer d = UInt(Rd); NEWLINE", visitor), ["int64_t d = (int64_t)(Rd);"])
+
+    def test_constants_of_other_types(self):
+        for value in (True, BitPattern.from_string("1x")):
+            variables = {"x": (ASLType(ASLType.Kind.bits, 2), value)}
+            self.assertIsNone(translate_fast("integer d = UInt(x); NEWLINE", CVisitor(variables)))
+            # the parser handles them instead
+            asl_to_lang("integer d = UInt(x); NEWLINE", [], CVisitor, variables=variables)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+from aslutils.asl2 import asl_to_lang, asl_to_many
+from aslutils.asl2c import CVisitor
+from aslutils.asl2np import NumpyVisitor
+from aslutils.asl2py import PythonVisitor
+from aslutils.asl2vhd import VHDLVisitor
+
+
+#: The fields of the snippets
+FIELDS = [("a", 2), ("b", 4)]
+
+#: The visitor classes of all backends
+BACKENDS = [CVisitor, PythonVisitor, VHDLVisitor, NumpyVisitor]
+
+#: Snippets with constants, builtins, slices and nested blocks
+SNIPPETS = ["integer d = 3; NEWLINE integer e = d * 2; NEWLINE",
+            "integer d = UInt(a) + 1; NEWLINE bits(8) v = ZeroExtend(b, 8); NEWLINE v{0 -: 1} = a; NEWLINE",
+            "if a == '1x' then START x = SInt(b) + (UInt(a) * UInt(b)); NEWLINE END "
+            "elsif a IN {'01'} then START case b of START when '1xx0' START y = 3; NEWLINE END "
+            "otherwise START y = UInt(b{1 -: 2}) + UInt(b{1 -: 2}); NEWLINE END END END",
+            "integer k = UInt(a) * 3; NEWLINE if k > 3 then START k = k - 3; NEWLINE END "
+            "x = (k + 1) * (k + 1); NEWLINE"]
+
+
+class TranslateManyTest(unittest.TestCase):
+
+    def test_same_code(self):
+        for cse in (False, True):
+            for snippet in SNIPPETS:
+                (variables, codes) = asl_to_many(snippet, FIELDS, BACKENDS, cse)
+                self.assertEqual(list(codes), [LangVisitor.language for LangVisitor in BACKENDS])
+                for LangVisitor in BACKENDS:
+                    (expected_variables, lines) = asl_to_lang(snippet, FIELDS, LangVisitor, cse)
+                    self.assertEqual(codes[LangVisitor.language], lines, (LangVisitor.language, snippet))
+                    self.assertEqual(variables, expected_variables)
+
+    def test_stats(self):
+        for snippet in SNIPPETS:
+            (stats, expected) = ({}, {})
+            asl_to_many(snippet, FIELDS, BACKENDS, True, stats)
+            for LangVisitor in BACKENDS:
+                asl_to_lang(snippet, FIELDS, LangVisitor, True, expected)
+            self.assertEqual(stats, dict(expected, fast_path=0))
+            self.assertEqual(stats["translated"], len(BACKENDS))
+
+    def test_duplicate_backends(self):
+        with self.assertRaises(AssertionError):
+            asl_to_many(SNIPPETS[0], FIELDS, [CVisitor, CVisitor])
+
+
+if __name__ == "__main__":
+    unittest.main()
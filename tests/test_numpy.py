@@ -0,0 +1,83 @@
+import os
+import random
+import unittest
+
+from aslutils.asl_compile import compile_encoding
+from aslutils.asl_runtime import ASLUndefined, ASLUnpredictable
+from aslutils.isa import load_isa
+
+try:
+    import numpy
+    from aslutils.asl2np import compile_vectorized
+except ImportError:
+    numpy = None
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+EXAMPLE = os.path.join(os.path.dirname(__file__), "..", "docs", "source", "example")
+
+#: The instruction sets with their state
+ISAS = [(os.path.join(EXAMPLE, "arithmetic-decoder.asl"), os.path.join(EXAMPLE, "arithmetic-instrs.asl"),
+         [("result", 64)]),
+        (os.path.join(DATA, "registers-decoder.asl"), os.path.join(DATA, "registers-instrs.asl"), [("R", 64, 4)]),
+        (os.path.join(DATA, "widths-decoder.asl"), os.path.join(DATA, "widths-instrs.asl"), [("R", 32)])]
+
+#: An encoding with signed arithmetic and words that are UNDEFINED or UNPREDICTABLE
+SIGNED = ("integer s = SInt(a); NEWLINE if a == '1x1' then START UNDEFINED; NEWLINE END",
+          "integer q = s DIV 2; NEWLINE if b == '0000' then START UNPREDICTABLE; NEWLINE END "
+          "R = ZeroExtend(b, 32) + (q * UInt(b)); NEWLINE",
+          [("a", 0, 3), ("b", 3, 4)])
+
+#: An encoding assigning to elements of an array in branches, some states end before the assignments
+ELEMENTS = ("if b == '1111' then START UNDEFINED; NEWLINE END "
+            "if a IN {'1x1', '000'} then START R[UInt(b{0 -: 1})] = R[UInt(b{2 -: 3})] + UInt(a); NEWLINE END "
+            "else START R[UInt(a{0 -: 1})] = ZeroExtend(b, 64); NEWLINE END",
+            [("a", 0, 3), ("b", 3, 4)])
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class VectorizedTest(unittest.TestCase):
+
+    def check_encoding(self, decode, execute, fields, state, words, initial):
+        """Runs the encoding on all words at once and compares the states and statuses with compile_encoding"""
+
+        vectorized = compile_vectorized(decode, execute, fields, state)
+        reference = compile_encoding(decode, execute, fields, state)
+        values = {name: numpy.array([(word >> start) & ((1 << run) - 1) for word in words], numpy.uint64)
+                  for (name, start, run) in fields}
+        arrays = {name: numpy.array([value] * len(words), numpy.uint64) for (name, value) in initial.items()}
+        status = vectorized(values, arrays, len(words))
+        for (i, word) in enumerate(words):
+            expected = {name: list(value) if isinstance(value, list) else value for (name, value) in initial.items()}
+            try:
+                reference(word, expected)
+                expected_status = 0
+            except ASLUndefined:
+                expected_status = 1
+            except ASLUnpredictable:
+                expected_status = 2
+            self.assertEqual(int(status[i]), expected_status, hex(word))
+            for (name, value) in expected.items():
+                # integers are represented in two's complement
+                value = [element & 0xffffffffffffffff for element in value] if isinstance(value, list) \
+                    else value & 0xffffffffffffffff
+                self.assertEqual(arrays[name][i].tolist(), value, (hex(word), name))
+
+    def test_instruction_sets(self):
+        generator = random.Random(0)
+        for (decoder, instrs, state) in ISAS:
+            isa = load_isa(decoder, instrs)
+            initial = {entry[0]: ([5, 6, 7, 8] if len(entry) > 2 else 1000) for entry in state}
+            words = [generator.getrandbits(32) for _ in range(3000)]
+            for (name, encoding) in isa.encodings.items():
+                matching = [word for word in words if isa.decode(word) == name]
+                self.assertTrue(matching, name)
+                self.check_encoding(encoding.decode, encoding.execute, encoding.fields, state, matching, initial)
+
+    def test_status(self):
+        (decode, execute, fields) = SIGNED
+        self.check_encoding(decode, execute, fields, [("R", 32)], list(range(1 << 7)), {"R": 1000})
+
+    def test_elements(self):
+        (execute, fields) = ELEMENTS
+        self.check_encoding(None, execute, fields, [("R", 64, 4)], list(range(1 << 7)), {"R": [5, 6, 7, 8]})
@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from aslutils import isa_output
+from aslutils.isa_output import OutputTree, encoding_code, watch
+
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), "..", "docs", "source", "example")
+
+#: The languages of the output trees
+LANGUAGES = ["c", "py", "vhdl"]
+
+#: The state of the example instruction set
+STATE = [("result", 64)]
+
+#: The encoding removed from the example instruction set, with its code in the instructions file
+INCREMENT = "    __encoding increment\n        __decode\n            integer op1 = UInt(operand);\n" \
+            "            integer op2 = 1;\n\n"
+
+
+class StopWatching(Exception):
+    pass
+
+
+class OutputTreeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.decoder = os.path.join(self.directory, "arithmetic-decoder.asl")
+        self.instructions = os.path.join(self.directory, "arithmetic-instrs.asl")
+        shutil.copy(os.path.join(EXAMPLE, "arithmetic-decoder.asl"), self.decoder)
+        shutil.copy(os.path.join(EXAMPLE, "arithmetic-instrs.asl"), self.instructions)
+        self.output = os.path.join(self.directory, "out")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def edit(self, path, old, new):
+        with open(path) as f:
+            text = f.read()
+        self.assertIn(old, text)
+        with open(path, "w") as f:
+            f.write(text.replace(old, new))
+
+    def tree(self, cache_dir=None):
+        return OutputTree(self.decoder, self.instructions, self.output, LANGUAGES, STATE, cache_dir=cache_dir)
+
+    def assertGenerated(self, tree):
+        for (name, encoding) in tree.isa.encodings.items():
+            for language in LANGUAGES:
+                with open(tree.path(name, language)) as f:
+                    lines = encoding_code(encoding, isa_output.OUTPUT_LANGUAGES[language][0], STATE)
+                    self.assertEqual(f.read(), "".join(line + "\n" for line in lines))
+
+    def test_update(self):
+        tree = self.tree()
+        result = tree.update()
+        self.assertEqual(sorted(result["regenerated"]), ["add", "increment", "subtract"])
+        self.assertEqual(result["written"], 9)
+        self.assertGenerated(tree)
+        self.assertFalse(tree.changed())
+        self.assertEqual(tree.update(), {"regenerated": [], "removed": [], "written": 0})
+        # only the files of the changed encoding are written
+        self.edit(self.instructions, "op1 - op2", "op1 - op2 - 1")
+        self.assertTrue(tree.changed())
+        self.assertEqual(tree.update(), {"regenerated": ["subtract"], "removed": [], "written": 3})
+        self.assertGenerated(tree)
+        # the files of removed encodings are removed
+        self.edit(self.decoder, "__encoding increment", "__UNALLOCATED")
+        self.edit(self.instructions, INCREMENT, "")
+        self.assertEqual(tree.update(), {"regenerated": [], "removed": ["increment"], "written": 0})
+        self.assertFalse(os.path.exists(tree.path("increment", "c")))
+
+    def test_cache(self):
+        cache_dir = os.path.join(self.directory, "cache")
+        self.tree(cache_dir).update()
+        shutil.rmtree(self.output)
+        # a new tree reads the code from the cache instead of translating it
+        with mock.patch.object(isa_output, "encoding_texts", side_effect=AssertionError("translated")):
+            tree = self.tree(cache_dir)
+            self.assertEqual(tree.update()["written"], 9)
+        self.assertGenerated(tree)
+
+    def test_watch(self):
+        tree = self.tree()
+        results = []
+
+        def report(reported, result):
+            self.assertIs(reported, tree)
+            results.append(result)
+            if len(results) == 1:
+                # an instructions file that can't be parsed is reported
+                with open(self.instructions, "a") as f:
+                    f.write("__instruction broken\n    __encoding\n")
+            elif len(results) == 2:
+                self.edit(self.instructions, "__instruction broken\n    __encoding\n", "")
+                self.edit(self.instructions, "op1 - op2", "op1 - op2 - 1")
+            else:
+                raise StopWatching()
+
+        with self.assertRaises(StopWatching):
+            watch([tree], 0.01, report)
+        self.assertEqual(len(results[0]["regenerated"]), 3)
+        self.assertIsInstance(results[1], Exception)
+        self.assertEqual(results[2]["regenerated"], ["subtract"])
+        self.assertGenerated(tree)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+from aslutils.parse_asl_file import ProcessedCode, extract_code, tree_from_lines
+
+
+#: An `__execute` block with nested blocks as (indentation level, line)
+NESTED = [(0, "bits(4) x = a;"),
+          (0, "if a == '0000' then"),
+          (1, "x = b;"),
+          (1, "if b == '0000' then"),
+          (2, "x = c;"),
+          (0, "else"),
+          (1, "x = d;"),
+          (0, "x = x + 1;")]
+
+
+class ExtractCodeTest(unittest.TestCase):
+
+    def test_nested_blocks(self):
+        # the code before a nested block used to be appended again for every block
+        code = ProcessedCode(extract_code(tree_from_lines(NESTED), []))
+        self.assertEqual(code.split(), ["bits(4)", "x", "=", "a;", "NEWLINE",
+                                        "if", "a", "==", "'0000'", "then", "START",
+                                        "x", "=", "b;", "NEWLINE",
+                                        "if", "b", "==", "'0000'", "then", "START", "x", "=", "c;", "NEWLINE", "END",
+                                        "END", "else", "START", "x", "=", "d;", "NEWLINE", "END",
+                                        "x", "=", "x", "+", "1;", "NEWLINE"])
+
+    def test_result_is_extended(self):
+        result = ["x = a;", " NEWLINE "]
+        self.assertIs(extract_code(tree_from_lines(NESTED[-1:]), result), result)
+        self.assertEqual(result, ["x = a;", " NEWLINE ", "x = x + 1;", " NEWLINE "])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+import os
+import random
+import unittest
+
+from aslutils.asl_pratt import compare_parsers
+from aslutils.isa import load_isa
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+EXAMPLE = os.path.join(os.path.dirname(__file__), "..", "docs", "source", "example")
+
+#: The instruction sets whose snippets are parsed
+ISAS = [(os.path.join(EXAMPLE, "arithmetic-decoder.asl"), os.path.join(EXAMPLE, "arithmetic-instrs.asl")),
+        (os.path.join(DATA, "registers-decoder.asl"), os.path.join(DATA, "registers-instrs.asl")),
+        (os.path.join(DATA, "widths-decoder.asl"), os.path.join(DATA, "widths-instrs.asl"))]
+
+#: Snippets on which the parsers have disagreed
+AMBIGUOUS = ["Foo(a, b); NEWLINE", "Foo(-, a); NEWLINE", "Foo((a, b), c); NEWLINE", "Foo(a); NEWLINE",
+             "Foo(a, b + 1); NEWLINE", "constant Foo(a, b); NEWLINE", "Foo(a, b) = c; NEWLINE",
+             "for i = 0 to n - = b; NEWLINE", "for i = 0 to (a, b) - = c; NEWLINE",
+             "for i = 0 to n (a, b) = c; NEWLINE", "for i = 0 to n - b c = d; NEWLINE", "for i = 0 to n - b; NEWLINE"]
+
+#: The binary operators of expressions
+OPERATORS = ["*", "/", "DIV", "MOD", "+", "-", ":", ">>", "<<", ">", "<", "==", "!=", ">=", "<=", "AND", "EOR",
+             "OR", "||", "&&", "^"]
+
+#: The operands of expressions that need no further choices
+ATOMS = ["a", "b", "1", "0x1f", "'0101'", "'01x1'", "TRUE", "\"text\"", "1.5", "integer UNKNOWN",
+         "bits(4) UNKNOWN"]
+
+
+class SnippetGenerator():
+    """Generates random processed ASL snippets covering the statements and operators of the grammar"""
+
+    def __init__(self, seed):
+        self.random = random.Random(seed)
+
+    def expression(self, depth=0):
+        choice = self.random.randrange(12 if depth < 3 else 1)
+        if choice == 0:
+            return self.random.choice(ATOMS)
+        elif choice == 1:
+            return "{0} {1} {2}".format(self.expression(depth + 1), self.random.choice(OPERATORS),
+                                        self.expression(depth + 1))
+        elif choice == 2:
+            return "{0} {1}".format(self.random.choice(["NOT", "-", "+", "!"]), self.expression(depth + 1))
+        elif choice == 3:
+            return "({0})".format(", ".join(self.expressions(depth, 1)))
+        elif choice == 4:
+            return "{0}({1})".format(self.random.choice(["F", "UInt"]), ", ".join(self.expressions(depth, 0)))
+        elif choice == 5:
+            return "R[{0}]".format(", ".join(self.expressions(depth, 0)))
+        elif choice == 6:
+            return "{0}{1}".format(self.expression(depth + 1), self.ranges(depth))
+        elif choice == 7:
+            return "{0}.f".format(self.expression(depth + 1))
+        elif choice == 8:
+            return "{0} IN {{{1}}}".format(self.expression(depth + 1), ", ".join(self.expressions(depth, 1)))
+        elif choice == 9:
+            return "if {0} then {1} else {2}".format(*(self.expression(depth + 1) for _ in range(3)))
+        elif choice == 10:
+            return "{0} {1} {2} {3} {4}".format(self.expression(depth + 1), self.random.choice(OPERATORS),
+                                                self.expression(depth + 1), self.random.choice(OPERATORS),
+                                                self.expression(depth + 1))
+        return self.random.choice(["a", "b", "c"])
+
+    def expressions(self, depth, minimum):
+        return [self.expression(depth + 1) for _ in range(self.random.randint(minimum, 3))]
+
+    def ranges(self, depth):
+        ranges = []
+        for _ in range(self.random.randint(1, 2)):
+            if self.random.random() < 0.5:
+                ranges.append("{0} -: {1}".format(self.expression(depth + 1), self.expression(depth + 1)))
+            else:
+                ranges.append(self.expression(depth + 1))
+        return "{0}{{{1}}}".format(self.random.choice(["", "."]), ", ".join(ranges))
+
+    def assignable(self, depth=0):
+        choice = self.random.randrange(7 if depth < 2 else 1)
+        if choice == 1:
+            return "({0})".format(", ".join(self.assignable(depth + 1) for _ in range(self.random.randint(2, 3))))
+        elif choice == 2:
+            return "R[{0}]".format(", ".join(self.expressions(depth, 0)))
+        elif choice == 3:
+            return "{0}:{1}".format(self.assignable(depth + 1), self.assignable(depth + 1))
+        elif choice == 4:
+            return "{0}{1}".format(self.assignable(depth + 1), self.ranges(depth))
+        elif choice == 5:
+            return "{0}{1}f".format(self.assignable(depth + 1), self.random.choice([".", " "]))
+        elif choice == 6:
+            return "-"
+        return self.random.choice(["a", "b", "x"])
+
+    def type_name(self):
+        return self.random.choice(["integer", "boolean", "bit", "real", "T",
+                                   "bits({0})".format(self.expression(2))])
+
+    def simple_statement(self):
+        choice = self.random.randrange(10)
+        if choice == 0:
+            return self.random.choice(["UNDEFINED;", "UNPREDICTABLE;", "IMPLEMENTATION_DEFINED \"x\";",
+                                       "SEE {0};".format(self.expression()),
+                                       "assert {0};".format(self.expression()),
+                                       "enumeration E {A, B};"])
+        elif choice in (1, 2):
+            return "{0}{1} {2};".format(self.random.choice(["", "constant "]), self.type_name(),
+                                        ", ".join(self.assignable() for _ in range(self.random.randint(1, 2))))
+        elif choice in (3, 4, 5, 6):
+            return "{0}{1} = {2};".format(self.random.choice(["", "constant ", self.type_name() + " "]),
+                                          self.assignable(), self.expression())
+        elif choice == 7:
+            return "Foo({0});".format(", ".join(self.assignable(1) for _ in range(self.random.randint(1, 3))))
+        return "{0}({1});".format(self.random.choice(["F", "Foo"]), ", ".join(self.expressions(0, 0)))
+
+    def block(self, depth):
+        if depth < 2 and self.random.random() < 0.5:
+            return "START {0} END".format(self.statements(depth + 1))
+        return "{0} NEWLINE".format(" ".join(self.simple_statement() for _ in range(self.random.randint(0, 2))))
+
+    def statement(self, depth=0):
+        choice = self.random.randrange(10 if depth < 2 else 1)
+        if choice == 1:
+            code = "if {0} then {1}".format(self.expression(), self.block(depth))
+            for _ in range(self.random.randint(0, 1)):
+                code += " elsif {0} then {1}".format(self.expression(), self.block(depth))
+            if self.random.random() < 0.5:
+                code += " else {0}".format(self.block(depth))
+            return code
+        elif choice == 2:
+            whens = " ".join("when {0} {1}".format(self.random.choice(["1", "'01'", "A"]), self.block(depth))
+                             for _ in range(self.random.randint(0, 2)))
+            otherwise = " otherwise {0}".format(self.block(depth)) if self.random.random() < 0.5 else ""
+            return "case {0} of START {1}{2} END".format(self.expression(), whens, otherwise)
+        elif choice == 3:
+            return "repeat {0} until {1};{2}".format(self.block(depth), self.expression(),
+                                                     self.random.choice(["", " NEWLINE"]))
+        elif choice == 4:
+            return "while {0} do {1}".format(self.expression(), self.block(depth))
+        elif choice == 5:
+            return "for {0} = {1} {2} {3} {4}".format(self.assignable(), self.expression(),
+                                                      self.random.choice(["to", "downto"]), self.expression(),
+                                                      self.block(depth))
+        return "{0}{1}".format(self.simple_statement(), self.random.choice(["", " NEWLINE"]))
+
+    def statements(self, depth=0):
+        return " ".join(self.statement(depth) for _ in range(self.random.randint(1, 3)))
+
+    def mutated(self, snippet):
+        """Returns the snippet with one word dropped or duplicated, mostly making it invalid"""
+
+        words = snippet.split(" ")
+        index = self.random.randrange(len(words))
+        if self.random.random() < 0.5:
+            del words[index]
+        else:
+            words.insert(index, words[index])
+        return " ".join(words)
+
+
+class PrattParserTest(unittest.TestCase):
+
+    def assertSameTrees(self, snippets):
+        self.assertEqual(compare_parsers(snippets)["mismatches"], [])
+
+    def test_instruction_sets(self):
+        snippets = []
+        for (decoder, instrs) in ISAS:
+            for encoding in load_isa(decoder, instrs).encodings.values():
+                snippets.extend(code for code in (encoding.decode, encoding.execute) if code)
+        self.assertTrue(snippets)
+        self.assertSameTrees(snippets)
+
+    def test_ambiguous(self):
+        self.assertSameTrees(AMBIGUOUS)
+
+    def test_generated(self):
+        generator = SnippetGenerator(0)
+        self.assertSameTrees([generator.statements() for _ in range(300)])
+
+    def test_invalid(self):
+        generator = SnippetGenerator(1)
+        self.assertSameTrees([generator.mutated(generator.statements()) for _ in range(300)])
+
+
+if __name__ == "__main__":
+    unittest.main()
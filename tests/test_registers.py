@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from aslutils.asl2 import asl_to_lang
+from aslutils.asl2c import CVisitor
+from aslutils.asl_compile import compile_encoding
+from aslutils.isa import load_isa
+from aslutils.isa2c import isa_to_c
+from aslutils.isa2py import isa_to_py
+from aslutils.isa_native import build_native
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+#: The state of the instruction set in data/registers-*.asl
+STATE = [("R", 64, 4)]
+
+#: Instruction words with the registers after executing them one after the other on [5, 6, 7, 8]
+PROGRAM = [(0x10000004, [7, 6, 7, 8]),  # R[0] = R[1] + 1
+           (0x20000503, [7, 6, 7, 0x85]),  # R[3] = '1000' : '0101'
+           (0x1000000e, [7, 6, 0x86, 0x85])]  # R[2] = R[3] + 1
+
+
+class RegisterWriteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.isa = load_isa(os.path.join(DATA, "registers-decoder.asl"), os.path.join(DATA, "registers-instrs.asl"))
+
+    def test_element_assignment(self):
+        (_, lines) = asl_to_lang("R[d] = R[n] + 1; NEWLINE", [("d", 2), ("n", 2)], CVisitor,
+                                 variables={"R": (None, None)})
+        self.assertEqual(lines, ["R[d] = (R[n]) + (1);"])
+
+    def test_compile_encoding(self):
+        state = {"R": [5, 6, 7, 8]}
+        for (word, registers) in PROGRAM:
+            encoding = self.isa.encodings[self.isa.decode(word)]
+            execute = compile_encoding(encoding.decode, encoding.execute, encoding.fields, STATE)
+            execute(word, state)
+            self.assertEqual(state["R"], registers)
+
+    def test_isa_to_py(self):
+        namespace = {}
+        exec(isa_to_py(self.isa, STATE), namespace)
+        state = {"R": [5, 6, 7, 8]}
+        for (word, registers) in PROGRAM:
+            namespace["execute"](word, state, "registers")
+            self.assertEqual(state["R"], registers)
+
+    def test_isa_to_c(self):
+        self.assertIn("R[t] = (R[s]) + (1);", isa_to_c(self.isa, STATE))
+
+    @unittest.skipIf(shutil.which("cc") is None, "no C compiler")
+    def test_build_native(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            native = build_native(self.isa, STATE, cache_dir=cache_dir)
+            state = {"R": [5, 6, 7, 8]}
+            for (word, registers) in PROGRAM:
+                self.assertEqual(native.execute(word, state), 0)
+                self.assertEqual(state["R"], registers)
+
+
+if __name__ == "__main__":
+    unittest.main()
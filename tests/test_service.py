@@ -0,0 +1,72 @@
+import asyncio
+import json
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from aslutils import asl2
+from aslutils.asl_service import INTERNAL_ERROR, INVALID_PARAMS, TranslationService
+
+
+def request(id, code):
+    """Returns the JSON-RPC request translating the snippet with a 4 bit field Rd"""
+
+    return json.dumps({"jsonrpc": "2.0", "id": id, "method": "translate",
+                       "params": {"code": code, "fields": [["Rd", 4]]}})
+
+
+class TranslationServiceTest(unittest.TestCase):
+
+    def handle(self, service, line):
+        return json.loads(asyncio.run(service.handle_line(line)))
+
+    def test_syntax_errors(self):
+        service = TranslationService()
+        parser = asl2.PARSER
+        try:
+            for asl2.PARSER in ("antlr", "pratt"):
+                for code in ["integer d = ; NEWLINE", "integer d = UInt(Rd) NEWLINE", "integer d = 1; ) NEWLINE"]:
+                    error = self.handle(service, request(1, code))["error"]
+                    self.assertEqual(error["code"], INVALID_PARAMS)
+                    self.assertTrue(error["message"].startswith("Syntax error: line 1:"), error["message"])
+        finally:
+            asl2.PARSER = parser
+
+    def test_invalid_params(self):
+        service = TranslationService()
+        for params in [{"fields": []}, {"code": "x = 1; NEWLINE", "width": 3}, ["x = 1; NEWLINE", [], "c", False, {}, 1],
+                       {"code": 1}, {"code": "x = 1; NEWLINE", "fields": [["Rd"]]},
+                       {"code": "x = 1; NEWLINE", "fields": [["Rd", "4"]]}, {"code": "x = 1; NEWLINE", "cse": 1},
+                       {"code": "x = 1; NEWLINE", "variables": {"y": 3}},
+                       {"code": "x.f = 1; NEWLINE", "variables": {"x": {"type": "int"}}}]:
+            line = json.dumps({"jsonrpc": "2.0", "id": 1, "method": "translate", "params": params})
+            self.assertEqual(self.handle(service, line)["error"]["code"], INVALID_PARAMS, params)
+
+    def test_internal_errors(self):
+        class FailingService(TranslationService):
+            def decode(self, decoder, instructions, word, name=None):
+                raise TypeError("internal")
+
+        line = json.dumps({"jsonrpc": "2.0", "id": 1, "method": "decode", "params": ["d.asl", "i.asl", 0]})
+        error = self.handle(FailingService(), line)["error"]
+        self.assertEqual((error["code"], error["message"]), (INTERNAL_ERROR, "TypeError: internal"))
+
+    def test_process_pool(self):
+        with ProcessPoolExecutor(1) as executor:
+            with self.assertRaises(ValueError):
+                TranslationService(executor)
+
+    def test_cache_size(self):
+        service = TranslationService(cache_size=2)
+        for n in range(4):
+            response = self.handle(service, request(n, "integer d = UInt(Rd) + {0}; NEWLINE".format(n)))
+            self.assertEqual(response["result"]["code"], ["int64_t d = ((int64_t)(Rd)) + ({0});".format(n)])
+        self.assertEqual(len(service.translations), 2)
+        # a cached translation is used again and kept longer
+        self.handle(service, request(4, "integer d = UInt(Rd) + 2; NEWLINE"))
+        self.handle(service, request(5, "integer d = UInt(Rd) + 4; NEWLINE"))
+        self.assertEqual([json.loads(key)["code"] for key in service.translations],
+                         ["integer d = UInt(Rd) + 2; NEWLINE", "integer d = UInt(Rd) + 4; NEWLINE"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+from aslutils.asl2 import TranslationSession, asl_to_lang
+from aslutils.asl2py import PythonVisitor
+from aslutils.asl_type import ASLType
+
+
+#: The fields of the snippets
+FIELDS = [("Rd", 4)]
+
+#: The state of the snippets
+STATE = {"R": (ASLType(ASLType.Kind.bits, 32), None)}
+
+#: A decode snippet declaring a constant and a variable
+DECODE = "integer n = 4; NEWLINE integer d = UInt(Rd); NEWLINE"
+
+#: An execute snippet using the constant and the variable of DECODE
+EXECUTE = "bits(n) v = Ones(n); NEWLINE R = ZeroExtend(v, 32) + d; NEWLINE"
+
+
+class TranslationSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stats = {}
+        self.session = TranslationSession(PythonVisitor, FIELDS, stats=self.stats, variables=STATE)
+        self.session.translate(DECODE)
+
+    def test_variables_carried(self):
+        (variables, lines) = self.session.translate(EXECUTE)
+        self.assertEqual(lines, ["R = ((15) + (d)) & 0xffffffff"])
+        self.assertTrue(variables["d"][0])
+        integer = ASLType(ASLType.Kind.int)
+        expected = asl_to_lang(EXECUTE, FIELDS, PythonVisitor, variables=dict(STATE, n=(integer, 4), d=(integer, None)))
+        self.assertEqual(lines, expected[1])
+
+    def test_snapshot_restore(self):
+        snapshot = self.session.snapshot()
+        self.assertEqual(self.session.translate("n = 8; NEWLINE " + EXECUTE)[1],
+                         ["n = 8", "R = ((255) + (d)) & 0xffffffff"])
+        self.assertIn("v", self.session.variables)
+        # the snapshot is not changed by the later snippets
+        self.assertEqual(snapshot["n"][1], 4)
+        self.session.restore(snapshot)
+        self.assertNotIn("v", self.session.variables)
+        self.assertEqual(self.session.translate(EXECUTE)[1], ["R = ((15) + (d)) & 0xffffffff"])
+
+    def test_fork(self):
+        fork = self.session.fork()
+        self.assertEqual(fork.translate("n = 8; NEWLINE")[1], ["n = 8"])
+        self.assertEqual(fork.translate(EXECUTE)[1], ["R = ((255) + (d)) & 0xffffffff"])
+        self.assertEqual(self.session.translate(EXECUTE)[1], ["R = ((15) + (d)) & 0xffffffff"])
+        # the fork adds to the statistics of the session
+        self.assertEqual(self.stats["translated"], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import io
+import unittest
+
+from aslutils.asl2 import asl_to_lang
+from aslutils.asl2c import CVisitor
+from aslutils.asl2py import PythonVisitor
+from aslutils.asl2vhd import VHDLVisitor
+from aslutils.asl_code_visitor import CodeBlock, file_sink, indent_lines, iter_lines
+
+
+#: The fields of the snippets
+FIELDS = [("a", 2), ("b", 2)]
+
+#: Snippets with nested blocks
+SNIPPETS = ["integer d = UInt(a) + 1; NEWLINE",
+            "if a == '1x' then START if b == '00' then START x = a; NEWLINE END else START x = b; NEWLINE END END "
+            "elsif a == '01' then START case b of START when '1x' START y = 3; NEWLINE END "
+            "otherwise START y = UInt(a); NEWLINE END END END",
+            "integer k = UInt(a) * 3; NEWLINE if k > 3 then START k = k - 3; NEWLINE "
+            "if b == '11' then START k = k + 1; NEWLINE END END x = k; NEWLINE"]
+
+
+class SinkTest(unittest.TestCase):
+
+    def test_iter_lines(self):
+        code = ["a", CodeBlock(["b", None, CodeBlock([CodeBlock(["c"])]), "d"]), None, "e"]
+        self.assertEqual(list(iter_lines(code)), [(0, "a"), (1, "b"), (3, "c"), (1, "d"), (0, "e")])
+        self.assertEqual(list(iter_lines(code, 2))[0], (2, "a"))
+        self.assertEqual(indent_lines(code, "\t"), ["a", "\tb", "\t\t\tc", "\td", "e"])
+
+    def test_sinks(self):
+        for LangVisitor in (CVisitor, PythonVisitor, VHDLVisitor):
+            for snippet in SNIPPETS:
+                (variables, lines) = asl_to_lang(snippet, FIELDS, LangVisitor)
+                streamed = []
+                (streamed_variables, code) = asl_to_lang(snippet, FIELDS, LangVisitor,
+                                                         sink=lambda depth, line: streamed.append((depth, line)))
+                self.assertIsNone(code)
+                self.assertEqual(["    " * depth + line for (depth, line) in streamed], lines)
+                self.assertEqual(streamed_variables.keys(), variables.keys())
+                file = io.StringIO()
+                asl_to_lang(snippet, FIELDS, LangVisitor, sink=file_sink(file))
+                self.assertEqual(file.getvalue(), "".join(line + "\n" for line in lines))
+
+
+if __name__ == "__main__":
+    unittest.main()
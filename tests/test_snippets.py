@@ -0,0 +1,41 @@
+import os
+import unittest
+
+from aslutils.asl2py import PythonVisitor
+from aslutils.asl_compile import compile_encoding
+from aslutils.isa import load_isa
+from aslutils.isa2py import isa_to_py
+from aslutils.isa_snippets import SharedSnippets
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+EXAMPLE = os.path.join(os.path.dirname(__file__), "..", "docs", "source", "example")
+
+
+class SharedSnippetsTest(unittest.TestCase):
+
+    def test_shared_execute(self):
+        isa = load_isa(os.path.join(EXAMPLE, "arithmetic-decoder.asl"), os.path.join(EXAMPLE, "arithmetic-instrs.asl"))
+        snippets = SharedSnippets(isa, PythonVisitor, [("result", 64)])
+        # increment folds op2 = 1, add passes it
+        self.assertIs(snippets.encodings["add"][1], snippets.encodings["increment"][1])
+        self.assertEqual(snippets.encodings["add"][2], ["op1", "op2"])
+        self.assertEqual(snippets.encodings["increment"][2], ["op1", "1"])
+        self.assertEqual(snippets.stats()["execute"], {"snippets": 3, "unique": 2, "dedup_ratio": 1.5})
+        self.assertEqual(snippets.stats()["decode"], {"snippets": 3, "unique": 2, "dedup_ratio": 1.5})
+
+    def test_lengths_are_folded(self):
+        isa = load_isa(os.path.join(DATA, "widths-decoder.asl"), os.path.join(DATA, "widths-instrs.asl"))
+        snippets = SharedSnippets(isa, PythonVisitor, [("R", 32)])
+        self.assertIs(snippets.encodings["narrow"][1], snippets.encodings["shifted"][1])
+        self.assertIsNot(snippets.encodings["narrow"][1], snippets.encodings["wide"][1])
+        namespace = {}
+        exec(isa_to_py(isa, [("R", 32)]), namespace)
+        for word in (0x10000003, 0x20000003, 0x30000030):
+            encoding = isa.encodings[isa.decode(word)]
+            execute = compile_encoding(encoding.decode, encoding.execute, encoding.fields, [("R", 32)])
+            self.assertEqual(namespace["execute"](word, {"R": 0}), execute(word, {"R": 0}))
+
+
+if __name__ == "__main__":
+    unittest.main()
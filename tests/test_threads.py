@@ -0,0 +1,60 @@
+import random
+import sys
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from aslutils import asl2
+from aslutils.asl2c import asl_to_c
+from aslutils.asl2py import asl_to_py
+
+
+#: The fields of the snippets
+FIELDS = [("a", 1), ("b", 1)]
+
+#: Snippets whose constants are varied to get distinct translations
+TEMPLATES = ["if a == '1' then START if b == '0' then START x = a:b; NEWLINE END else START x = b:a; NEWLINE END END "
+             "elsif a == '0' then START case b of START when '1' START y = 3; NEWLINE END "
+             "otherwise START y = UInt(a); NEWLINE END END END",
+             "bits(2) x = a:b; NEWLINE if x == '11' then START x = '01'; NEWLINE END else START x = '00'; NEWLINE END",
+             "integer k = UInt(a) * 3 + UInt(b); NEWLINE if k > 3 then START k = k - 3; NEWLINE END",
+             "integer d = 3; NEWLINE integer e = d * 2; NEWLINE"]
+
+
+def translate(snippet):
+    """Returns the C (with cse) and Python translations of the snippet"""
+
+    return (asl_to_c(snippet, FIELDS, cse=True)[1], asl_to_py(snippet, FIELDS)[1])
+
+
+class ConcurrentTranslationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = asl2.PARSER
+        # switch threads as often as possible to provoke races
+        self.interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+    def tearDown(self):
+        asl2.PARSER = self.parser
+        sys.setswitchinterval(self.interval)
+
+    def check_concurrent(self, parser):
+        asl2.PARSER = parser
+        snippets = [template.replace("3", str(n)) for n in range(3, 30) for template in TEMPLATES]
+        work = snippets * 4
+        random.Random(0).shuffle(work)
+        # translate concurrently first, while the caches of the parser are cold
+        with ThreadPoolExecutor(16) as pool:
+            results = list(pool.map(translate, work))
+        expected = {snippet: translate(snippet) for snippet in snippets}
+        self.assertEqual([snippet for (snippet, result) in zip(work, results) if result != expected[snippet]], [])
+
+    def test_antlr(self):
+        self.check_concurrent("antlr")
+
+    def test_pratt(self):
+        self.check_concurrent("pratt")
+
+
+if __name__ == "__main__":
+    unittest.main()
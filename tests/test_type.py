@@ -0,0 +1,116 @@
+import os
+import pickle
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from aslutils.asl2c import asl_to_c
+from aslutils.asl2py import asl_to_py
+from aslutils.asl2vhd import asl_to_vhdl
+from aslutils.asl_interpreter import compile_snippet
+from aslutils.asl_type import ASLTranslationError, ASLType, bits_c_type
+
+
+#: Shifts a field so that its bits overflow, the shifted value keeps the length of the field
+OVERFLOWING_SHIFT = "integer r = 0; NEWLINE if (a << n) == '00000000' then START r = 1; NEWLINE END " \
+                    "integer s = UInt(a << n); NEWLINE"
+
+#: Compares a field with bitpatterns whose don't care bits have to be ignored
+PATTERN_COMPARISONS = "integer r = 0; NEWLINE if a == '1x' then START r = r + 1; NEWLINE END " \
+                      "if 'x1' != a then START r = r + 2; NEWLINE END " \
+                      "if a IN {'0x', '11'} then START r = r + 4; NEWLINE END"
+
+
+class ASLTypeTest(unittest.TestCase):
+
+    def test_equality(self):
+        self.assertEqual(ASLType(ASLType.Kind.bits, 4), ASLType(ASLType.Kind.bits, 4))
+        self.assertNotEqual(ASLType(ASLType.Kind.bits, 4), ASLType(ASLType.Kind.bits, 8))
+        self.assertNotEqual(ASLType(ASLType.Kind.bits, 4), ASLType.Kind.bits)
+        self.assertIs(pickle.loads(pickle.dumps(ASLType(ASLType.Kind.int))), ASLType(ASLType.Kind.int))
+
+    def test_hash(self):
+        types = {ASLType(ASLType.Kind.bits, width): width for width in range(1, 65)}
+        self.assertEqual(len(set(map(hash, types))), 64)
+        self.assertEqual(types[ASLType(ASLType.Kind.bits, 12)], 12)
+        self.assertNotIn(ASLType.Kind.bits, types)
+
+    def test_c_types(self):
+        self.assertEqual([bits_c_type(width) for width in (1, 9, 32, 33, 64, 65, 128)],
+                         ["uint8_t", "uint16_t", "uint32_t", "uint64_t", "uint64_t", "unsigned __int128",
+                          "unsigned __int128"])
+        for (width, int128) in [(129, True), (256, True), (65, False)]:
+            with self.assertRaisesRegex(ASLTranslationError, "{0} bits".format(width)):
+                bits_c_type(width, int128)
+        with self.assertRaises(ASLTranslationError):
+            asl_to_c("bits(256) x = ZeroExtend(a, 256); NEWLINE", [("a", 8)])
+
+
+class ShiftTest(unittest.TestCase):
+
+    def expected(self, n):
+        variables = compile_snippet(OVERFLOWING_SHIFT, [("a", 8), ("n", 5)])({"a": 0x90, "n": n})
+        return (variables["r"], variables["s"])
+
+    def test_python(self):
+        (_, lines) = asl_to_py(OVERFLOWING_SHIFT, [("a", 8), ("n", 5)])
+        for n in (0, 4, 5, 30):
+            namespace = {"a": 0x90, "n": n}
+            exec("\n".join(lines), namespace)
+            self.assertEqual((namespace["r"], namespace["s"]), self.expected(n))
+        self.assertEqual(self.expected(5), (1, 0))
+
+    @unittest.skipIf(shutil.which("cc") is None, "no C compiler")
+    def test_c(self):
+        (_, lines) = asl_to_c(OVERFLOWING_SHIFT, [("a", 8), ("n", 5)])
+        source = "#include <stdint.h>\n#include <stdio.h>\n#include <stdlib.h>\n" \
+                 "int main(int argc, char **argv) {\nuint8_t a = 0x90;\nuint8_t n = atoi(argv[1]);\n" + \
+                 "\n".join(lines) + '\nprintf("%d %d", (int)r, (int)s);\nreturn 0;\n}\n'
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "shift.c"), "w") as f:
+                f.write(source)
+            program = os.path.join(directory, "shift")
+            subprocess.run(["cc", "-Werror", "-o", program, f.name], check=True)
+            for n in (0, 4, 5, 30):
+                output = subprocess.run([program, str(n)], check=True, capture_output=True, text=True).stdout
+                self.assertEqual(tuple(map(int, output.split())), self.expected(n))
+
+
+class PatternComparisonTest(unittest.TestCase):
+
+    def expected(self):
+        return [compile_snippet(PATTERN_COMPARISONS, [("a", 2)])({"a": a})["r"] for a in range(4)]
+
+    def test_python(self):
+        (_, lines) = asl_to_py(PATTERN_COMPARISONS, [("a", 2)])
+        results = []
+        for a in range(4):
+            namespace = {"a": a}
+            exec("\n".join(lines), namespace)
+            results.append(namespace["r"])
+        self.assertEqual(results, self.expected())
+        self.assertEqual(results, [6, 4, 3, 5])
+
+    @unittest.skipIf(shutil.which("cc") is None, "no C compiler")
+    def test_c(self):
+        (_, lines) = asl_to_c(PATTERN_COMPARISONS, [("a", 2)])
+        source = "#include <stdint.h>\n#include <stdio.h>\n#include <stdlib.h>\n" \
+                 "int main(int argc, char **argv) {\nuint8_t a = atoi(argv[1]);\n" + \
+                 "\n".join(lines) + '\nprintf("%d", (int)r);\nreturn 0;\n}\n'
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "patterns.c"), "w") as f:
+                f.write(source)
+            program = os.path.join(directory, "patterns")
+            subprocess.run(["cc", "-Werror", "-o", program, f.name], check=True)
+            results = [int(subprocess.run([program, str(a)], check=True, capture_output=True, text=True).stdout)
+                       for a in range(4)]
+        self.assertEqual(results, self.expected())
+
+    def test_vhdl(self):
+        (_, lines) = asl_to_vhdl("boolean b = a IN {'1x', '01'}; NEWLINE", [("a", 2)])
+        self.assertEqual(lines, ["b := ((a) and 2) = 2 or (a) = (1);"])
+
+
+if __name__ == "__main__":
+    unittest.main()